@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import heapq
+from itertools import count
+
+from my_globals import *
+from search import SearchStats
+from graph import CompiledGraph
+
+
+def distances_to(graph: CompiledGraph, target: int, source: int = None, scale: float = 1.0,
+                 stats: SearchStats = None) -> [float]:
+    """
+    A lower bound on the distance from every node to the target, for guiding many searches towards the same target.
+
+    The bounds come from one Dijkstra outwards from the target (every path is stored in both directions, so this is
+    the same as searching towards it). Given a source, that search stops once the source is settled: the nodes it
+    settled get their exact distance, and every other node is at least as far as the source, so it gets that
+    distance or its straight line distance to the target times scale, whichever is more. This keeps the bounds
+    consistent for A* while costing no more than a single Dijkstra between the two.
+
+    Taking paths away or making them longer never makes a node closer to the target, so the bounds hold for every
+    search that follows, and they lead those searches almost straight to the target.
+
+    :param graph: the compiled graph
+    :param target: the index of the node the searches will go to
+    :param source: the index of the node the searches will mostly start from, or None to search the whole graph
+    :param scale: the lowest weight per unit of straight line distance of any edge
+    :param stats: optional counters to add the work done to
+    :return: a list with the bound of each node index, inf for the nodes known not to reach the target
+    """
+    settled = graph.search_from(target, None if source is None else [source], stats=stats)[0]
+    if source is None or source not in settled:
+        table = [math.inf] * len(graph)
+    else:
+        lines = np.hypot(graph.xs - graph.xs[target], graph.ys - graph.ys[target]) * scale
+        table = np.maximum(lines, settled[source]).tolist()
+    for node, distance in settled.items():
+        table[node] = distance
+    return table
+
+
+def guided_path(graph: CompiledGraph, source: int, target: int, potential: [float], banned_nodes=(),
+                banned_edges=(), factors: {int: float} = None, stats: SearchStats = None) -> ([int], float):
+    """
+    Find the shortest path between two node indexes with A*, guided by the distances from distances_to, leaving
+    some nodes and edges out and making some edges longer.
+
+    :param graph: the compiled graph
+    :param source: the index of the node to start from
+    :param target: the index of the node to find a path to
+    :param potential: the distance of each node to the target, as worked out by distances_to
+    :param banned_nodes: the indexes of nodes the path may not pass through
+    :param banned_edges: the edges the path may not use
+    :param factors: what to multiply the weight of some edges by, all at least 1
+    :param stats: optional counters to add the work done to
+    :return: the list of edges along the path and its weight (with the factors), or (None, inf) if there is none
+    """
+    offsets = graph._offsets
+    targets = graph._targets
+    weights = graph._weights
+
+    distances = {source: 0}
+    previous = {}
+    settled = set()
+    order = count()
+    heap = [(potential[source], next(order), 0, source)]
+    expanded = relaxed = popped = 0
+
+    while heap:
+        _, _, distance, node = heapq.heappop(heap)
+        popped += 1
+        if node in settled:
+            continue
+        expanded += 1
+        if node == target:
+            break
+        settled.add(node)
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            head = targets[edge]
+            if head in settled or head in banned_nodes or edge in banned_edges or potential[head] == math.inf:
+                continue
+            new_dist = distance + (weights[edge] if factors is None else weights[edge] * factors.get(edge, 1))
+            if new_dist < distances.get(head, math.inf):
+                relaxed += 1
+                distances[head] = new_dist
+                previous[head] = (node, edge)
+                heapq.heappush(heap, (new_dist + potential[head], next(order), new_dist, head))
+
+    if stats is not None:
+        stats.queries += 1
+        stats.expanded += expanded
+        stats.relaxed += relaxed
+        stats.pushed += relaxed + 1
+        stats.popped += popped
+
+    if target not in distances:
+        return None, math.inf
+    edges = []
+    node = target
+    while node != source:
+        node, edge = previous[node]
+        edges.append(edge)
+    edges.reverse()
+    return edges, distances[target]
+
+
+def path_nodes(graph: CompiledGraph, source: int, edges: [int]) -> [int]:
+    return [source] + graph.targets[edges].tolist()
+
+
+def path_weight(graph: CompiledGraph, edges: [int]) -> float:
+    return math.fsum(graph.weights[edges].tolist())
+
+
+def k_shortest_paths(graph: CompiledGraph, source: int, target: int, k: int, scale: float = 1.0,
+                     stats: SearchStats = None) -> [([int], float)]:
+    """
+    Find the k shortest paths between two node indexes that do not pass through any node twice, with Yen's algorithm.
+
+    Each path after the first is found by branching off one of the paths already found: for every node along the
+    last path, the path is searched again from that node with the nodes before it and the next edge of every path
+    that shares the same beginning left out. All of those searches run towards the same target, so the bounds from
+    a single search outwards from the target (see distances_to) guide every one of them as an A* heuristic, and
+    most go almost straight to the target.
+
+    :param graph: the compiled graph
+    :param source: the index of the node to start from
+    :param target: the index of the node to find paths to
+    :param k: the most paths to find
+    :param scale: the lowest weight per unit of straight line distance of any edge
+    :param stats: optional counters to add the work done to
+    :return: up to k lists of node indexes along each path and its weight, shortest first
+    """
+    if k <= 0:
+        return []
+    if source == target:
+        return [([source], 0.0)]
+    potential = distances_to(graph, target, source, scale, stats)
+    edges, weight = guided_path(graph, source, target, potential, stats=stats)
+    if edges is None:
+        return []
+
+    found = [(edges, weight)]
+    candidates = []  # a heap of (weight, order, edges) of the paths that branch off the ones found
+    seen = {tuple(edges)}
+    order = count()
+    weights = graph._weights
+    while len(found) < k:
+        last, _ = found[-1]
+        nodes = path_nodes(graph, source, last)
+        root_weight = 0.0
+        for i in range(len(last)):
+            root = last[:i]
+            banned_edges = {edges[i] for edges, _ in found if len(edges) > i and edges[:i] == root}
+            spur, spur_weight = guided_path(graph, nodes[i], target, potential, set(nodes[:i]), banned_edges,
+                                            stats=stats)
+            if spur is not None and tuple(root + spur) not in seen:
+                seen.add(tuple(root + spur))
+                heapq.heappush(candidates, (root_weight + spur_weight, next(order), root + spur))
+            root_weight += weights[last[i]]
+        if not candidates:
+            break
+        weight, _, edges = heapq.heappop(candidates)
+        found.append((edges, weight))
+    return [(path_nodes(graph, source, edges), weight) for edges, weight in found]
+
+
+def overlap(graph: CompiledGraph, edges: [int], other: [int]) -> float:
+    """
+    The share of the weight of a path that is along paths the other path uses too, in either direction.
+    """
+    weights = graph.weights[edges]
+    total = weights.sum()
+    if total == 0:
+        return 1.0
+    return float(weights[np.isin(graph.path_ids[edges], graph.path_ids[other])].sum() / total)
+
+
+def alternative_paths(graph: CompiledGraph, source: int, target: int, k: int = 3, max_overlap: float = 0.6,
+                      max_stretch: float = 0.4, penalty: float = 1.4, attempts: int = None, scale: float = 1.0,
+                      stats: SearchStats = None) -> [([int], float)]:
+    """
+    Find the shortest path between two node indexes and up to k - 1 plausible alternatives to it, with the penalty
+    method: after each search the paths used are made longer by the penalty factor and the search is run again,
+    which pushes it onto other roads. A path found this way is kept if it is no more than max_stretch longer than the
+    shortest path and shares no more than max_overlap of its weight with any path kept before it.
+
+    The penalties only make paths longer, so the bounds from one search outwards from the target guide every
+    search as an A* heuristic, as in k_shortest_paths. This makes each alternative cost about as much as one A*
+    search with a good heuristic, far less than Yen's algorithm, though the paths found are not the k shortest.
+
+    :param graph: the compiled graph
+    :param source: the index of the node to start from
+    :param target: the index of the node to find paths to
+    :param k: the most paths to return, including the shortest
+    :param max_overlap: the largest share of an alternative that may be along paths a better route already uses
+    :param max_stretch: how much longer than the shortest path an alternative may be, as a share of it
+    :param penalty: what to multiply the weight of the paths used by after each search
+    :param attempts: the most searches to run after the first, 3 * k by default
+    :param scale: the lowest weight per unit of straight line distance of any edge
+    :param stats: optional counters to add the work done to
+    :return: up to k lists of node indexes along each path and its weight, shortest first
+    """
+    if k <= 0:
+        return []
+    if source == target:
+        return [([source], 0.0)]
+    potential = distances_to(graph, target, source, scale, stats)
+    edges, best = guided_path(graph, source, target, potential, stats=stats)
+    if edges is None:
+        return []
+
+    found = [(edges, best)]
+    factors = {}
+    for _ in range(3 * k if attempts is None else attempts):
+        if len(found) == k:
+            break
+        for edge in graph.edges_of(graph.path_ids[edges]).ravel().tolist():
+            factors[edge] = factors.get(edge, 1) * penalty
+        edges, _ = guided_path(graph, source, target, potential, factors=factors, stats=stats)
+        if edges is None:
+            break
+        weight = path_weight(graph, edges)
+        if weight <= best * (1 + max_stretch) \
+                and all(edges != other and overlap(graph, edges, other) <= max_overlap for other, _ in found):
+            found.append((edges, weight))
+    found.sort(key=lambda item: item[1])
+    return [(path_nodes(graph, source, edges), weight) for edges, weight in found]
@@ -0,0 +1,710 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from world import *
+from parallel import RoutePool
+from importer import ImportReport, import_csv, export_csv
+
+
+def make_grid(world: World, side: int, spacing: int = 5) -> [PathNode]:
+    """
+    Fill the world with a side x side grid of path nodes, each connected to its right and lower neighbours.
+
+    :param world: the world to add the graph to
+    :param side: the number of nodes along each side of the grid
+    :param spacing: the distance in meters between neighbouring nodes
+    :return: the list of nodes that were added
+    """
+    nodes = [world.add_path_node(u * spacing, v * spacing) for v in range(side) for u in range(side)]
+    for v in range(side):
+        for u in range(side):
+            node = nodes[v * side + u]
+            if u + 1 < side:
+                world.add_path(node, nodes[v * side + u + 1])
+            if v + 1 < side:
+                world.add_path(node, nodes[(v + 1) * side + u])
+    return nodes
+
+
+def make_planar(world: World, side: int, spacing: int = 5) -> [PathNode]:
+    """
+    Fill the world with a random planar graph: a jittered side x side grid where each grid edge is kept with a high
+    probability and each cell may get one of its two diagonals, so no two paths ever cross. The layout comes from the
+    world's seed.
+
+    :param world: the world to add the graph to
+    :param side: the number of nodes along each side of the grid
+    :param spacing: the average distance in meters between neighbouring nodes
+    :return: the list of nodes that were added
+    """
+    rand = random.Random(world.active_seed)
+    jitter = spacing * 0.3
+    nodes = [world.add_path_node(u * spacing + rand.uniform(-jitter, jitter),
+                                 v * spacing + rand.uniform(-jitter, jitter))
+             for v in range(side) for u in range(side)]
+    for v in range(side):
+        for u in range(side):
+            node = nodes[v * side + u]
+            if u + 1 < side and rand.random() < 0.85:
+                world.add_path(node, nodes[v * side + u + 1])
+            if v + 1 < side and rand.random() < 0.85:
+                world.add_path(node, nodes[(v + 1) * side + u])
+            if u + 1 < side and v + 1 < side and rand.random() < 0.4:
+                if rand.random() < 0.5:
+                    world.add_path(node, nodes[(v + 1) * side + u + 1])
+                else:
+                    world.add_path(nodes[v * side + u + 1], nodes[(v + 1) * side + u])
+    return nodes
+
+
+def make_geometric(world: World, count: int, degree: float = 6, spacing: int = 5) -> [PathNode]:
+    """
+    Fill the world with a random geometric graph: nodes scattered uniformly over a square, each joined to every node
+    within a fixed radius. Paths may cross, and the graph may fall apart into a few pieces. The layout comes from the
+    world's seed.
+
+    :param world: the world to add the graph to
+    :param count: the number of nodes
+    :param degree: the average number of paths per node
+    :param spacing: the average distance in meters between neighbouring nodes
+    :return: the list of nodes that were added
+    """
+    rand = random.Random(world.active_seed)
+    side = spacing * count ** 0.5
+    radius = spacing * (degree / math.pi) ** 0.5 * METER
+    nodes = [world.add_path_node(rand.uniform(0, side), rand.uniform(0, side)) for _ in range(count)]
+    order = {node: i for i, node in enumerate(nodes)}
+    for node in nodes:
+        for other in sorted(world.index.within(node, radius), key=order.get):
+            if order[other] > order[node]:
+                world.add_path(node, other)
+    return nodes
+
+
+def make_chains(world: World, count: int, chain_length: int = 50, spacing: int = 5) -> [PathNode]:
+    """
+    Fill the world with a grid of junctions where every grid edge is a long chain of nodes with two paths each,
+    wandering a little to the side, to stress following chains in Path.find_route and the junction graph. The layout
+    comes from the world's seed.
+
+    :param world: the world to add the graph to
+    :param count: the approximate number of nodes
+    :param chain_length: the number of paths in each chain between two junctions
+    :param spacing: the distance in meters between neighbouring nodes along a chain
+    :return: the list of nodes that were added
+    """
+    rand = random.Random(world.active_seed)
+    # a side x side grid of junctions has 2 * side * (side - 1) chains, each adding chain_length - 1 nodes
+    side = max(2, round((count / (2 * (chain_length - 1))) ** 0.5))
+    step = spacing * chain_length
+    junctions = [world.add_path_node(u * step, v * step) for v in range(side) for u in range(side)]
+    nodes = list(junctions)
+    for v in range(side):
+        for u in range(side):
+            for du, dv in ((1, 0), (0, 1)):
+                if u + du >= side or v + dv >= side:
+                    continue
+                previous = junctions[v * side + u]
+                for i in range(1, chain_length):
+                    wander = rand.uniform(-spacing, spacing)
+                    node = world.add_path_node(u * step + i * spacing * du + wander * dv,
+                                               v * step + i * spacing * dv + wander * du)
+                    world.add_path(previous, node)
+                    nodes.append(node)
+                    previous = node
+                world.add_path(previous, junctions[(v + dv) * side + u + du])
+    return nodes
+
+
+GENERATORS = {
+    'grid': lambda world, size: make_grid(world, max(2, round(size ** 0.5))),
+    'planar': lambda world, size: make_planar(world, max(2, round(size ** 0.5))),
+    'geometric': lambda world, size: make_geometric(world, max(2, size)),
+    'chains': lambda world, size: make_chains(world, size),
+}
+
+
+MODES = {
+    'dijkstra': lambda world, start, end, stats: start.find_shortest_route(end, None, stats),
+    'astar': lambda world, start, end, stats: start.find_shortest_route(end, euclidean, stats),
+    'junctions': lambda world, start, end, stats: world.search_route(start, end, False, stats),
+    'junctions-astar': lambda world, start, end, stats: world.search_route(start, end, True, stats),
+    'csr-dijkstra': lambda world, start, end, stats: world.search_route(start, end, False, stats, 'compiled'),
+    'csr-astar': lambda world, start, end, stats: world.search_route(start, end, True, stats, 'compiled'),
+    'bidirectional': lambda world, start, end, stats: start.find_shortest_route(end, None, stats, True),
+    'bidir-astar': lambda world, start, end, stats: start.find_shortest_route(end, euclidean, stats, True),
+    'csr-bidir': lambda world, start, end, stats: world.search_route(start, end, False, stats, 'bidirectional'),
+    'csr-bidir-astar': lambda world, start, end, stats: world.search_route(start, end, True, stats, 'bidirectional'),
+    'hierarchy': lambda world, start, end, stats: world.search_route(start, end, False, stats, 'hierarchy'),
+    'turns': lambda world, start, end, stats: world.search_route(start, end, False, stats, 'turns'),
+    'turns-astar': lambda world, start, end, stats: world.search_route(start, end, True, stats, 'turns'),
+}
+
+
+def time_queries(world: World, nodes: [PathNode], queries: int, seed: int, mode: str) -> (float, float):
+    """
+    Time one of the routing modes between random pairs of nodes.
+
+    :param world: the world the nodes belong to
+    :param nodes: the nodes to pick the start and end points from
+    :param queries: the number of queries to run
+    :param seed: the seed used to pick the pairs
+    :param mode: the name of the routing mode in MODES
+    :return: the average number of seconds per query and the average number of nodes expanded
+    """
+    rand = random.Random(seed)
+    pairs = [(rand.choice(nodes), rand.choice(nodes)) for _ in range(queries)]
+    find_route = MODES[mode]
+    stats = SearchStats()
+    if mode.startswith('csr'):
+        world.compile()
+    if mode == 'hierarchy' and world.hierarchy is None:
+        world.build_hierarchy()
+    if mode.startswith('turns'):
+        world.turn_table()
+    start_time = time.perf_counter()
+    for start, end in pairs:
+        find_route(world, start, end, stats)
+    return (time.perf_counter() - start_time) / queries, stats.expanded / queries
+
+
+def time_parallel(world: World, nodes: [PathNode], queries: int, seed: int, processes: int,
+                  method: str = 'compiled') -> float:
+    """
+    Time a batch of queries spread over a pool of worker processes.
+
+    :param world: the world the nodes belong to
+    :param nodes: the nodes to pick the start and end points from
+    :param queries: the number of queries in the batch
+    :param seed: the seed used to pick the pairs
+    :param processes: the number of worker processes
+    :param method: the routing method the workers use
+    :return: the number of seconds the batch took, not counting starting the pool
+    """
+    rand = random.Random(seed)
+    pairs = [(rand.choice(nodes), rand.choice(nodes)) for _ in range(queries)]
+    with RoutePool(world, processes, method) as pool:
+        start_time = time.perf_counter()
+        pool.find_routes(pairs)
+        return time.perf_counter() - start_time
+
+
+def time_edits(world: World, nodes: [PathNode], edits: int, seed: int) -> (float, float):
+    """
+    Time adding a path to a drawn world, as the mouse handlers do, against drawing the whole world again.
+
+    This needs a display for the Tk canvas.
+
+    :param world: the world to edit
+    :param nodes: the nodes to start the new paths from
+    :param edits: the number of paths to add
+    :param seed: the seed used to place the new paths
+    :return: the average seconds per edit, and the seconds to draw the whole world
+    """
+    rand = random.Random(seed)
+    world.draw()
+    start_time = time.perf_counter()
+    for _ in range(edits):
+        node = rand.choice(nodes)
+        new_node = world.add_path_node(node.u + rand.uniform(-3, 3), node.v + rand.uniform(-3, 3))
+        world.add_path(node, new_node)
+        world.draw()
+        world.root.update()
+    edit_time = (time.perf_counter() - start_time) / edits
+
+    world.built = False
+    start_time = time.perf_counter()
+    world.draw()
+    world.root.update()
+    return edit_time, time.perf_counter() - start_time
+
+
+def time_geometry(world: World) -> {str: (float, float)}:
+    """
+    Time the scalar geometry helpers in a loop over every path against their batch counterparts.
+
+    :param world: the world whose paths to measure
+    :return: the seconds taken by the scalar loop and by the batch call, for distances, angles and points
+    """
+    paths = [path for path, _ in world.paths.values()]
+    x1 = np.array([path.node1.x for path in paths])
+    y1 = np.array([path.node1.y for path in paths])
+    x2 = np.array([path.node2.x for path in paths])
+    y2 = np.array([path.node2.y for path in paths])
+    angles = get_angles(x1, y1, x2, y2)
+
+    def best_of(function, runs: int = 3) -> float:
+        times = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start_time)
+        return min(times)
+
+    return {
+        'distances': (best_of(lambda: [get_distance(path.node1, path.node2) for path in paths]),
+                      best_of(lambda: get_distances(x1, y1, x2, y2))),
+        'angles': (best_of(lambda: [get_angle(path.node1, path.node2) for path in paths]),
+                   best_of(lambda: get_angles(x1, y1, x2, y2))),
+        'points': (best_of(lambda: [get_point(path.node1, angle, METER) for path, angle in zip(paths, angles)]),
+                   best_of(lambda: get_points(x1, y1, angles, METER))),
+    }
+
+
+def time_objects(side: int, queries: int, seed: int) -> (float, float, float, float):
+    """
+    Measure the memory and build time of a side x side grid made of bare path nodes and paths, wired together the
+    way World.add_path does but without the world's indexes, and time routing over it.
+
+    :param side: the number of nodes along each side of the grid
+    :param queries: the number of queries to time
+    :param seed: the seed used to pick the pairs
+    :return: the bytes per node (counting its paths), the seconds to build the grid, the average seconds per query
+        and the average nodes expanded per query
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    nodes = [PathNode(v * side + u, u * 5, v * 5) for v in range(side) for u in range(side)]
+    id = 0
+    for v in range(side):
+        for u in range(side):
+            node = nodes[v * side + u]
+            for other in ([nodes[v * side + u + 1]] if u + 1 < side else []) + \
+                         ([nodes[(v + 1) * side + u]] if v + 1 < side else []):
+                node.paths[id] = Path(id, node, other)
+                other.paths[id] = Path(id, other, node)
+                id += 1
+    build_time = time.perf_counter() - start_time
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rand = random.Random(seed)
+    stats = SearchStats()
+    start_time = time.perf_counter()
+    for _ in range(queries):
+        rand.choice(nodes).find_shortest_route(rand.choice(nodes), euclidean, stats)
+    return size / len(nodes), build_time, (time.perf_counter() - start_time) / queries, stats.expanded / queries
+
+
+def time_storage(world: World, file: str) -> (float, float, float, int):
+    """
+    Time saving a world with its compiled graph and hierarchy, and loading it back with and without mapping the file.
+
+    :param world: the world to save
+    :param file: the path of the file to write
+    :return: the seconds to save, to load mapped and to load read, and the size of the file in bytes
+    """
+    start_time = time.perf_counter()
+    world.save(file)
+    save_time = time.perf_counter() - start_time
+    times = []
+    for mmap in (True, False):
+        start_time = time.perf_counter()
+        World(seed=world.seed).load(file, mmap)
+        times.append(time.perf_counter() - start_time)
+    return save_time, times[0], times[1], os.path.getsize(file)
+
+
+def time_import(world: World, folder: str) -> ImportReport:
+    """
+    Export a world to node and edge files and time importing them into a new world.
+
+    :param world: the world to export
+    :param folder: the folder to write the files to
+    :return: the report of the import
+    """
+    node_file, edge_file = os.path.join(folder, 'nodes.csv'), os.path.join(folder, 'edges.csv')
+    export_csv(world, node_file, edge_file)
+    return import_csv(World(seed=world.seed), node_file, edge_file)
+
+
+def time_profiling(world: World, nodes: [PathNode], queries: int, seed: int) -> (float, float, QueryProfiler):
+    """
+    Time find_shortest_route by each method with and without profiling, over the same pairs of nodes. The route
+    cache is turned off, so every query is searched.
+
+    :return: the average seconds per query without and with profiling, and the profiler with the histograms
+    """
+    rand = random.Random(seed)
+    pairs = [(rand.choice(nodes), rand.choice(nodes)) for _ in range(queries)]
+    methods = [(method, astar) for method in ('junctions', 'compiled', 'bidirectional') for astar in (False, True)]
+    methods.append(('hierarchy', False))
+    world.route_cache.size = 0
+    world.compile()
+    world.build_hierarchy()
+
+    def run() -> float:
+        start_time = time.perf_counter()
+        for method, astar in methods:
+            for start, end in pairs:
+                world.find_shortest_route(start, end, astar, method=method)
+        return (time.perf_counter() - start_time) / (queries * len(methods))
+
+    plain_time = run()
+    profiler = world.start_profiling()
+    profiled_time = run()
+    world.stop_profiling()
+    return plain_time, profiled_time, profiler
+
+
+def time_alternatives(world: World, nodes: [PathNode], queries: int, k: int, seed: int) -> {str: float}:
+    """
+    Time finding k routes between random pairs of nodes against finding one.
+
+    :return: the average seconds per query of one route by Dijkstra and by A*, of the k shortest routes and of the
+        shortest route with its alternatives, and the average number of alternatives found
+    """
+    rand = random.Random(seed)
+    pairs = [tuple(rand.sample(nodes, 2)) for _ in range(queries)]
+    world.compile()
+    times = {}
+    found = 0
+    methods = {'dijkstra': lambda start, end: [world.search_route(start, end, False, None, 'compiled')],
+               'astar': lambda start, end: [world.search_route(start, end, True, None, 'compiled')],
+               'yen': lambda start, end: world.k_shortest_routes(start, end, k),
+               'alternatives': lambda start, end: world.alternative_routes(start, end, k)}
+    for name, find_routes in methods.items():
+        start_time = time.perf_counter()
+        for start, end in pairs:
+            routes = find_routes(start, end)
+            if name == 'alternatives':
+                found += len(routes) - 1
+        times[name] = (time.perf_counter() - start_time) / queries
+    times['found'] = found / queries
+    return times
+
+
+def time_tour(world: World, nodes: [PathNode], stops: int, seed: int, time_budget: float,
+              method: str = 'compiled') -> (float, float, float, float, float):
+    """
+    Time planning a closed tour through random stops, in its three parts.
+
+    :return: the seconds taken to work out the cost matrix, to order the stops and to join the route, and the cost of
+        the nearest neighbour tour and of the final one
+    """
+    stops = random.Random(seed).sample(nodes, stops)
+    if method == 'hierarchy' and world.hierarchy is None:
+        world.build_hierarchy()
+    start_time = time.perf_counter()
+    if method == 'compiled':
+        matrix, previous = world.distance_matrix(stops, stops, True)
+    else:
+        matrix, previous = world.distance_matrix(stops, stops, method=method), None
+    matrix_time = time.perf_counter()
+    order = solve_tour(matrix, 0, True, time_budget)
+    order_time = time.perf_counter()
+    world.tour_route(stops, order, True, matrix, previous, method)
+    route_time = time.perf_counter() - order_time
+    costs = matrix.tolist()
+    nearest = nearest_neighbour_tour(costs)
+    return (matrix_time - start_time, order_time - matrix_time, route_time, tour_cost(costs, nearest + [0]),
+            tour_cost(costs, order + [0]))
+
+
+def time_traffic(world: World, nodes: [PathNode], batches: int, batch_size: int, seed: int) -> (float, float):
+    """
+    Time batches of random speed changes, each followed by a travel time query, as a live traffic feed would make.
+
+    :param world: the world to change
+    :param nodes: the nodes to pick the start and end points from
+    :param batches: the number of batches of changes
+    :param batch_size: the number of paths changed in each batch
+    :param seed: the seed used to pick the paths, speeds and queries
+    :return: the number of changes applied per second, and the average seconds per query
+    """
+    rand = random.Random(seed)
+    ids = list(world.paths)
+    world.compile('time')
+    update_time = query_time = 0
+    for _ in range(batches):
+        changed = rand.sample(ids, min(batch_size, len(ids)))
+        speeds = [rand.choice((0, 5, 10, 15, 20, 30)) for _ in changed]
+        start_time = time.perf_counter()
+        world.update_speeds(changed, speeds)
+        update_time += time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        world.find_shortest_route(rand.choice(nodes), rand.choice(nodes), True, None, 'compiled', 'time')
+        query_time += time.perf_counter() - start_time
+    return batches * batch_size / update_time, query_time / batches
+
+
+def time_nearest(world: World, lookups: int, seed: int) -> float:
+    """
+    Time finding the nearest path node to random points over the area the world's nodes cover.
+
+    :param world: the world to search
+    :param lookups: the number of points to look up
+    :param seed: the seed used to place the points
+    :return: the average seconds per lookup
+    """
+    rand = random.Random(seed)
+    xs = [node.x for node in world.path_nodes.values()]
+    ys = [node.y for node in world.path_nodes.values()]
+    points = [(rand.uniform(min(xs), max(xs)), rand.uniform(min(ys), max(ys))) for _ in range(lookups)]
+    start_time = time.perf_counter()
+    for point in points:
+        world.get_nearest_path_node(point)
+    return (time.perf_counter() - start_time) / lookups
+
+
+def time_draw(world: World) -> float:
+    """
+    Time drawing the whole world from scratch. This needs a display for the Tk canvas.
+
+    :return: the seconds the draw took, including Tk drawing the canvas
+    """
+    world.built = False
+    start_time = time.perf_counter()
+    world.draw()
+    world.root.update()
+    return time.perf_counter() - start_time
+
+
+def run_suite(graphs: [str], sizes: [int], modes: [str], queries: int, seed: int, draw: bool = False) -> [dict]:
+    """
+    Build each kind of graph at each size from the same seed and time building it, looking up nearest nodes, each
+    routing mode and (optionally) drawing it, printing a line per result as it goes.
+
+    :param graphs: the names of the generators in GENERATORS to use
+    :param sizes: the approximate number of nodes of each graph
+    :param modes: the names of the routing modes in MODES to time
+    :param queries: the number of routes and nearest node lookups to time on each graph
+    :param seed: the seed for the worlds and the queries
+    :param draw: also time drawing each graph, which needs a display
+    :return: a record of each result
+    """
+    records = []
+
+    def record(graph: str, world: World, benchmark: str, seconds: float, mode: str = None, expanded: float = None):
+        records.append({'graph': graph, 'size': size, 'nodes': len(world.path_nodes), 'paths': len(world.paths),
+                        'seed': seed, 'benchmark': benchmark, 'mode': mode, 'seconds': seconds, 'expanded': expanded})
+        print(f'{graph:<10}{len(world.path_nodes):>10}{benchmark:>10}{mode or "":>17}{seconds * 1000:>12.3f}'
+              f'{"" if expanded is None else f"{expanded:.0f}":>10}')
+
+    print(f'{"graph":<10}{"nodes":>10}{"benchmark":>10}{"mode":>17}{"time (ms)":>12}{"expanded":>10}')
+    for size in sizes:
+        for graph in graphs:
+            world = World(seed=seed)
+            start_time = time.perf_counter()
+            nodes = GENERATORS[graph](world, size)
+            record(graph, world, 'build', time.perf_counter() - start_time)
+            record(graph, world, 'nearest', time_nearest(world, queries, seed))
+            for mode in modes:
+                query_time, expanded = time_queries(world, nodes, queries, seed, mode)
+                record(graph, world, 'route', query_time, mode, expanded)
+            if draw:
+                record(graph, world, 'draw', time_draw(world))
+                world.root.destroy()
+    return records
+
+
+def environment() -> dict:
+    """
+    A description of the machine and versions the benchmarks ran on, to store next to the results.
+    """
+    import platform
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'system': platform.system(), 'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+
+STARTUP_SCRIPT = """
+import sys, time
+start_time = time.perf_counter()
+import world
+imported = time.perf_counter()
+world.World()
+print(imported - start_time, time.perf_counter() - imported, 'tkinter' in sys.modules)
+"""
+
+
+def time_startup(runs: int = 5) -> (float, float, bool):
+    """
+    Time importing the routing core and making an empty world in fresh interpreters.
+
+    :param runs: the number of interpreters to start
+    :return: the best import time, the best time to make a world, and whether tkinter was ever imported
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        results.append((float(output[0]), float(output[1]), output[2] == 'True'))
+    return min(r[0] for r in results), min(r[1] for r in results), any(r[2] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time building, searching and routing on synthetic graphs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='the approximate number of nodes of each graph (up to 1_000_000)')
+    parser.add_argument('--queries', type=int, default=20, help='the number of queries per graph')
+    parser.add_argument('--seed', type=int, default=1, help='the seed for the graphs and queries')
+    parser.add_argument('--graphs', nargs='+', choices=GENERATORS, default=list(GENERATORS),
+                        help='the kinds of graph to build')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='the routing modes to time')
+    parser.add_argument('--draw', action='store_true', help='also time drawing each graph (needs a display)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results with a description of the machine to FILE as JSON, for tracking '
+                             'performance over time')
+    parser.add_argument('--processes', type=int, nargs='+',
+                        help='time batches of queries on pools of these sizes instead of single queries')
+    parser.add_argument('--startup', action='store_true', help='time importing the core and making a world')
+    parser.add_argument('--render', action='store_true',
+                        help='time editing a drawn world against drawing it from scratch (needs a display)')
+    parser.add_argument('--geometry', action='store_true',
+                        help='time the scalar geometry helpers against their batch counterparts')
+    parser.add_argument('--objects', action='store_true',
+                        help='measure the memory of bare node and path objects and the speed of routing over them')
+    parser.add_argument('--storage', metavar='FILE',
+                        help='time building each graph against saving it to FILE and loading it back')
+    parser.add_argument('--import', dest='import_folder', metavar='FOLDER',
+                        help='time adding each graph one node and path at a time against exporting it to CSV files in '
+                             'FOLDER and importing them')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='',
+                        help='time routing with profiling on and off and show the histograms of each method, '
+                             'writing them to FILE as JSON if given')
+    parser.add_argument('--alternatives', type=int, metavar='K',
+                        help='time finding K routes with Yen\'s algorithm and with the penalty method against one')
+    parser.add_argument('--tour', type=int, metavar='STOPS',
+                        help='time planning a tour through this many random stops, in its parts')
+    parser.add_argument('--tour-method', choices=('compiled', 'hierarchy'), default='compiled',
+                        help='the distance matrix method for --tour')
+    parser.add_argument('--time-budget', type=float, default=1.0, help='the seconds to spend improving each tour')
+    parser.add_argument('--traffic', type=int, metavar='CHANGES',
+                        help='time batches of this many speed changes with a travel time query after each')
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            plain_time, profiled_time, profiler = time_profiling(world, nodes, args.queries, args.seed)
+            print(f'planar graph of {len(nodes)} nodes: {plain_time * 1000:.3f} ms per query, '
+                  f'{profiled_time * 1000:.3f} ms profiled')
+            profiler.dump()
+            if args.profile:
+                profiler.export(args.profile)
+        return
+
+    if args.tour:
+        print(f'{"graph":<8}{"nodes":>10}{"stops":>7}{"matrix (s)":>12}{"order (s)":>11}{"route (s)":>11}'
+              f'{"nearest":>10}{"tour":>10}{"saved":>7}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            matrix_time, order_time, route_time, nearest, cost = time_tour(world, nodes, min(args.tour, len(nodes)),
+                                                                           args.seed, args.time_budget,
+                                                                           args.tour_method)
+            print(f'{"planar":<8}{len(nodes):>10}{min(args.tour, len(nodes)):>7}{matrix_time:>12.2f}'
+                  f'{order_time:>11.2f}{route_time:>11.2f}{nearest:>10.0f}{cost:>10.0f}{1 - cost / nearest:>7.1%}')
+        return
+
+    if args.alternatives:
+        print(f'{"graph":<8}{"nodes":>10}{"dijkstra (ms)":>15}{"astar (ms)":>12}{"yen (ms)":>10}'
+              f'{"alternatives (ms)":>19}{"found":>7}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            times = time_alternatives(world, nodes, args.queries, args.alternatives, args.seed)
+            print(f'{"planar":<8}{len(nodes):>10}{times["dijkstra"] * 1000:>15.2f}{times["astar"] * 1000:>12.2f}'
+                  f'{times["yen"] * 1000:>10.2f}{times["alternatives"] * 1000:>19.2f}{times["found"]:>7.1f}')
+        return
+
+    if args.traffic:
+        print(f'{"graph":<8}{"nodes":>10}{"changes/s":>12}{"query (ms)":>12}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            changes, query_time = time_traffic(world, nodes, args.queries, args.traffic, args.seed)
+            print(f'{"planar":<8}{len(nodes):>10}{changes:>12.0f}{query_time * 1000:>12.2f}')
+        return
+
+    if args.import_folder:
+        print(f'{"graph":<8}{"nodes":>10}{"paths":>10}{"add (s)":>9}{"import (s)":>12}{"build (s)":>11}'
+              f'{"records/s":>11}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            start_time = time.perf_counter()
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            add_time = time.perf_counter() - start_time
+            report = time_import(world, args.import_folder)
+            print(f'{"planar":<8}{len(nodes):>10}{len(world.paths):>10}{add_time:>9.2f}{report.read_time:>12.2f}'
+                  f'{report.build_time:>11.2f}{report.records_per_second:>11.0f}')
+        return
+
+    if args.storage:
+        print(f'{"graph":<8}{"nodes":>10}{"build (s)":>11}{"save (s)":>10}{"mapped (s)":>12}{"read (s)":>10}'
+              f'{"size (MB)":>11}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            start_time = time.perf_counter()
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            world.build_hierarchy()
+            build_time = time.perf_counter() - start_time
+            save_time, mapped_time, read_time, file_size = time_storage(world, args.storage)
+            print(f'{"planar":<8}{len(nodes):>10}{build_time:>11.2f}{save_time:>10.2f}{mapped_time:>12.2f}'
+                  f'{read_time:>10.2f}{file_size / 1e6:>11.1f}')
+        return
+
+    if args.objects:
+        print(f'{"graph":<8}{"nodes":>10}{"bytes/node":>12}{"build (s)":>11}{"query (ms)":>12}{"expanded":>10}')
+        for size in args.sizes:
+            side = max(2, round(size ** 0.5))
+            node_size, build_time, query_time, expanded = time_objects(side, args.queries, args.seed)
+            print(f'{"grid":<8}{side * side:>10}{node_size:>12.0f}{build_time:>11.2f}{query_time * 1000:>12.2f}'
+                  f'{expanded:>10.0f}')
+        return
+
+    if args.geometry:
+        print(f'{"graph":<8}{"paths":>10}{"kernel":>11}{"scalar (ms)":>13}{"batch (ms)":>12}{"speedup":>9}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            make_planar(world, max(2, round(size ** 0.5)))
+            for kernel, (scalar_time, batch_time) in time_geometry(world).items():
+                print(f'{"planar":<8}{len(world.paths):>10}{kernel:>11}{scalar_time * 1000:>13.2f}'
+                      f'{batch_time * 1000:>12.2f}{scalar_time / batch_time:>9.1f}')
+        return
+
+    if args.render:
+        print(f'{"graph":<8}{"nodes":>10}{"edit (ms)":>11}{"full draw (ms)":>16}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            edit_time, draw_time = time_edits(world, nodes, args.queries, args.seed)
+            print(f'{"planar":<8}{len(nodes):>10}{edit_time * 1000:>11.2f}{draw_time * 1000:>16.2f}')
+        return
+
+    if args.startup:
+        import_time, world_time, tkinter_loaded = time_startup()
+        print(f'import world: {import_time * 1000:.1f} ms, World(): {world_time * 1000:.2f} ms, '
+              f'tkinter imported: {tkinter_loaded}')
+        return
+
+    if args.processes:
+        print(f'{"graph":<8}{"nodes":>10}{"processes":>11}{"batch (s)":>11}{"speedup":>9}')
+        for size in args.sizes:
+            world = World(seed=args.seed)
+            nodes = make_planar(world, max(2, round(size ** 0.5)))
+            base = None
+            for processes in args.processes:
+                batch_time = time_parallel(world, nodes, args.queries, args.seed, processes)
+                base = base or batch_time
+                print(f'{"planar":<8}{len(nodes):>10}{processes:>11}{batch_time:>11.2f}{base / batch_time:>9.2f}')
+        return
+
+    records = run_suite(args.graphs, args.sizes, args.modes, args.queries, args.seed, args.draw)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'environment': environment(), 'results': records}, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
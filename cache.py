@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+
+from my_globals import *
+from node import *
+
+
+class RouteCache:
+    """
+    A size bounded cache of the routes found between pairs of path nodes, dropping the least recently used first.
+
+    Routes are stored under (start id, end id, weight), where weight is the one of WEIGHTS the route was found by. A
+    pair with no route is cached as None, so use lookup to tell a cached None from a miss. Routes are copied on the
+    way in and out, so callers are free to change what they get.
+
+    The key leaves out the search method, so a route cached by one method is handed back to the others. That is only
+    right because every method finds a shortest route by its weight: two methods may pick different routes of the same
+    cost, but never routes of different costs. A method that can't promise that must not share the cache.
+    """
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.routes: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, start: PathNode, end: PathNode, weight: str = 'length') -> (bool, Route):
+        """
+        Look for a cached route.
+
+        :param start: the node the route starts at
+        :param end: the node the route ends at
+        :param weight: the weight the route was found by
+        :return: whether the route was cached, and the route
+        """
+        key = (start.id, end.id, weight)
+        if key not in self.routes:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.routes.move_to_end(key)
+        route = self.routes[key]
+        return True, None if route is None else route.copy()
+
+    def store(self, start: PathNode, end: PathNode, route: Route, weight: str = 'length'):
+        if self.size <= 0:
+            return
+        key = (start.id, end.id, weight)
+        self.routes[key] = None if route is None else route.copy()
+        self.routes.move_to_end(key)
+        while len(self.routes) > self.size:
+            self.routes.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Forget every cached route.
+        """
+        self.invalidations += len(self.routes)
+        self.routes.clear()
+
+    def invalidate_path(self, path: Path):
+        """
+        Forget the cached routes that a new path could make shorter.
+
+        A route from s to t can only be beaten by going s -> a -> b -> t along the new path (a, b) in one direction or
+        the other, and no route is shorter than a straight line, so routes that are no longer than the straight line
+        version of that detour are kept. Pairs that had no route are always forgotten, as the path may join them.
+
+        The straight line bound only holds for routes found by length. A route found by another weight is kept only
+        when it costs no more than the new path alone.
+        """
+        a, b, length = path.node1, path.node2, path.length
+        self.forget([key for key, route in self.routes.items()
+                     if route is None
+                     or (key[2] == 'length' and min(route.start.get_distance_from(a) + route.end.get_distance_from(b),
+                                                    route.start.get_distance_from(b) + route.end.get_distance_from(a))
+                         + length < route.length)
+                     or (key[2] != 'length' and getattr(path, key[2]) < route.cost)])
+
+    def invalidate_removed_path(self, path: Path):
+        """
+        Forget the cached routes that run along a path that has been taken away, in either direction.
+
+        Taking a path away can't make any other route shorter or join a pair that had no route, so nothing else is
+        forgotten.
+        """
+        ends = {(path.node1.id, path.node2.id), (path.node2.id, path.node1.id)}
+        self.forget([key for key, route in self.routes.items() if route is not None and any(
+            (node1.id, node2.id) in ends for node1, node2 in zip(route.nodes, route.nodes[1:]))])
+
+    def invalidate_weights(self, weight: str, changes: [(Path, float, float)]):
+        """
+        Forget the cached routes that changing the weights of some paths could make wrong.
+
+        A route that runs along a path whose weight went up may no longer be the best, and a route could only be
+        beaten by a path whose weight went down if the route costs more than that path alone now does. Pairs that had
+        no route are forgotten if any weight went down, as a closed path may have been opened again.
+
+        :param weight: the weight that was changed
+        :param changes: the path, old weight and new weight of each change
+        """
+        raised = set()
+        lowest = math.inf
+        for path, old, new in changes:
+            if new > old:
+                raised.add((path.node1.id, path.node2.id))
+                raised.add((path.node2.id, path.node1.id))
+            elif new < old:
+                lowest = min(lowest, new)
+        self.forget([key for key, route in self.routes.items() if key[2] == weight and (
+            (route is None and lowest < math.inf)
+            or (route is not None and (route.cost > lowest or (raised and any(
+                (node1.id, node2.id) in raised for node1, node2 in zip(route.nodes, route.nodes[1:]))))))])
+
+    def forget(self, keys):
+        for key in keys:
+            del self.routes[key]
+            self.invalidations += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __repr__(self):
+        return f'RouteCache(size:{len(self.routes)}/{self.size}, hits:{self.hits}, misses:{self.misses}, ' \
+               f'evictions:{self.evictions}, invalidations:{self.invalidations})'
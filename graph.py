@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+from itertools import count
+
+from my_globals import *
+from search import SearchStats
+from node import get_distances
+
+
+class CompiledGraph:
+    """
+    A frozen, array backed copy of a world's path nodes and paths in compressed sparse row form.
+
+    Nodes are stored in order of their id, so the index of a node is found with a binary search on ids. The paths
+    leaving the node at index i are the entries offsets[i] to offsets[i + 1] of targets, weights and path_ids. Every
+    path in the world is stored once in each direction.
+
+    The nodes and edges are never changed once built; compile the world again after editing it. The weights can be
+    changed in place with set_weights, and with_weights makes a copy of the graph with other weights that shares
+    everything else.
+    """
+
+    def __init__(self, ids: np.ndarray, xs: np.ndarray, ys: np.ndarray, offsets: np.ndarray, targets: np.ndarray,
+                 weights: np.ndarray, path_ids: np.ndarray):
+        self.ids = ids
+        self.xs = xs
+        self.ys = ys
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.path_ids = path_ids
+
+        # memoryviews hand out plain python numbers, which keeps the search loops fast without copying the arrays
+        self._xs = xs.data
+        self._ys = ys.data
+        self._offsets = offsets.data
+        self._targets = targets.data
+        self._weights = weights.data
+        self.edge_order = None  # the edges sorted by path id, made on the first call to edges_of
+
+    @classmethod
+    def from_edges(cls, ids, xs, ys, sources, targets, path_ids) -> CompiledGraph:
+        """
+        Build a compiled graph from flat lists of nodes and undirected edges.
+
+        :param ids: the id of each node
+        :param xs: the x coordinate of each node
+        :param ys: the y coordinate of each node
+        :param sources: the id of the first node of each edge
+        :param targets: the id of the second node of each edge
+        :param path_ids: the id of each edge
+        :return: the compiled graph
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        ids = ids[order]
+        xs = np.asarray(xs, dtype=np.float64)[order]
+        ys = np.asarray(ys, dtype=np.float64)[order]
+
+        sources = np.searchsorted(ids, np.asarray(sources, dtype=np.int64))
+        targets = np.searchsorted(ids, np.asarray(targets, dtype=np.int64))
+        path_ids = np.asarray(path_ids, dtype=np.int64)
+
+        # store each edge in both directions, grouped by the node it leaves from
+        tails = np.concatenate((sources, targets))
+        heads = np.concatenate((targets, sources))
+        path_ids = np.concatenate((path_ids, path_ids))
+        order = np.argsort(tails, kind='stable')
+        tails, heads, path_ids = tails[order], heads[order], path_ids[order]
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=len(ids)), out=offsets[1:])
+        weights = get_distances(xs[tails], ys[tails], xs[heads], ys[heads])
+        return cls(ids, xs, ys, offsets, heads.astype(np.int64), weights, path_ids)
+
+    def arrays(self) -> {str: np.ndarray}:
+        """
+        The arrays the graph is made of, by the names the constructor takes them as.
+        """
+        return {'ids': self.ids, 'xs': self.xs, 'ys': self.ys, 'offsets': self.offsets, 'targets': self.targets,
+                'weights': self.weights, 'path_ids': self.path_ids}
+
+    def with_weights(self, weights: np.ndarray) -> CompiledGraph:
+        """
+        Make a graph with the same nodes and edges as this one but other edge weights.
+
+        :param weights: the weight of each edge, in the order of targets
+        :return: the new graph, which shares every array but the weights with this one
+        """
+        graph = CompiledGraph(self.ids, self.xs, self.ys, self.offsets, self.targets, weights, self.path_ids)
+        graph.edge_order = self.edge_order
+        return graph
+
+    def edges_of(self, path_ids) -> np.ndarray:
+        """
+        Find both edges (one in each direction) of each of the given paths.
+
+        :param path_ids: the ids of the paths
+        :return: an array with a row of two edge positions per path
+        """
+        if self.edge_order is None:
+            self.edge_order = np.argsort(self.path_ids, kind='stable')
+        path_ids = np.asarray(path_ids, dtype=np.int64)
+        sorted_ids = self.path_ids[self.edge_order]
+        positions = np.searchsorted(sorted_ids, path_ids)
+        found = positions + 1 < len(sorted_ids)
+        found[found] &= (sorted_ids[positions[found]] == path_ids[found])
+        if not found.all():
+            raise KeyError(int(path_ids[~found][0]))
+        return self.edge_order[np.stack((positions, positions + 1), axis=1)]
+
+    def set_weights(self, path_ids, values):
+        """
+        Change the weights of some paths in place, in both directions.
+
+        :param path_ids: the ids of the paths
+        :param values: the new weight of each path
+        """
+        self.weights[self.edges_of(path_ids).ravel()] = np.repeat(np.asarray(values, dtype=np.float64), 2)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def checksum(self) -> np.ndarray:
+        """
+        A digest of the nodes, edges and weights of the graph, to tell whether something made from a graph (such as a
+        contraction hierarchy) was made from this one.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (self.ids, self.offsets, self.targets, self.weights):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return np.frombuffer(digest.digest(), dtype=np.uint8)
+
+    def index_of(self, id: int) -> int:
+        """
+        Find the index of the node with the given id.
+
+        :param id: the id of the path node
+        :return: the index of the node in the arrays
+        """
+        index = int(np.searchsorted(self.ids, id))
+        if index == len(self.ids) or self.ids[index] != id:
+            raise KeyError(id)
+        return index
+
+    def neighbours(self, index: int):
+        """
+        Yield the (index, weight) of every node that can be reached directly from the node at the given index.
+        """
+        for edge in range(self._offsets[index], self._offsets[index + 1]):
+            yield self._targets[edge], self._weights[edge]
+
+    def euclidean(self, index: int, target: int) -> float:
+        """
+        The straight line distance between the nodes at two indexes, for use as an A* heuristic.
+        """
+        return math.hypot(self._xs[target] - self._xs[index], self._ys[target] - self._ys[index])
+
+    def search_from(self, source: int, targets=None, limit: float = math.inf,
+                    stats: SearchStats = None) -> ({int: float}, {int: int}):
+        """
+        Run Dijkstra outwards from one node, settling every node it can reach unless told to stop early.
+
+        :param source: the index of the node to start from
+        :param targets: the indexes of nodes to stop once all are settled, or None to search the whole graph
+        :param limit: the largest distance to search up to
+        :param stats: optional counters to add the work done to
+        :return: the distance to and the previous node of each settled node
+        """
+        offsets = self._offsets
+        heads = self._targets
+        weights = self._weights
+
+        remaining = None if targets is None else set(targets)
+        distances = {source: 0}
+        previous = {}
+        settled = {}
+        order = count()
+        heap = [(0, next(order), source)]
+        relaxed = popped = 0
+
+        while heap:
+            distance, _, node = heapq.heappop(heap)
+            popped += 1
+            if node in settled:
+                continue
+            if distance > limit:
+                break
+            settled[node] = distance
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+
+            for edge in range(offsets[node], offsets[node + 1]):
+                head = heads[edge]
+                if head in settled:
+                    continue
+                new_dist = distance + weights[edge]
+                if new_dist < distances.get(head, math.inf):
+                    relaxed += 1
+                    distances[head] = new_dist
+                    previous[head] = node
+                    heapq.heappush(heap, (new_dist, next(order), head))
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += len(settled)
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + 1
+            stats.popped += popped
+        return settled, {node: previous[node] for node in settled if node in previous}
+
+    def shortest_path(self, source: int, target: int, heuristic=None, stats: SearchStats = None) -> ([int], float):
+        """
+        Find the shortest path between two node indexes using Dijkstra, or A* when a heuristic is given.
+
+        :param source: the index of the node to start from
+        :param target: the index of the node to find a path to
+        :param heuristic: a function of (index, target index) giving a lower bound on the distance between them
+        :param stats: optional counters to add the work done to
+        :return: the list of node indexes along the path and its length, or (None, inf) if there is no path
+        """
+        offsets = self._offsets
+        targets = self._targets
+        weights = self._weights
+
+        distances = {source: 0}
+        previous = {}
+        settled = set()
+        order = count()
+        heap = [(heuristic(source, target) if heuristic else 0, next(order), 0, source)]
+        expanded = relaxed = popped = 0
+
+        while heap:
+            _, _, distance, node = heapq.heappop(heap)
+            popped += 1
+            if node in settled:
+                continue
+            expanded += 1
+            if node == target:
+                break
+            settled.add(node)
+
+            for edge in range(offsets[node], offsets[node + 1]):
+                head = targets[edge]
+                if head in settled:
+                    continue
+                new_dist = distance + weights[edge]
+                if new_dist < distances.get(head, math.inf):
+                    relaxed += 1
+                    distances[head] = new_dist
+                    previous[head] = node
+                    estimate = new_dist + heuristic(head, target) if heuristic else new_dist
+                    heapq.heappush(heap, (estimate, next(order), new_dist, head))
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += expanded
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + 1
+            stats.popped += popped
+
+        if target not in distances:
+            return None, math.inf
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path, distances[target]
+
+    def bidirectional_path(self, source: int, target: int, heuristic=None,
+                           stats: SearchStats = None) -> ([int], float):
+        """
+        Find the shortest path between two node indexes by searching from both ends at once, using bidirectional
+        Dijkstra, or bidirectional A* when a heuristic is given. Every edge is stored in both directions, so the
+        search from the target runs over the same arrays.
+
+        With a heuristic, both searches are guided by the average potential p(v) = (h(v, target) - h(v, source)) / 2,
+        keyed by distance + p(v) going forwards and distance - p(v) going backwards, which keeps the two consistent
+        with each other. The search stops once the smallest keys of the two heaps add up to at least the best path
+        found so far.
+
+        :param source: the index of the node to start from
+        :param target: the index of the node to find a path to
+        :param heuristic: a function of (index, target index) giving a lower bound on the distance between them
+        :param stats: optional counters to add the work done to
+        :return: the list of node indexes along the path and its length, or (None, inf) if there is no path
+        """
+        offsets = self._offsets
+        targets = self._targets
+        weights = self._weights
+
+        if heuristic is None:
+            potential = None
+        else:
+            potentials = {}
+
+            def potential(node: int) -> float:
+                if node not in potentials:
+                    potentials[node] = (heuristic(node, target) - heuristic(node, source)) / 2
+                return potentials[node]
+
+        distances = ({source: 0}, {target: 0})
+        previous = ({}, {})
+        settled = (set(), set())
+        signs = (1, -1)
+        order = count()
+        heaps = ([(potential(source) if potential else 0, next(order), source)],
+                 [(-potential(target) if potential else 0, next(order), target)])
+        best = 0 if source == target else math.inf
+        meeting = source if source == target else -1
+        expanded = relaxed = popped = 0
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            heap, done, before = heaps[side], settled[side], previous[side]
+            forward, backward = distances[side], distances[1 - side]
+            _, _, node = heapq.heappop(heap)
+            popped += 1
+            if node in done:
+                continue
+            done.add(node)
+            expanded += 1
+            distance = forward[node]
+
+            for edge in range(offsets[node], offsets[node + 1]):
+                head = targets[edge]
+                if head in done:
+                    continue
+                new_dist = distance + weights[edge]
+                if new_dist < forward.get(head, math.inf):
+                    relaxed += 1
+                    forward[head] = new_dist
+                    before[head] = node
+                    key = new_dist + signs[side] * potential(head) if potential else new_dist
+                    heapq.heappush(heap, (key, next(order), head))
+                    if head in backward and new_dist + backward[head] < best:
+                        best = new_dist + backward[head]
+                        meeting = head
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += expanded
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + 2
+            stats.popped += popped
+
+        if meeting < 0:
+            return None, math.inf
+        path = [meeting]
+        while path[-1] != source:
+            path.append(previous[0][path[-1]])
+        path.reverse()
+        while path[-1] != target:
+            path.append(previous[1][path[-1]])
+        return path, best
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import heapq
+import time
+
+from my_globals import *
+from graph import CompiledGraph
+from search import SearchStats
+
+
+class ContractionHierarchy:
+    """
+    A contraction hierarchy over a compiled graph, for fast point to point queries on a graph that rarely changes.
+
+    Every node is given a rank and contracted in rank order; shortcuts are added between the remaining neighbours of a
+    contracted node wherever it was the only shortest way between them. Each node keeps the edges (and shortcuts) to
+    the higher ranked nodes it was joined to when it was contracted, in compressed sparse row form, along with the
+    node each shortcut skips over so the full path can be unpacked. Paths are the same in both directions, so both
+    halves of a query search upwards through the same edges.
+    """
+
+    def __init__(self, ids: np.ndarray, rank: np.ndarray, offsets: np.ndarray, targets: np.ndarray,
+                 weights: np.ndarray, middles: np.ndarray, checksum: np.ndarray = None):
+        self.ids = ids
+        self.rank = rank
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.middles = middles  # the node a shortcut skips over, or -1 for an original path
+        self.checksum = checksum  # the checksum of the graph the hierarchy was built from
+
+        self._rank = rank.data
+        self._offsets = offsets.data
+        self._targets = targets.data
+        self._weights = weights.data
+        self._middles = middles.data
+
+    @classmethod
+    def build(cls, graph: CompiledGraph, settle_limit: int = 60) -> ContractionHierarchy:
+        """
+        Contract every node of a compiled graph, cheapest first.
+
+        A node costs twice the edge difference of contracting it (the shortcuts it needs less the edges it takes away)
+        plus the number of its neighbours contracted before it, which spreads the contractions evenly over the graph.
+        The witness searches behind a node's shortcuts are kept until one of its neighbours is contracted, so a node
+        whose cost is checked again without its edges having changed is not searched around again.
+
+        :param graph: the graph to build the hierarchy for
+        :param settle_limit: the number of nodes a witness search may settle before giving up and adding a shortcut
+        :return: the contraction hierarchy
+        """
+        count = len(graph)
+        edges = [{} for _ in range(count)]  # {neighbour: (weight, middle)} between nodes not yet contracted
+        for node in range(count):
+            for neighbour, weight in graph.neighbours(node):
+                if neighbour != node and weight < edges[node].get(neighbour, (math.inf,))[0]:
+                    edges[node][neighbour] = (weight, -1)
+
+        def witness_distances(source: int, skip: int, wanted: set, limit: float) -> dict:
+            # a small Dijkstra search that looks for other ways around the node being contracted, until it has found
+            # all the wanted nodes, gone past the limit or settled settle_limit nodes
+            distances = {source: 0}
+            remaining = len(wanted)
+            settled = 0
+            heap = [(0, source)]
+            while heap and settled < settle_limit:
+                distance, node = heapq.heappop(heap)
+                if distance > distances[node]:
+                    continue
+                if distance > limit:
+                    break
+                settled += 1
+                if node in wanted:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                for neighbour, (weight, _) in edges[node].items():
+                    new_dist = distance + weight
+                    if new_dist < distances.get(neighbour, math.inf) and neighbour != skip:
+                        distances[neighbour] = new_dist
+                        heapq.heappush(heap, (new_dist, neighbour))
+            return distances
+
+        def shortcuts(node: int) -> [(int, int, float)]:
+            neighbours = list(edges[node].items())
+            needed = []
+            for i, (first, (weight1, _)) in enumerate(neighbours[:-1]):
+                others = neighbours[i + 1:]
+                limit = weight1 + max(weight for _, (weight, _) in others)
+                distances = witness_distances(first, node, {second for second, _ in others}, limit)
+                for second, (weight2, _) in others:
+                    if distances.get(second, math.inf) > weight1 + weight2:
+                        needed.append((first, second, weight1 + weight2))
+            return needed
+
+        contracted_neighbours = [0] * count
+        # the level each node's shortcuts were worked out at and the shortcuts, until one of its neighbours is
+        # contracted and its edges change
+        cache = [None] * count
+
+        def priority(node: int) -> int:
+            if cache[node] is None:
+                cache[node] = (level, shortcuts(node))
+            return 2 * (len(cache[node][1]) - len(edges[node])) + contracted_neighbours[node]
+
+        level = 0
+        heap = [(priority(node), node) for node in range(count)]
+        heapq.heapify(heap)
+        rank = np.zeros(count, dtype=np.int64)
+        upward = [None] * count
+        while heap:
+            _, node = heapq.heappop(heap)
+            # the priority goes stale as the neighbours are contracted, so check it again before contracting
+            new_priority = priority(node)
+            if heap and new_priority > heap[0][0]:
+                heapq.heappush(heap, (new_priority, node))
+                continue
+            if cache[node][0] != level:
+                # a witness found before other nodes were contracted may have gone through one of them, so the
+                # shortcuts are worked out again before they are added
+                cache[node] = None
+                new_priority = priority(node)
+                if heap and new_priority > heap[0][0]:
+                    heapq.heappush(heap, (new_priority, node))
+                    continue
+
+            rank[node] = level
+            level += 1
+            upward[node] = edges[node]
+            for neighbour in edges[node]:
+                del edges[neighbour][node]
+                contracted_neighbours[neighbour] += 1
+                cache[neighbour] = None
+            for first, second, weight in cache[node][1]:
+                if weight < edges[first].get(second, (math.inf,))[0]:
+                    edges[first][second] = (weight, node)
+                    edges[second][first] = (weight, node)
+            edges[node] = {}
+            cache[node] = None
+
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum([len(up) for up in upward], out=offsets[1:])
+        targets = np.fromiter((neighbour for up in upward for neighbour in up), dtype=np.int64, count=offsets[-1])
+        weights = np.fromiter((weight for up in upward for weight, _ in up.values()), dtype=np.float64,
+                              count=offsets[-1])
+        middles = np.fromiter((middle for up in upward for _, middle in up.values()), dtype=np.int64,
+                              count=offsets[-1])
+        return cls(graph.ids.copy(), rank, offsets, targets, weights, middles, graph.checksum())
+
+    def arrays(self) -> {str: np.ndarray}:
+        """
+        The arrays the hierarchy is made of, by the names the constructor takes them as.
+        """
+        arrays = {'ids': self.ids, 'rank': self.rank, 'offsets': self.offsets, 'targets': self.targets,
+                  'weights': self.weights, 'middles': self.middles}
+        if self.checksum is not None:
+            arrays['checksum'] = self.checksum
+        return arrays
+
+    def save(self, file):
+        """
+        Write the hierarchy to a file (or file object) so it does not have to be built again.
+        """
+        np.savez(file, **self.arrays())
+
+    @classmethod
+    def load(cls, file) -> ContractionHierarchy:
+        """
+        Read a hierarchy written by save.
+        """
+        with np.load(file) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def matches(self, graph: CompiledGraph) -> bool:
+        """
+        Check that the hierarchy was built for this graph, with the same nodes, paths and lengths. A hierarchy saved
+        without the checksum of its graph can't be checked, so it never matches.
+        """
+        return (self.checksum is not None and np.array_equal(self.ids, graph.ids)
+                and np.array_equal(self.checksum, graph.checksum()))
+
+    def edge(self, node1: int, node2: int) -> (float, int):
+        """
+        Find the weight and middle node of the edge or shortcut between two nodes.
+        """
+        if self._rank[node1] > self._rank[node2]:
+            node1, node2 = node2, node1
+        for edge in range(self._offsets[node1], self._offsets[node1 + 1]):
+            if self._targets[edge] == node2:
+                return self._weights[edge], self._middles[edge]
+        raise KeyError((node1, node2))
+
+    def unpack(self, node1: int, node2: int) -> [int]:
+        """
+        Expand an edge or shortcut into the original path between its two nodes, leaving out the first node.
+        """
+        path = []
+        stack = [(node1, node2)]
+        while stack:
+            first, second = stack.pop()
+            _, middle = self.edge(first, second)
+            if middle < 0:
+                path.append(second)
+            else:
+                stack.append((middle, second))
+                stack.append((first, middle))
+        return path
+
+    def upward_distances(self, source: int) -> {int: float}:
+        """
+        Search upwards from a node through the whole of its part of the hierarchy.
+
+        :param source: the index of the node to start from
+        :return: the distance to each node reached, which is only exact along the way to the shortest paths
+        """
+        offsets = self._offsets
+        targets = self._targets
+        weights = self._weights
+
+        distances = {source: 0}
+        heap = [(0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                new_dist = distance + weights[edge]
+                if new_dist < distances.get(neighbour, math.inf):
+                    distances[neighbour] = new_dist
+                    heapq.heappush(heap, (new_dist, neighbour))
+        return distances
+
+    def distance_table(self, sources: [int], targets: [int]) -> np.ndarray:
+        """
+        Find the distance from every source to every target, meeting in buckets at the top of the hierarchy.
+
+        Each target is searched upwards once and leaves its distance in a bucket at every node it reaches; each
+        source is then searched upwards once and reads the buckets of the nodes it reaches.
+
+        :param sources: the indexes of the nodes to start from
+        :param targets: the indexes of the nodes to find distances to
+        :return: an array of distances with a row per source and a column per target, inf where there is no path
+        """
+        buckets: {int: [(int, float)]} = {}
+        for column, target in enumerate(targets):
+            for node, distance in self.upward_distances(target).items():
+                buckets.setdefault(node, []).append((column, distance))
+
+        table = np.full((len(sources), len(targets)), math.inf)
+        for row, source in enumerate(sources):
+            best = table[row].tolist()
+            for node, distance in self.upward_distances(source).items():
+                for column, remaining in buckets.get(node, ()):
+                    if distance + remaining < best[column]:
+                        best[column] = distance + remaining
+            table[row] = best
+        return table
+
+    def shortest_path(self, source: int, target: int, stats: SearchStats = None) -> ([int], float):
+        """
+        Find the shortest path between two node indexes with a bidirectional search up the hierarchy.
+
+        :param source: the index of the node to start from
+        :param target: the index of the node to find a path to
+        :param stats: optional counters to add the work done to
+        :return: the list of node indexes along the path and its length, or (None, inf) if there is no path
+        """
+        offsets = self._offsets
+        targets = self._targets
+        weights = self._weights
+
+        distances = ({source: 0}, {target: 0})
+        previous = ({}, {})
+        heaps = ([(0, source)], [(0, target)])
+        best = math.inf
+        meeting = -1
+        expanded = relaxed = popped = 0
+
+        while heaps[0] or heaps[1]:
+            if not heaps[1] or (heaps[0] and heaps[0][0][0] <= heaps[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            if heaps[side][0][0] >= best:
+                break
+            distance, node = heapq.heappop(heaps[side])
+            popped += 1
+            if distance > distances[side][node]:
+                continue
+
+            other = distances[1 - side].get(node)
+            if other is not None and distance + other < best:
+                best = distance + other
+                meeting = node
+
+            # stall on demand: a node that can be reached for less down from a higher node the search has already
+            # found is not on a shortest path up, so the search goes no further from it
+            found = distances[side]
+            first, last = offsets[node], offsets[node + 1]
+            for edge in range(first, last):
+                if found.get(targets[edge], math.inf) + weights[edge] < distance:
+                    break
+            else:
+                expanded += 1
+                for edge in range(first, last):
+                    neighbour = targets[edge]
+                    new_dist = distance + weights[edge]
+                    if new_dist < found.get(neighbour, math.inf):
+                        relaxed += 1
+                        found[neighbour] = new_dist
+                        previous[side][neighbour] = node
+                        heapq.heappush(heaps[side], (new_dist, neighbour))
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += expanded
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + 2
+            stats.popped += popped
+
+        if meeting < 0:
+            return None, math.inf
+        start_time = time.perf_counter()
+        nodes = [meeting]
+        while nodes[-1] != source:
+            nodes.append(previous[0][nodes[-1]])
+        nodes.reverse()
+        node = meeting
+        while node != target:
+            nodes.append(previous[1][node])
+            node = nodes[-1]
+
+        path = [source]
+        for node1, node2 in zip(nodes, nodes[1:]):
+            path.extend(self.unpack(node1, node2))
+        if stats is not None:
+            # the paths hidden inside shortcuts are counted like the paths followed along a chain
+            stats.chained += len(path) - len(nodes)
+            stats.add_time('trace', time.perf_counter() - start_time)
+        return path, best
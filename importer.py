@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import csv
+import time
+
+from my_globals import *
+from world import World
+
+
+class ImportReport:
+    """
+    Counts kept by import_csv as it reads, with the throughput so far.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.paths = 0
+        self.skipped = 0  # edges to unknown nodes, or from a node to itself
+        self.read_time = 0.0  # seconds spent reading and adding records
+        self.build_time = 0.0  # seconds spent bringing the junction graph up to date and compiling the graph
+
+    @property
+    def records_per_second(self) -> float:
+        return (self.nodes + self.paths + self.skipped) / self.read_time if self.read_time else 0.0
+
+    def __repr__(self):
+        return f'ImportReport(nodes:{self.nodes}, paths:{self.paths}, skipped:{self.skipped}, ' \
+               f'read:{self.read_time:.2f}s, build:{self.build_time:.2f}s, records/s:{self.records_per_second:.0f})'
+
+
+def read_chunks(file, columns: (str, ...), chunk_size: int):
+    """
+    Read the given columns of a CSV file with a header row, a chunk of rows at a time.
+
+    :param file: the path of the file, or an open text file
+    :param columns: the names of the columns to read
+    :param chunk_size: the number of rows in each chunk
+    :return: yields a list of rows, each a list of the column values as strings
+    """
+    if isinstance(file, str):
+        with open(file, newline='') as opened:
+            yield from read_chunks(opened, columns, chunk_size)
+        return
+    reader = csv.reader(file)
+    header = next(reader)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f'the file has no {", ".join(missing)} column')
+    positions = [header.index(column) for column in columns]
+    chunk = []
+    for row in reader:
+        chunk.append([row[position] for position in positions])
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_csv(world: World, node_file, edge_file, chunk_size: int = 100_000,
+               node_columns: (str, str, str) = ('id', 'u', 'v'), edge_columns: (str, str) = ('source', 'target'),
+               compile: bool = True, progress=None) -> ImportReport:
+    """
+    Stream a road network from a node file and an edge file into a world.
+
+    The node file has a row per node with its id and its position in meters, and the edge file has a row per path
+    with the ids of the two nodes it joins. The ids in the files can be any integers (such as OSM ids); the world
+    numbers the nodes and paths it makes in the order they are read, counting up from the highest id it already
+    uses, so importing the same files always gives the same ids. Only one chunk of rows is held at a time, and the
+    file ids are mapped to world ids with sorted arrays rather than a dict of every node.
+
+    :param world: the world to add the nodes and paths to
+    :param node_file: the path of the node file, or an open text file
+    :param edge_file: the path of the edge file, or an open text file
+    :param chunk_size: the number of rows to read at a time
+    :param node_columns: the names of the id, u and v columns of the node file
+    :param edge_columns: the names of the columns of the edge file holding the ids of the two nodes
+    :param compile: compile the graph once everything is added
+    :param progress: an optional function called with the report after each chunk
+    :return: the report of what was imported
+    """
+    report = ImportReport()
+    next_node_id = max(world.path_nodes, default=-1) + 1
+    next_path_id = max(world.paths, default=-1) + 1
+    file_ids = []
+    world_ids = []
+
+    with world.batch():
+        start_time = time.perf_counter()
+        for chunk in read_chunks(node_file, node_columns, chunk_size):
+            for id, (_, u, v) in enumerate(chunk, next_node_id):
+                world.add_path_node(float(u), float(v), id)
+            file_ids.append(np.array([row[0] for row in chunk], dtype=np.int64))
+            world_ids.append(np.arange(next_node_id, next_node_id + len(chunk), dtype=np.int64))
+            next_node_id += len(chunk)
+            report.nodes += len(chunk)
+            report.read_time = time.perf_counter() - start_time
+            if progress is not None:
+                progress(report)
+
+        file_ids = np.concatenate(file_ids) if file_ids else np.zeros(0, dtype=np.int64)
+        world_ids = np.concatenate(world_ids) if world_ids else np.zeros(0, dtype=np.int64)
+        order = np.argsort(file_ids, kind='stable')
+        file_ids, world_ids = file_ids[order], world_ids[order]
+
+        nodes = world.path_nodes
+        for chunk in read_chunks(edge_file, edge_columns, chunk_size):
+            ends = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+            positions = np.minimum(np.searchsorted(file_ids, ends), max(len(file_ids) - 1, 0))
+            known = (file_ids[positions] == ends).all(axis=1) if len(file_ids) else np.zeros(len(ends), dtype=bool)
+            mapped = world_ids[positions] if len(file_ids) else ends
+            known &= mapped[:, 0] != mapped[:, 1]
+            for id1, id2 in mapped[known].tolist():
+                world.add_path(nodes[id1], nodes[id2], next_path_id)
+                next_path_id += 1
+            report.paths += int(known.sum())
+            report.skipped += len(ends) - int(known.sum())
+            report.read_time = time.perf_counter() - start_time
+            if progress is not None:
+                progress(report)
+        start_time = time.perf_counter()
+
+    if compile:
+        world.compile()
+    report.build_time = time.perf_counter() - start_time
+    return report
+
+
+def export_csv(world: World, node_file: str, edge_file: str):
+    """
+    Write the path nodes and paths of a world as the node and edge files import_csv reads, with the default columns.
+    """
+    with open(node_file, 'w', newline='') as nodes:
+        writer = csv.writer(nodes)
+        writer.writerow(('id', 'u', 'v'))
+        writer.writerows((node.id, node.u, node.v) for node in world.path_nodes.values())
+    with open(edge_file, 'w', newline='') as edges:
+        writer = csv.writer(edges)
+        writer.writerow(('source', 'target'))
+        writer.writerows((path.node1.id, path.node2.id) for path, _ in world.paths.values())
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import heapq
+import time
+from itertools import count
+
+from my_globals import *
+from node import *
+
+
+def is_junction(node: PathNode) -> bool:
+    return len(node.paths) != 2
+
+
+class Chain:
+    """
+    A run of paths between two junctions where every node in between has exactly two paths.
+    """
+
+    def __init__(self, nodes: [PathNode], path_ids: [int], lengths: [float]):
+        self.nodes = nodes
+        self.path_ids = path_ids
+        self.offsets = [0]
+        for length in lengths:
+            self.offsets.append(self.offsets[-1] + length)
+        self.forward = Route.from_nodes(nodes, self.offsets[-1])
+        self.backward = Route.from_nodes(nodes[::-1], self.offsets[-1])
+
+    @classmethod
+    def follow(cls, junction: PathNode, path: Path) -> Chain:
+        """
+        Follow a path out of a junction until the next junction is reached.
+
+        :param junction: the node to start from
+        :param path: the path leaving the junction
+        :return: the chain of nodes up to and including the next junction
+        """
+        nodes = [junction]
+        path_ids = []
+        lengths = []
+        node = junction
+        while True:
+            path_ids.append(path.id)
+            lengths.append(path.length)
+            node = path.node2
+            nodes.append(node)
+            if node is junction or is_junction(node):
+                return cls(nodes, path_ids, lengths)
+            for id, next_path in node.paths.items():
+                if id != path.id:
+                    path = next_path
+                    break
+
+    def segment(self, start: int, end: int) -> Route:
+        """
+        Make a route along part of the chain.
+
+        :param start: the position in the chain to start from
+        :param end: the position in the chain to end at, which may come before the start
+        :return: the route between the two positions
+        """
+        if start <= end:
+            nodes = self.nodes[start:end + 1]
+        else:
+            nodes = self.nodes[end:start + 1][::-1]
+        return Route.from_nodes(nodes, abs(self.offsets[end] - self.offsets[start]))
+
+
+class JunctionGraph:
+    """
+    The graph of junctions (path nodes without exactly two paths) joined by the chains of paths between them.
+
+    The chains are followed once and cached as routes, then repaired around the nodes whose paths change, so a
+    search only needs to look at the junctions plus the chains holding the start and the end points.
+    """
+
+    def __init__(self):
+        self.routes: {PathNode: {int: (Route, Chain)}} = {}  # the routes leaving each junction by path id
+        self.positions: {PathNode: (Chain, int)} = {}  # where each node with two paths sits in its chain
+
+    def add_chain(self, chain: Chain):
+        first, last = chain.nodes[0], chain.nodes[-1]
+        self.routes.setdefault(first, {})[chain.path_ids[0]] = (chain.forward, chain)
+        self.routes.setdefault(last, {})[chain.path_ids[-1]] = (chain.backward, chain)
+        for position in range(1, len(chain.nodes) - 1):
+            self.positions[chain.nodes[position]] = (chain, position)
+
+    def remove_chain(self, chain: Chain):
+        first, last = chain.nodes[0], chain.nodes[-1]
+        self.routes.get(first, {}).pop(chain.path_ids[0], None)
+        self.routes.get(last, {}).pop(chain.path_ids[-1], None)
+        for node in chain.nodes[1:-1]:
+            if self.positions.get(node, (None,))[0] is chain:
+                del self.positions[node]
+
+    def update(self, nodes: [PathNode]):
+        """
+        Repair the cached chains after the paths of some nodes have changed.
+
+        :param nodes: the nodes that have gained or lost paths
+        """
+        dirty = set(nodes)
+        for node in nodes:
+            chains = []
+            if node in self.positions:
+                chains.append(self.positions[node][0])
+            if node in self.routes:
+                chains.extend(chain for _, chain in self.routes[node].values())
+            for chain in chains:
+                self.remove_chain(chain)
+                dirty.add(chain.nodes[0])
+                dirty.add(chain.nodes[-1])
+
+        for node in dirty:
+            if not is_junction(node):
+                self.routes.pop(node, None)
+                continue
+            routes = self.routes.setdefault(node, {})
+            for id, path in node.paths.items():
+                if id not in routes:
+                    self.add_chain(Chain.follow(node, path))
+
+    def rebuild(self, nodes):
+        """
+        Throw away the cached chains and follow them again for every node.
+        """
+        self.routes.clear()
+        self.positions.clear()
+        self.update(list(nodes))
+
+    def exits(self, node: PathNode) -> [Route]:
+        """
+        The routes from a node with two paths to both ends of its chain.
+        """
+        chain, position = self.positions[node]
+        return [chain.segment(position, 0), chain.segment(position, len(chain.nodes) - 1)]
+
+    def find_shortest_route(self, start: PathNode, target: PathNode, heuristic=None,
+                            stats: SearchStats = None) -> Route:
+        """
+        Find the shortest route between two path nodes by searching the junction graph.
+
+        Nodes on a loop with no junctions at all are not part of the junction graph, so those searches fall back
+        to searching the paths directly.
+
+        :param start: the path node to start from
+        :param target: the path node to find a route to
+        :param heuristic: a function of (node, target) giving a lower bound on the distance between them
+        :param stats: optional counters to add the work done to
+        :return: the shortest route, or None if the target is the start or can not be reached
+        """
+        if start is target:
+            return None
+        for node in (start, target):
+            if node not in self.routes and node not in self.positions:
+                return astar(start, target, heuristic or no_heuristic, stats)
+        heuristic = heuristic or no_heuristic
+
+        # routes into the target from the ends of its chain
+        arrivals = {}
+        if target in self.positions:
+            chain, position = self.positions[target]
+            for end in (0, len(chain.nodes) - 1):
+                arrivals.setdefault(chain.nodes[end], []).append(chain.segment(end, position))
+
+        distances = {}
+        previous = {}
+        settled = set()
+        order = count()
+        heap = []
+        expanded = relaxed = popped = chained = 0
+
+        def relax(route: Route, distance: float):
+            nonlocal relaxed, chained
+            if route.end in settled:
+                return
+            new_dist = distance + route.length
+            if new_dist < distances.get(route.end, math.inf):
+                relaxed += 1
+                chained += len(route.nodes) - 2
+                distances[route.end] = new_dist
+                previous[route.end] = route
+                heapq.heappush(heap, (new_dist + heuristic(route.end, target), next(order), new_dist, route.end))
+
+        if start in self.routes:
+            distances[start] = 0
+            heap.append((heuristic(start, target), next(order), 0, start))
+        else:
+            for route in self.exits(start):
+                relax(route, 0)
+            chain, position = self.positions[start]
+            if self.positions.get(target, (None,))[0] is chain:
+                relax(chain.segment(position, self.positions[target][1]), 0)
+
+        while heap:
+            _, _, distance, node = heapq.heappop(heap)
+            popped += 1
+            if node in settled:
+                continue
+            expanded += 1
+            if node is target:
+                break
+            settled.add(node)
+            for route, _ in self.routes[node].values():
+                relax(route, distance)
+            for route in arrivals.get(node, ()):
+                relax(route, distance)
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += expanded
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + (start in self.routes)
+            stats.popped += popped
+            stats.chained += chained
+
+        if target not in previous:
+            return None
+        start_time = time.perf_counter()
+        segments = []
+        node = target
+        while node in previous:
+            segments.append(previous[node])
+            node = previous[node].start
+            if node is start:
+                break
+        nodes = [start]
+        for route in reversed(segments):
+            nodes.extend(route.nodes[1:])
+        if stats is not None:
+            stats.add_time('trace', time.perf_counter() - start_time)
+        return Route.from_nodes(nodes, distances[target])
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+class Client:
+    """
+    A connection to a RouteService that can have many requests waiting for their responses at once.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.waiting: {int: asyncio.Future} = {}
+        self.next_id = 0
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def connect(cls, host: str = '127.0.0.1', port: int = 8765, path: str = None) -> Client:
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def receive(self):
+        # hand each response to the request waiting for it
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.waiting.pop(response['id'], None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self.waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError('the service closed the connection'))
+
+    async def request(self, op: str, **fields) -> dict:
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+        self.writer.write(json.dumps({'id': self.next_id, 'op': op, **fields}).encode() + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+
+async def run_load(host: str, port: int, path: str = None, connections: int = 8, requests: int = 10_000,
+                   concurrency: int = 32, nearest: float = 0.1, seed: int = 1) -> dict:
+    """
+    Send route and nearest node requests to a running service from many connections at once and time them.
+
+    :param host: the address of the service
+    :param port: the TCP port of the service
+    :param path: the unix socket of the service, used instead of the host and port if given
+    :param connections: the number of connections to open
+    :param requests: the total number of requests to send
+    :param concurrency: the most unanswered requests on each connection
+    :param nearest: the share of the requests that are nearest node lookups rather than routes
+    :param seed: the seed for the points and the pairs of nodes
+    :return: the throughput and latency percentiles
+    """
+    rand = random.Random(seed)
+    clients = [await Client.connect(host, port, path) for _ in range(connections)]
+    info = await clients[0].request('info')
+    x1, y1, x2, y2 = info['bounds']
+
+    def point() -> dict:
+        return {'x': rand.uniform(x1, x2), 'y': rand.uniform(y1, y2)}
+
+    # pick the nodes to route between by looking up the nodes nearest to random points
+    found = await asyncio.gather(*(clients[0].request('nearest', **point()) for _ in range(min(1000, requests))))
+    nodes = sorted({id for response in found for id in response['nodes']})
+    if not nodes:
+        raise ValueError('the service has no path nodes to route between')
+
+    latencies = []
+    errors = 0
+
+    async def send(client: Client, count: int):
+        nonlocal errors
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal errors
+            async with limit:
+                if rand.random() < nearest:
+                    op, fields = 'nearest', point()
+                else:
+                    op, fields = 'route', {'start': rand.choice(nodes), 'end': rand.choice(nodes)}
+                start_time = time.perf_counter()
+                response = await client.request(op, **fields)
+                latencies.append(time.perf_counter() - start_time)
+                errors += 'error' in response
+
+        await asyncio.gather(*(one() for _ in range(count)))
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(send(client, requests // connections + (i < requests % connections))
+                           for i, client in enumerate(clients)))
+    seconds = time.perf_counter() - start_time
+    after = await clients[0].request('info')
+    for client in clients:
+        await client.close()
+
+    latencies = np.array(latencies)
+    return {'requests': len(latencies), 'errors': errors, 'seconds': seconds,
+            'throughput': len(latencies) / seconds,
+            'p50': float(np.percentile(latencies, 50)), 'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()), 'batches': after['batches'] - info['batches'],
+            'connections': connections, 'concurrency': concurrency}
+
+
+async def wait_for_service(host: str, port: int, path: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client = await Client.connect(host, port, path)
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('the service stopped before it started listening')
+            if time.monotonic() > deadline:
+                raise TimeoutError('the service did not start listening in time')
+            await asyncio.sleep(0.1)
+        else:
+            await client.close()
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the throughput and latency of a route service.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address of the service')
+    parser.add_argument('--port', type=int, default=8765, help='the TCP port of the service')
+    parser.add_argument('--unix', metavar='PATH', help='connect to a unix socket at PATH instead of a TCP port')
+    parser.add_argument('--serve', metavar='FILE',
+                        help='start a local service on this saved world first, and stop it afterwards')
+    parser.add_argument('--processes', type=int, help='the number of workers of the service started by --serve')
+    parser.add_argument('--connections', type=int, default=8, help='the number of client connections')
+    parser.add_argument('--requests', type=int, default=10_000, help='the total number of requests to send')
+    parser.add_argument('--concurrency', type=int, default=32, help='the most unanswered requests per connection')
+    parser.add_argument('--nearest', type=float, default=0.1, help='the share of nearest node requests')
+    parser.add_argument('--seed', type=int, default=1, help='the seed for the requests')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE as JSON')
+    args = parser.parse_args()
+
+    process = None
+    if args.serve:
+        service = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'service.py')
+        command = [sys.executable, service, args.serve, '--host', args.host, '--port', str(args.port)]
+        if args.unix:
+            command += ['--unix', args.unix]
+        if args.processes:
+            command += ['--processes', str(args.processes)]
+        process = subprocess.Popen(command)
+    try:
+        if process is not None:
+            asyncio.run(wait_for_service(args.host, args.port, args.unix, process))
+        results = asyncio.run(run_load(args.host, args.port, args.unix, args.connections, args.requests,
+                                       args.concurrency, args.nearest, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f'{results["requests"]} requests ({results["errors"]} errors) in {results["seconds"]:.2f} s over '
+          f'{results["connections"]} connections, {results["batches"]} batches')
+    print(f'throughput {results["throughput"]:.0f} requests/s, latency p50 {results["p50"] * 1000:.2f} ms, '
+          f'p99 {results["p99"] * 1000:.2f} ms, max {results["max"] * 1000:.2f} ms')
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
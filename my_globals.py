@@ -7,6 +7,10 @@ MAX32 = np.iinfo(np.int32).max  # the upper limit of numpy int 32
 MIN32 = np.iinfo(np.int32).min  # the lower limit of numpy int 32
 SYS_MAX = sys.maxsize
 
+METER = 10  # the number of pixels in a meter
+DEFAULT_SPEED = 50 / 3.6  # the speed in meters per second that the travel time of a new path is worked out at
+WEIGHTS = ('length', 'time', 'cost')  # the weights of a path that routes can be found by
+
 
 def sum_lists(*lists):
     """
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from world import *
+from my_globals import *
+from search import *
 
 
 def get_xy(point):
@@ -55,13 +56,63 @@ def get_point(point1, angle, distance) -> Node:
     return Node(x, y)
 
 
+def get_distances(x1, y1, x2, y2) -> np.ndarray:
+    """
+    Find the distance between each pair of points at once, for arrays of coordinates.
+        >>> get_distances([0, 0], [0, 0], [3, 0], [4, 2])
+        array([5., 2.])
+
+    :param x1: the x coordinates of the first points
+    :param y1: the y coordinates of the first points
+    :param x2: the x coordinates of the second points
+    :param y2: the y coordinates of the second points
+    :return: an array of distances
+    """
+    return np.hypot(np.subtract(x2, x1), np.subtract(y2, y1))
+
+
+def get_angles(x1, y1, x2, y2, from0to360=False) -> np.ndarray:
+    """
+    Find the angle from each first point to each second point at once, measured the same way as get_angle.
+
+    :param x1: the x coordinates of the first points
+    :param y1: the y coordinates of the first points
+    :param x2: the x coordinates of the second points
+    :param y2: the y coordinates of the second points
+    :param from0to360: give angles from 0 to 360 instead of from -180 to 180
+    :return: an array of angles in degrees
+    """
+    radians = np.arctan2(np.subtract(x2, x1), np.subtract(y2, y1)) / math.pi
+    if from0to360:
+        radians = np.where(radians < 0, radians + 2, radians)
+    return np.round(radians * 180, 8)
+
+
+def get_points(x, y, angles, distances) -> (np.ndarray, np.ndarray):
+    """
+    Move each point a distance in the direction of an angle at once, the same way as get_point.
+
+    :param x: the x coordinates of the points
+    :param y: the y coordinates of the points
+    :param angles: the angle in degrees to move each point in
+    :param distances: the distance to move each point, or one distance for all of them
+    :return: the x and y coordinates of the moved points
+    """
+    radians = np.radians(angles)
+    return np.add(x, np.multiply(distances, np.sin(radians))), np.add(y, np.multiply(distances, np.cos(radians)))
+
+
 class Node:
+    # slots keep a world of a million nodes from carrying a million attribute dicts
+    __slots__ = ('x', 'y', 'xy')
+
     def __init__(self, x: int, y: int):
         self.x = x
         self.y = y
+        self.xy = (x, y)  # nodes never move, so the tuple is made once
 
     def get_xy(self):
-        return self.x, self.y
+        return self.xy
 
     def get_distance_from(self, other):
         return get_distance(self, other)
@@ -117,11 +168,6 @@ class Node:
         x2, y2 = get_xy(other)
         return x1 == x2 and y1 == y2
 
-    def __ne__(self, other):
-        x1, y1 = get_xy(self)
-        x2, y2 = get_xy(other)
-        return x1 != x2 and y1 != x2
-
     def __gt__(self, other):
         x1, y1 = get_xy(self)
         x2, y2 = get_xy(other)
@@ -164,10 +210,11 @@ class Node:
         return Node(round(x1, x2), round(y1, y2))
 
     def __iter__(self):
-        return zip([self.x, self.y])
+        return iter(self.xy)
 
     def __hash__(self):
-        return self.x, self.y
+        # the same hash as the (x, y) tuple, which compares equal to the node
+        return hash(self.xy)
 
     def __str__(self):
         return f'({self.x}, {self.y})'
@@ -177,6 +224,12 @@ class Node:
 
 
 class PathNode(Node):
+    """
+    A node that paths can meet at. Path nodes are told apart by identity rather than by position, so two path nodes
+    at the same point are still different nodes of the graph.
+    """
+    __slots__ = ('id', 'u', 'v', 'paths')
+
     def __init__(self, id: int, u: int, v: int):
         super().__init__(u * METER, v * METER)
         self.id = id
@@ -184,105 +237,53 @@ class PathNode(Node):
         self.v = v
         self.paths = {}
 
-    def find_shortest_route(self, target: PathNode) -> Route:
-        all_nodes = [self]
-        new_nodes = [self]
-        routes = {'start': {}, 'end': {}}
-
-        while len(new_nodes):
-            old_nodes = new_nodes.copy()
-            new_nodes.clear()
-            for node in old_nodes:
-                for path in node.paths.values():
-                    route = path.find_route(target)
-
-                    if route.start not in routes['start']:
-                        routes['start'][route.start] = {route.end: route}
-                    else:
-                        routes['start'][route.start][route.end] = route
-
-                    if route.end not in routes['end']:
-                        routes['end'][route.end] = {route.start: route}
-                    else:
-                        routes['end'][route.end][route.start] = route
-
-                    if route.end not in all_nodes:
-                        all_nodes.append(route.end)
-                        new_nodes.append(route.end)
-
-        def update_chart(node: PathNode, distance=None, previous: PathNode = None, have_visited=None):
-            if node in chart:
-                if distance is not None:
-                    chart[node]['distance'] = distance
-                if previous is not None:
-                    chart[node]['previous'] = previous
-                if node in unvisited and have_visited is not None and have_visited:
-                    del unvisited[node]
-            else:
-                info = {'distance': distance, 'previous': previous}
-                chart[node] = info
-                unvisited[node] = info
-
-        chart = {}
-        unvisited = {}
-
-        def next():
-            return sorted(unvisited.items(), key=lambda x: x[1]['distance'])[0][0]
-
-        update_chart(self, 0)
-        [update_chart(node, MAX32) for node in all_nodes[1:]]
-
-        while len(unvisited):
-            node = next()
-            for route in routes['start'][node].values():
-                old_dist = chart[route.end]['distance']
-                new_dist = chart[route.start]['distance'] + route.length
-                if new_dist < old_dist:
-                    update_chart(route.end, new_dist, route.start)
-            update_chart(node, have_visited=True)
-
-        def join_routes(route1: Route, route2: Route):
-            if route1 is None and route2 is None:
+    def find_shortest_route(self, target: PathNode, heuristic=None, stats: SearchStats = None,
+                            bidirectional: bool = False) -> Route:
+        if bidirectional:
+            if target is self:
                 return None
-            if route1 is None:
-                return route2
-            if route2 is None:
-                return route1
-
-            if route1.end == route2.start:
-                route1.end = route2.end
-                route1.nodes = route1.nodes + route2.nodes[1:]
-                route1.length += route2.length
-            elif route1.start == route2.end:
-                route1.start = route2.start
-                route1.nodes = route2.nodes + route1.nodes[1:]
-                route1.length += route2.length
-            return route1
-
-        previous: PathNode = target
-        info = chart[previous]
-        shortest: Route = None
-        while info['previous'] is not None:
-            current: Route = routes['start'][info['previous']][previous]
-            shortest = join_routes(shortest, current)
-            previous = info['previous']
-            info = chart[previous]
-
-        return shortest
+            nodes, length = bidirectional_search(self, target, heuristic, stats)
+            return None if nodes is None else Route.from_nodes(nodes, length)
+        if heuristic is None:
+            return dijkstra(self, target, stats)
+        return astar(self, target, heuristic, stats)
 
     def __repr__(self):
         ids = f'[{self.id}]' if self.id != -1 else ""
         return f'PathNode{ids}({self.x}, {self.y})'
 
+    def __eq__(self, other):
+        return self is other
+
     def __hash__(self):
-        return self.id if self.id != -1 else super().__hash__()
+        return self.id if self.id != -1 else object.__hash__(self)
+
+
+def get_route_length(nodes: [Node]) -> float:
+    """
+    The length of the straight lines joining a list of nodes, which is the length of a route through them.
+    """
+    return math.fsum(math.hypot(node2.x - node1.x, node2.y - node1.y) for node1, node2 in zip(nodes, nodes[1:]))
 
 
 class Path:
+    """
+    A straight road between two path nodes.
+
+    Besides its length, a path has a travel time in seconds and a cost, which start out as the time at DEFAULT_SPEED
+    and the length, and can be changed to model traffic, speed limits or closures (math.inf). Routes can be found by
+    any of the three; see WEIGHTS.
+    """
+    __slots__ = ('id', 'node1', 'node2', 'length', 'time', 'cost')
+
     def __init__(self, id: int, node1: PathNode, node2: PathNode):
         self.id = id
         self.node1 = node1
         self.node2 = node2
+        # path nodes never move, so the length only has to be worked out once
+        self.length = math.hypot(node2.x - node1.x, node2.y - node1.y)
+        self.time = self.length / (METER * DEFAULT_SPEED)
+        self.cost = self.length
 
     def get_xy(self):
         angle = self.node1.get_angle_from(self.node2)
@@ -293,10 +294,6 @@ class Path:
     def get_angle(self, from0to360=False):
         return get_angle(self.node1, self.node2, from0to360)
 
-    @property
-    def length(self):
-        return self.node1.get_distance_from(self.node2)
-
     def __str__(self):
         return f'({str(self.node1)}, {str(self.node2)})'
 
@@ -310,36 +307,82 @@ class Path:
         else:
             route.add_path(self)
 
-        if self.node2 == target:
-            return route
-
-        count = len(route.end.paths)
-
-        if count == 2:
-            for id, path in route.end.paths.items():
-                if id != self.id:
-                    route = path.find_route(target, route)
+        # follow the chain of nodes with exactly two paths, stopping if it loops back to where it started
+        path = self
+        while path.node2 != target and len(route.end.paths) == 2 and route.end is not route.start:
+            for id, next_path in route.end.paths.items():
+                if id != path.id:
+                    path = next_path
+                    break
+            route.add_path(path)
         return route
 
 
 class Route:
+    __slots__ = ('start', 'end', 'length', 'cost', 'nodes')
+
     def __init__(self, path: Path):
         if path is not None:
             self.start: PathNode = path.node1
             self.end: PathNode = path.node2
             self.length = path.length
+            self.cost = path.length  # the total of the weight the route was found by, which is the length by default
             self.nodes = [path.node1, path.node2]
 
+    @classmethod
+    def from_nodes(cls, nodes: [PathNode], length: float, cost: float = None) -> Route:
+        route = cls(None)
+        route.start = nodes[0]
+        route.end = nodes[-1]
+        route.length = length
+        route.cost = length if cost is None else cost
+        route.nodes = list(nodes)
+        return route
+
+    def copy(self) -> Route:
+        return Route.from_nodes(self.nodes, self.length, self.cost)
+
     def add_path(self, path: Path):
         self.end = path.node2
         self.length += path.length
+        self.cost += path.length
         self.nodes.append(path.node2)
 
     def __len__(self):
         return len(self.nodes)
 
     def __repr__(self):
-        return f'Route(start:{self.start}, end:{self.end}, length:{self.length}, nodes:{len(self.nodes)})'
+        cost = f', cost:{self.cost}' if self.cost != self.length else ''
+        return f'Route(start:{self.start}, end:{self.end}, length:{self.length}{cost}, nodes:{len(self.nodes)})'
 
     def __str__(self):
         return f'({self.start}, {self.end})'
+
+
+class PathTree:
+    def __init__(self, source: PathNode, distances: {PathNode: float}, previous: {PathNode: PathNode},
+                 weight: str = 'length'):
+        self.source = source
+        self.distances = distances  # by the weight the tree was grown by
+        self.previous = previous
+        self.weight = weight
+
+    def route_to(self, target: PathNode) -> Route:
+        if target is self.source or target not in self.distances:
+            return None
+        nodes = [target]
+        while nodes[-1] is not self.source:
+            nodes.append(self.previous[nodes[-1]])
+        nodes.reverse()
+        if self.weight == 'length':
+            return Route.from_nodes(nodes, self.distances[target])
+        return Route.from_nodes(nodes, get_route_length(nodes), self.distances[target])
+
+    def __contains__(self, node):
+        return node in self.distances
+
+    def __len__(self):
+        return len(self.distances)
+
+    def __repr__(self):
+        return f'PathTree(source:{self.source}, nodes:{len(self.distances)})'
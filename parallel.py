@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+from my_globals import *
+from node import Route
+from graph import CompiledGraph
+from hierarchy import ContractionHierarchy
+from store import load_arrays, load_engines
+
+ENGINES = {'compiled': CompiledGraph, 'hierarchy': ContractionHierarchy}
+
+worker = {}  # the engine each worker process attaches to in init_worker
+
+
+def share_arrays(arrays: {str: np.ndarray}) -> ([SharedMemory], {str: (str, tuple, str)}):
+    """
+    Copy arrays into blocks of shared memory.
+
+    :param arrays: the arrays to share by name
+    :return: the shared memory blocks and a description of each array that can be sent to other processes
+    """
+    blocks = []
+    specs = {}
+    for name, array in arrays.items():
+        block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs: {str: (str, tuple, str)}) -> ([SharedMemory], {str: np.ndarray}):
+    """
+    Open arrays shared by share_arrays without copying them.
+    """
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def init_worker(specs, method: str, astar: bool):
+    # specs is either the description of arrays in shared memory, or the name of a graph file to map
+    if isinstance(specs, dict):
+        blocks, arrays = attach_arrays(specs)
+        worker['blocks'] = blocks
+        worker['engine'] = ENGINES[method](**arrays)
+    else:
+        graph, hierarchy = load_engines(load_arrays(specs))
+        worker['engine'] = hierarchy if method == 'hierarchy' else graph
+    worker['method'] = method
+    worker['astar'] = astar
+
+
+def route_chunk(pairs: [(int, int)]) -> [([int], float)]:
+    engine = worker['engine']
+    if worker['method'] == 'hierarchy':
+        return [engine.shortest_path(source, target) for source, target in pairs]
+    heuristic = engine.euclidean if worker['astar'] else None
+    return [engine.shortest_path(source, target, heuristic) for source, target in pairs]
+
+
+class RoutePool:
+    """
+    A pool of worker processes that answer batches of route queries on a world.
+
+    The compiled graph (or the contraction hierarchy) is copied into shared memory once when the pool starts, and
+    every worker reads the same copy. When the world was loaded from a file and is still using the arrays mapped
+    from it, the workers map the same file instead. Queries are sent to the workers as pairs of node indexes in
+    chunks, and the paths that come back are turned into routes in the order they were asked for.
+        with RoutePool(world, processes=8) as pool:
+            routes = pool.find_routes([(start1, end1), (start2, end2)])
+
+    The pool does not see edits made to the world after it starts.
+    """
+
+    def __init__(self, world, processes: int = None, method: str = 'compiled', astar: bool = False):
+        if method not in ENGINES:
+            raise ValueError(f'unknown routing method: {method}')
+        self.world = world
+        self.graph = world.compile()
+        if method == 'hierarchy':
+            engine = world.hierarchy if world.hierarchy is not None else world.build_hierarchy()
+        else:
+            engine = self.graph
+        if world.file is not None and isinstance(engine.offsets, np.memmap):
+            self.blocks, specs = [], world.file
+        else:
+            self.blocks, specs = share_arrays(engine.arrays())
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, initializer=init_worker, initargs=(specs, method, astar))
+
+    def indexes_of(self, ids) -> np.ndarray:
+        """
+        Find the indexes in the pool's graph of path node ids, raising KeyError for an id that is not in it.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.graph.ids) == 0 and ids.size:
+            raise KeyError(int(ids.flat[0]))
+        indexes = np.minimum(np.searchsorted(self.graph.ids, ids), len(self.graph.ids) - 1)
+        missing = self.graph.ids[indexes] != ids
+        if missing.any():
+            raise KeyError(int(ids[missing][0]))
+        return indexes
+
+    def find_routes(self, pairs: [(PathNode, PathNode)], chunk_size: int = None) -> [Route]:
+        """
+        Find the shortest route for each (start, end) pair.
+
+        :param pairs: the start and end nodes of each query
+        :param chunk_size: the number of queries sent to a worker at a time
+        :return: the route for each pair, or None where there is no route
+        """
+        if not pairs:
+            return []
+        indexes = self.indexes_of([[start.id, end.id] for start, end in pairs]).tolist()
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(indexes) / (self.processes * 4)))
+        chunks = [indexes[i:i + chunk_size] for i in range(0, len(indexes), chunk_size)]
+
+        # the indexes are turned back into nodes through the pool's own graph, which stays right after the world is
+        # edited and compiled again
+        ids = self.graph.ids
+        nodes = self.world.path_nodes
+        routes = []
+        for (start, end), (path, length) in zip(pairs, (result for chunk in self.pool.map(route_chunk, chunks)
+                                                        for result in chunk)):
+            if start is end or path is None:
+                routes.append(None)
+            else:
+                routes.append(Route.from_nodes([nodes[id] for id in ids[path].tolist()], length))
+        return routes
+
+    def find_paths_async(self, pairs: [(int, int)], callback, error_callback=None, chunk_size: int = None):
+        """
+        Start finding the shortest path between each pair of path node ids, without waiting for the answers.
+
+        :param pairs: the ids of the start and end node of each query
+        :param callback: called from a thread of the pool with the list of the node ids along each path and its
+            length, or (None, inf) where there is no path, in the order the pairs were given
+        :param error_callback: called from a thread of the pool with the exception if a worker fails
+        :param chunk_size: the number of queries sent to a worker at a time
+        """
+        indexes = self.indexes_of(np.array(pairs, dtype=np.int64).reshape(-1, 2)).tolist()
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(indexes) / self.processes))
+        chunks = [indexes[i:i + chunk_size] for i in range(0, len(indexes), chunk_size)]
+        ids = self.graph.ids
+
+        def finish(results: [[([int], float)]]):
+            callback([(None, length) if path is None else (ids[path].tolist(), length)
+                      for chunk in results for path, length in chunk])
+
+        self.pool.map_async(route_chunk, chunks, callback=finish, error_callback=error_callback)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
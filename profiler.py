@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+import sys
+
+from my_globals import *
+from search import SearchStats
+
+COUNTERS = ('expanded', 'relaxed', 'pushed', 'popped', 'chained')  # the SearchStats counters kept for each query
+PHASES = ('lookup', 'search', 'trace', 'store', 'total')  # the timed parts of a query, in the order they happen
+
+
+class Histogram:
+    """
+    A histogram of values that are zero or more, with buckets spaced evenly on a log scale. It uses a small, fixed
+    amount of memory however many values are added, and its percentiles are within a bucket's width of the truth.
+    """
+
+    def __init__(self, per_double: int = 8):
+        self.per_double = per_double  # the number of buckets each time the values double
+        self.buckets: {int: int} = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+
+    def bucket_of(self, value: float) -> int:
+        return math.floor(math.log2(value) * self.per_double)
+
+    def bounds(self, bucket: int) -> (float, float):
+        return 2 ** (bucket / self.per_double), 2 ** ((bucket + 1) / self.per_double)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        if value <= 0:
+            self.zeros += 1
+        else:
+            bucket = self.bucket_of(value)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def merge(self, other: Histogram):
+        """
+        Add the values counted by another histogram with the same number of buckets per doubling to this one.
+        """
+        if other.per_double != self.per_double:
+            raise ValueError('only histograms with the same buckets can be merged')
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        Estimate the value that the given percent of the values are no more than, as the middle of its bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = self.zeros
+        if rank <= seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                low, high = self.bounds(bucket)
+                return clamp_float(math.sqrt(low * high), self.low, self.high)
+        return self.high
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'min': self.low if self.count else 0.0,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'max': self.high if self.count else 0.0}
+
+    def to_dict(self) -> dict:
+        """
+        The summary with the bucket counts added, as [[lowest value, highest value, count], ...] in order.
+        """
+        summary = self.summary()
+        summary['zeros'] = self.zeros
+        summary['buckets'] = [[*self.bounds(bucket), self.buckets[bucket]] for bucket in sorted(self.buckets)]
+        return summary
+
+    def __repr__(self):
+        return f'Histogram(count:{self.count}, mean:{self.mean:.4g}, p50:{self.percentile(50):.4g}, ' \
+               f'p99:{self.percentile(99):.4g})'
+
+
+class QueryProfiler:
+    """
+    Counters and phase timings of every route found by World.find_shortest_route while the world is being profiled,
+    kept as a histogram of each counter and phase for each kind of query.
+        profiler = world.start_profiling()
+        world.find_shortest_route(start, end, method='compiled')
+        world.stop_profiling().dump()
+
+    A kind is the routing method, with -astar added when A* was used and /weight when the route was not found by
+    length. The phases are the route cache lookup, the search itself, tracing the route back (join_routes or
+    building the route from the node indexes), storing the route in the cache and the whole query. Queries answered
+    by the cache only have their lookup and total times recorded, and are counted as hits.
+    """
+
+    def __init__(self, per_double: int = 8):
+        self.per_double = per_double
+        self.histograms: {str: {str: Histogram}} = {}  # by kind of query, then by counter or phase
+        self.totals: {str: SearchStats} = {}  # the counters and phase times of all the searches of each kind
+        self.hits: {str: int} = {}
+
+    def histogram(self, kind: str, name: str) -> Histogram:
+        histograms = self.histograms.setdefault(kind, {})
+        if name not in histograms:
+            histograms[name] = Histogram(self.per_double)
+        return histograms[name]
+
+    def record(self, kind: str, stats: SearchStats, times: {str: float}):
+        """
+        Add one searched query.
+
+        :param kind: the kind of query
+        :param stats: the counters filled in by the search of this query alone
+        :param times: the seconds spent in each phase of the query
+        """
+        for name in COUNTERS:
+            self.histogram(kind, name).add(getattr(stats, name))
+        for phase, seconds in times.items():
+            self.histogram(kind, phase).add(seconds)
+        self.totals.setdefault(kind, SearchStats()).merge(stats)
+
+    def record_hit(self, kind: str, times: {str: float}):
+        """
+        Add one query answered by the route cache.
+        """
+        self.hits[kind] = self.hits.get(kind, 0) + 1
+        for phase, seconds in times.items():
+            self.histogram(kind, phase).add(seconds)
+
+    def reset(self):
+        self.histograms.clear()
+        self.totals.clear()
+        self.hits.clear()
+
+    def report(self, buckets: bool = False) -> dict:
+        """
+        The histograms as plain data that can be written as JSON, with times in seconds.
+
+        :param buckets: include the count in each bucket, not just the summary of each histogram
+        :return: {kind: {'searches': n, 'hits': n, 'metrics': {counter or phase: histogram}}}
+        """
+        return {kind: {'searches': self.totals[kind].queries if kind in self.totals else 0,
+                       'hits': self.hits.get(kind, 0),
+                       'metrics': {name: histogram.to_dict() if buckets else histogram.summary()
+                                   for name, histogram in histograms.items()}}
+                for kind, histograms in self.histograms.items()}
+
+    def export(self, file: str):
+        """
+        Write the report with the bucket counts to a JSON file.
+        """
+        with open(file, 'w') as out:
+            json.dump(self.report(buckets=True), out, indent=1)
+
+    def dump(self, file=None):
+        """
+        Print a table of the histograms of each kind of query, with the phases in milliseconds.
+
+        :param file: the text file to print to, standard output by default
+        """
+        file = file or sys.stdout
+        print(f'{"query":<22}{"metric":>10}{"count":>9}{"mean":>11}{"p50":>11}{"p90":>11}{"p99":>11}{"max":>11}',
+              file=file)
+        for kind, histograms in self.histograms.items():
+            print(f'{kind:<22} searches:{self.totals[kind].queries if kind in self.totals else 0} '
+                  f'hits:{self.hits.get(kind, 0)}', file=file)
+            for name in COUNTERS + PHASES:
+                if name not in histograms:
+                    continue
+                summary = histograms[name].summary()
+                scale = 1000 if name in PHASES else 1
+                values = ''.join(f'{summary[key] * scale:>11.3f}' for key in ('mean', 'p50', 'p90', 'p99', 'max'))
+                print(f'{"":<22}{name + (" ms" if name in PHASES else ""):>10}{summary["count"]:>9}{values}',
+                      file=file)
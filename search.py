@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import heapq
+import time
+from itertools import count
+
+from my_globals import *
+
+
+def join_routes(route1, route2):
+    """
+    Join two routes that share an end point into a single route. The first route is extended in place.
+
+    :param route1: the route to extend (may be None)
+    :param route2: the route to attach to route1 (may be None)
+    :return: the joined route
+    """
+    if route1 is None and route2 is None:
+        return None
+    if route1 is None:
+        return route2
+    if route2 is None:
+        return route1
+
+    if route1.end == route2.start:
+        route1.end = route2.end
+        route1.nodes = route1.nodes + route2.nodes[1:]
+        route1.length += route2.length
+        route1.cost += route2.cost
+    elif route1.start == route2.end:
+        route1.start = route2.start
+        route1.nodes = route2.nodes + route1.nodes[1:]
+        route1.length += route2.length
+        route1.cost += route2.cost
+    return route1
+
+
+def trace_route(previous: dict, target):
+    """
+    Walk the predecessor table of a search back from the target and join the routes along the way.
+
+    :param previous: a dict of {node: route that reached the node}
+    :param target: the node to trace back from
+    :return: the joined route, or None if the target was never reached
+    """
+    shortest = None
+    node = target
+    while node in previous:
+        current = previous[node]
+        shortest = join_routes(shortest, current)
+        node = current.start
+    return shortest
+
+
+class SearchStats:
+    """
+    Counters filled in by a search when passed as its stats argument, used to compare search modes.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.expanded = 0  # nodes taken off the heap and settled
+        self.relaxed = 0  # routes that improved the distance to their end node
+        self.pushed = 0  # entries pushed onto the heap
+        self.popped = 0  # entries taken off the heap, including the stale ones left behind by lazy deletion
+        self.chained = 0  # paths through nodes with two paths that were followed as part of a longer route
+        self.times: {str: float} = {}  # seconds spent in each phase of the search that was timed separately
+
+    def add_time(self, phase: str, seconds: float):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    def merge(self, other: SearchStats):
+        """
+        Add the counters and phase times of another set of stats to these.
+        """
+        self.queries += other.queries
+        self.expanded += other.expanded
+        self.relaxed += other.relaxed
+        self.pushed += other.pushed
+        self.popped += other.popped
+        self.chained += other.chained
+        for phase, seconds in other.times.items():
+            self.add_time(phase, seconds)
+
+    def reset(self):
+        self.__init__()
+
+    def __repr__(self):
+        return f'SearchStats(queries:{self.queries}, expanded:{self.expanded}, relaxed:{self.relaxed}, ' \
+               f'pushed:{self.pushed}, popped:{self.popped}, chained:{self.chained})'
+
+
+def no_heuristic(node, target) -> float:
+    """
+    The heuristic that turns A* into Dijkstra.
+    """
+    return 0
+
+
+def euclidean(node, target) -> float:
+    """
+    The straight line distance between two nodes. Paths are never shorter than this, so it is admissible.
+    """
+    return node.get_distance_from(target)
+
+
+def distances_from(source) -> dict:
+    """
+    Find the distance from a node to every node it can reach, following each path rather than collapsed routes.
+
+    :param source: the path node to start from
+    :return: a dict of {node: distance}
+    """
+    distances = {source: 0}
+    settled = set()
+    order = count()
+    heap = [(0, next(order), source)]
+
+    while heap:
+        distance, _, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled.add(node)
+        for path in node.paths.values():
+            new_dist = distance + path.length
+            if new_dist < distances.get(path.node2, math.inf):
+                distances[path.node2] = new_dist
+                heapq.heappush(heap, (new_dist, next(order), path.node2))
+    return distances
+
+
+class Landmarks:
+    """
+    An ALT heuristic: lower bounds taken from the triangle inequality against the distances to a few landmarks.
+        heuristic = Landmarks([corner1, corner2, corner3])
+        start.find_shortest_route(end, heuristic=heuristic)
+
+    Landmarks work best when they are spread around the edge of the map. The tables are not updated when the graph
+    changes, so they need to be rebuilt after new paths are added.
+    """
+
+    def __init__(self, landmarks):
+        self.tables = [distances_from(landmark) for landmark in landmarks]
+
+    def __call__(self, node, target) -> float:
+        bound = 0
+        for table in self.tables:
+            if node in table and target in table:
+                bound = max(bound, abs(table[target] - table[node]))
+        return bound
+
+
+def astar(start, target, heuristic=euclidean, stats: SearchStats = None):
+    """
+    Find the shortest route between two path nodes using A* over a binary heap with lazy deletion.
+
+    Degree-2 chains are collapsed into a single route as the search reaches them (see Path.find_route), and the
+    search stops as soon as the target is settled. The heuristic must never overestimate the remaining distance and
+    must be consistent, otherwise the route found may not be the shortest.
+
+    :param start: the path node to start from
+    :param target: the path node to find a route to
+    :param heuristic: a function of (node, target) giving a lower bound on the distance between them
+    :param stats: optional counters to add the work done to
+    :return: the shortest route, or None if the target is the start or can not be reached
+    """
+    distances = {start: 0}
+    previous = {}
+    settled = set()
+    order = count()
+    heap = [(heuristic(start, target), next(order), 0, start)]
+    expanded = relaxed = popped = chained = 0
+
+    while heap:
+        _, _, distance, node = heapq.heappop(heap)
+        popped += 1
+        if node in settled:
+            continue
+        expanded += 1
+        if node is target:
+            break
+        settled.add(node)
+
+        for path in node.paths.values():
+            route = path.find_route(target)
+            if route.end in settled:
+                continue
+            new_dist = distance + route.length
+            if new_dist < distances.get(route.end, math.inf):
+                relaxed += 1
+                chained += len(route.nodes) - 2
+                distances[route.end] = new_dist
+                previous[route.end] = route
+                heapq.heappush(heap, (new_dist + heuristic(route.end, target), next(order), new_dist, route.end))
+
+    if stats is None:
+        return trace_route(previous, target)
+    stats.queries += 1
+    stats.expanded += expanded
+    stats.relaxed += relaxed
+    stats.pushed += relaxed + 1
+    stats.popped += popped
+    stats.chained += chained
+    start_time = time.perf_counter()
+    route = trace_route(previous, target)
+    stats.add_time('trace', time.perf_counter() - start_time)
+    return route
+
+
+def dijkstra(start, target, stats: SearchStats = None):
+    """
+    Find the shortest route between two path nodes, exploring outwards from the start in every direction.
+
+    :param start: the path node to start from
+    :param target: the path node to find a route to
+    :param stats: optional counters to add the work done to
+    :return: the shortest route, or None if the target is the start or can not be reached
+    """
+    return astar(start, target, no_heuristic, stats)
+
+
+def bidirectional_search(start, target, heuristic=None, stats: SearchStats = None):
+    """
+    Find the shortest route between two path nodes by searching from both ends at once, meeting in the middle.
+
+    Every path is added in both directions, so the search from the target follows the same paths as the search from
+    the start. Without a heuristic this is bidirectional Dijkstra; with one, both sides are guided by the average
+    potential p(node) = (heuristic(node, target) - heuristic(node, start)) / 2 (see CompiledGraph.bidirectional_path).
+    The search stops once the smallest keys on the two heaps add up to at least the shortest route found so far.
+
+    :param start: the path node to start from
+    :param target: the path node to find a route to
+    :param heuristic: a function of (node, target) giving a lower bound on the distance between them
+    :param stats: optional counters to add the work done to
+    :return: the list of nodes along the shortest route and its length, or (None, inf) if there is no route
+    """
+    if heuristic is None:
+        potential = None
+    else:
+        potentials = {}
+
+        def potential(node) -> float:
+            if node not in potentials:
+                potentials[node] = (heuristic(node, target) - heuristic(node, start)) / 2
+            return potentials[node]
+
+    distances = ({start: 0}, {target: 0})
+    previous = ({}, {})
+    settled = (set(), set())
+    signs = (1, -1)
+    order = count()
+    heaps = ([(potential(start) if potential else 0, next(order), start)],
+             [(-potential(target) if potential else 0, next(order), target)])
+    best = 0 if start is target else math.inf
+    meeting = start if start is target else None
+    expanded = relaxed = popped = 0
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        heap, done, before = heaps[side], settled[side], previous[side]
+        forward, backward = distances[side], distances[1 - side]
+        _, _, node = heapq.heappop(heap)
+        popped += 1
+        if node in done:
+            continue
+        done.add(node)
+        expanded += 1
+        distance = forward[node]
+
+        for path in node.paths.values():
+            head = path.node2
+            if head in done:
+                continue
+            new_dist = distance + path.length
+            if new_dist < forward.get(head, math.inf):
+                relaxed += 1
+                forward[head] = new_dist
+                before[head] = node
+                key = new_dist + signs[side] * potential(head) if potential else new_dist
+                heapq.heappush(heap, (key, next(order), head))
+                if head in backward and new_dist + backward[head] < best:
+                    best = new_dist + backward[head]
+                    meeting = head
+
+    if stats is not None:
+        stats.queries += 1
+        stats.expanded += expanded
+        stats.relaxed += relaxed
+        stats.pushed += relaxed + 2
+        stats.popped += popped
+
+    if meeting is None:
+        return None, math.inf
+    nodes = [meeting]
+    while nodes[-1] is not start:
+        nodes.append(previous[0][nodes[-1]])
+    nodes.reverse()
+    while nodes[-1] is not target:
+        nodes.append(previous[1][nodes[-1]])
+    return nodes, best
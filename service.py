@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+
+from world import *
+from parallel import RoutePool
+
+
+class RouteService:
+    """
+    An asyncio server that answers route and nearest node requests from many clients over a local socket, without
+    Tk. The world is loaded once and routed on by a RoutePool.
+
+    Clients send one JSON request per line and get one JSON response per line back. Each response carries the id of
+    its request, as responses on a connection come back in the order they are answered, not the order they were sent.
+        {"id": 1, "op": "route", "start": 17, "end": 42}  ->  {"id": 1, "nodes": [17, ..., 42], "length": 153.2}
+        {"id": 2, "op": "nearest", "x": 10.5, "y": 20, "k": 2}  ->  {"id": 2, "nodes": [5, 9], "distances": [...]}
+        {"id": 3, "op": "info"}  ->  {"id": 3, "nodes": 1000, "paths": 1980, "bounds": [x1, y1, x2, y2], ...}
+    A request that can not be answered gets {"id": ..., "error": "..."}, and a route that does not exist (including
+    one from a node to itself) has no nodes and a length of null.
+
+    Route requests from every connection are gathered into micro batches. A batch is sent to the pool once it holds
+    batch_size requests, or batch_delay seconds after its first request arrived, whichever comes first. Up to two
+    batches per worker are out at once, so the workers always have the next batch waiting. Nearest node lookups only
+    take microseconds on the spatial grid, so they are answered straight away in the event loop.
+
+    Backpressure: at most max_pending route requests wait for a batch, and each connection has at most max_in_flight
+    requests unanswered. When either limit is reached the service stops reading from the connection, so a client
+    sending faster than it is answered is slowed down by its socket filling up rather than by the server's memory
+    growing. The same happens when a client does not read its responses.
+    """
+
+    def __init__(self, world: World, processes: int = None, method: str = 'compiled', astar: bool = False,
+                 batch_size: int = 64, batch_delay: float = 0.002, max_pending: int = 4096, max_in_flight: int = 256):
+        self.world = world
+        self.pool = RoutePool(world, processes, method, astar)
+        self.method = method
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.queue: asyncio.Queue = None  # the route requests waiting for a batch, made once the loop is running
+        self.running: asyncio.Semaphore = None  # limits the batches out with the workers
+        self.dispatcher: asyncio.Task = None
+        self.running_batches: {asyncio.Task} = set()  # kept so the tasks are not collected while they run
+        self.server: asyncio.AbstractServer = None
+        self.requests = 0
+        self.batches = 0
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765, path: str = None) -> asyncio.AbstractServer:
+        """
+        Start listening on a TCP port, or on a unix socket if a path is given.
+        """
+        self.queue = asyncio.Queue(self.max_pending)
+        self.running = asyncio.Semaphore(self.pool.processes * 2)
+        self.dispatcher = asyncio.create_task(self.dispatch())
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.dispatcher.cancel()
+        if self.running_batches:
+            await asyncio.gather(*self.running_batches, return_exceptions=True)
+        self.pool.close()
+
+    async def dispatch(self):
+        # gather the waiting route requests into batches and hand them to the pool
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.running.acquire()
+            self.batches += 1
+            task = asyncio.create_task(self.run_batch(batch))
+            self.running_batches.add(task)
+            task.add_done_callback(self.running_batches.discard)
+
+    async def run_batch(self, batch: [(int, int, asyncio.Future)]):
+        loop = asyncio.get_running_loop()
+        answers = loop.create_future()
+        try:
+            self.pool.find_paths_async([(start, end) for start, end, _ in batch],
+                                       lambda results: loop.call_soon_threadsafe(answers.set_result, results),
+                                       lambda error: loop.call_soon_threadsafe(answers.set_exception, error))
+            results = await answers
+        except Exception as error:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.running.release()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await in_flight.acquire()
+                task = asyncio.create_task(self.answer(line, writer, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, line: bytes, writer: asyncio.StreamWriter, in_flight: asyncio.Semaphore):
+        try:
+            response = await self.respond(line)
+        except Exception as error:
+            # every request gets a response, or its client would wait for it forever
+            response = {'id': request_id(line), 'error': f'the request failed: {error!r}'}
+        finally:
+            in_flight.release()
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b'\n')
+
+    async def respond(self, line: bytes) -> dict:
+        """
+        Answer one request.
+
+        :param line: the request as a line of JSON
+        :return: the response
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'id': None, 'error': 'the request is not valid JSON'}
+        if not isinstance(request, dict):
+            return {'id': None, 'error': 'the request must be a JSON object'}
+        id = request.get('id')
+        self.requests += 1
+        try:
+            op = request.get('op')
+            if op == 'route':
+                start, end = int(request['start']), int(request['end'])
+                for node_id in (start, end):
+                    if node_id not in self.world.path_nodes:
+                        raise ValueError(f'there is no path node with id {node_id}')
+                if start == end:
+                    # as World.find_shortest_route, there is no route from a node to itself
+                    return {'id': id, 'nodes': None, 'length': None}
+                future = asyncio.get_running_loop().create_future()
+                await self.queue.put((start, end, future))
+                nodes, length = await future
+                return {'id': id, 'nodes': nodes, 'length': length if nodes is not None else None}
+            if op == 'nearest':
+                point = float(request['x']), float(request['y'])
+                k = int(request.get('k', 1))
+                if k < 1:
+                    raise ValueError(f'k must be at least 1, not {k}')
+                nodes = self.world.get_nearest_path_nodes(point, k)
+                return {'id': id, 'nodes': [node.id for node in nodes],
+                        'distances': [node.get_distance_from(point) for node in nodes]}
+            if op == 'info':
+                index = self.world.index
+                low = [cell * index.cell_size for cell in index.low] if index.low is not None else [0, 0]
+                high = [(cell + 1) * index.cell_size for cell in index.high] if index.high is not None else [0, 0]
+                return {'id': id, 'nodes': len(self.world.path_nodes), 'paths': len(self.world.paths),
+                        'bounds': low + high, 'method': self.method, 'processes': self.pool.processes,
+                        'requests': self.requests, 'batches': self.batches}
+            raise ValueError(f'unknown op: {op}')
+        except KeyError as error:
+            return {'id': id, 'error': f'the request has no {error.args[0]}'}
+        except (TypeError, ValueError) as error:
+            return {'id': id, 'error': str(error)}
+
+
+def request_id(line: bytes):
+    # the id of a request, or None if it can not be read
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return None
+    return request.get('id') if isinstance(request, dict) else None
+
+
+async def serve(service: RouteService, host: str, port: int, path: str = None):
+    server = await service.start(host, port, path)
+    print(f'serving on {path or f"{host}:{port}"}', flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve routes on a world saved by World.save over a local socket.')
+    parser.add_argument('file', help='the saved world to load')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='the TCP port to listen on')
+    parser.add_argument('--unix', metavar='PATH', help='listen on a unix socket at PATH instead of a TCP port')
+    parser.add_argument('--processes', type=int, help='the number of worker processes (default one per cpu)')
+    parser.add_argument('--method', choices=('compiled', 'hierarchy'), default='compiled', help='the routing method')
+    parser.add_argument('--astar', action='store_true', help='use A* with the compiled method')
+    parser.add_argument('--batch-size', type=int, default=64, help='the most route requests in a batch')
+    parser.add_argument('--batch-delay', type=float, default=2,
+                        help='the most milliseconds a route request waits for its batch to fill')
+    parser.add_argument('--max-pending', type=int, default=4096,
+                        help='the most route requests waiting for a batch before reading stops')
+    parser.add_argument('--max-in-flight', type=int, default=256,
+                        help='the most unanswered requests on each connection before reading from it stops')
+    args = parser.parse_args()
+
+    world = World()
+    world.load(args.file)
+    service = RouteService(world, args.processes, args.method, args.astar, args.batch_size, args.batch_delay / 1000,
+                           args.max_pending, args.max_in_flight)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import heapq
+
+from my_globals import *
+from node import *
+
+
+def project_onto(point, path: Path) -> (Node, float):
+    """
+    Find the point on a path that is closest to the given point.
+
+    :param point: the point to project
+    :param path: the path to project onto
+    :return: the closest point on the path and its distance from the given point
+    """
+    x, y = get_xy(point)
+    x1, y1 = path.node1.get_xy()
+    x2, y2 = path.node2.get_xy()
+    dx, dy = x2 - x1, y2 - y1
+    length_squared = dx * dx + dy * dy
+    t = 0 if length_squared == 0 else clamp_float(((x - x1) * dx + (y - y1) * dy) / length_squared, 0, 1)
+    closest = Node(x1 + t * dx, y1 + t * dy)
+    return closest, math.hypot(x - closest.x, y - closest.y)
+
+
+class SpatialGrid:
+    """
+    A uniform grid of square cells holding the path nodes and paths that fall in each cell, for finding the nodes and
+    paths near a point without looking at every one of them.
+
+    Nodes are kept in the cell they sit in; paths are kept in every cell that they pass through.
+    """
+
+    def __init__(self, cell_size: float = METER * 10):
+        self.cell_size = cell_size
+        self.nodes: {(int, int): [PathNode]} = {}
+        self.paths: {(int, int): [Path]} = {}
+        self.low = None  # the lowest and highest cells that have anything in them
+        self.high = None
+
+    def cell_of(self, x: float, y: float) -> (int, int):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def grow(self, cell: (int, int)):
+        if self.low is None:
+            self.low, self.high = cell, cell
+        else:
+            self.low = min(self.low[0], cell[0]), min(self.low[1], cell[1])
+            self.high = max(self.high[0], cell[0]), max(self.high[1], cell[1])
+
+    def add_node(self, node: PathNode):
+        cell = self.cell_of(node.x, node.y)
+        self.nodes.setdefault(cell, []).append(node)
+        self.grow(cell)
+
+    def cells_on(self, x1: float, y1: float, x2: float, y2: float):
+        """
+        Yield every cell that the line from (x1, y1) to (x2, y2) passes through, a column of cells at a time. A line
+        running exactly along the edge between two cells is in both of them.
+        """
+        if x2 < x1:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        first, last = int(x1 // self.cell_size), int(x2 // self.cell_size)
+        slope = (y2 - y1) / (x2 - x1) if first != last else 0
+        for cx in range(first, last + 1):
+            # the heights at which the line enters and leaves this column
+            enter = y1 if cx == first else y1 + (cx * self.cell_size - x1) * slope
+            leave = y2 if cx == last else y1 + ((cx + 1) * self.cell_size - x1) * slope
+            for cy in range(int(min(enter, leave) // self.cell_size), int(max(enter, leave) // self.cell_size) + 1):
+                yield cx, cy
+
+    def add_path(self, path: Path):
+        for cell in self.cells_on(path.node1.x, path.node1.y, path.node2.x, path.node2.y):
+            self.paths.setdefault(cell, []).append(path)
+        self.grow(self.cell_of(path.node1.x, path.node1.y))
+        self.grow(self.cell_of(path.node2.x, path.node2.y))
+
+    def remove_path(self, path: Path):
+        # the bounds are left as they are, as they only need to hold everything still in the grid
+        for cell in self.cells_on(path.node1.x, path.node1.y, path.node2.x, path.node2.y):
+            paths = [other for other in self.paths.get(cell, ()) if other.id != path.id]
+            if paths:
+                self.paths[cell] = paths
+            else:
+                self.paths.pop(cell, None)
+
+    def rebuild(self, nodes, paths):
+        """
+        Empty the grid and add the given nodes and paths to it again.
+        """
+        self.nodes.clear()
+        self.paths.clear()
+        self.low = self.high = None
+        for node in nodes:
+            self.nodes.setdefault(self.cell_of(node.x, node.y), []).append(node)
+        for path in paths:
+            for cell in self.cells_on(path.node1.x, path.node1.y, path.node2.x, path.node2.y):
+                self.paths.setdefault(cell, []).append(path)
+        # the bounds are found once at the end rather than grown one node at a time
+        cells = list(self.nodes) + list(self.paths)
+        if cells:
+            self.low = min(cx for cx, _ in cells), min(cy for _, cy in cells)
+            self.high = max(cx for cx, _ in cells), max(cy for _, cy in cells)
+
+    def rings(self, x: float, y: float, used: {(int, int): list}):
+        """
+        Yield the ring number and cells of each square ring of cells around the point, nearest first, leaving out the
+        cells outside the bounds of the grid, from the first ring that reaches those bounds until the rings no longer
+        touch them.
+
+        Once a ring would have more cells than there are cells in use, the cells in use are sorted by their ring
+        instead and yielded from there on, so a point far from everything does not walk through rings of empty cells.
+
+        :param x: the x of the point
+        :param y: the y of the point
+        :param used: the cells in use, the nodes or the paths of the grid
+        """
+        if self.low is None:
+            return
+        (low_x, low_y), (high_x, high_y) = self.low, self.high
+        cx, cy = self.cell_of(x, y)
+        first = max(low_x - cx, cx - high_x, low_y - cy, cy - high_y, 0)
+        last = max(cx - low_x, high_x - cx, cy - low_y, high_y - cy, 0)
+        if first == 0:
+            yield 0, [(cx, cy)]
+        for ring in range(max(first, 1), last + 1):
+            # the parts of the sides of the ring inside the bounds
+            left, right = max(cx - ring, low_x), min(cx + ring, high_x)
+            top, bottom = max(cy - ring + 1, low_y), min(cy + ring - 1, high_y)
+            rows = [side for side in (cy - ring, cy + ring) if low_y <= side <= high_y]
+            columns = [side for side in (cx - ring, cx + ring) if low_x <= side <= high_x]
+            if len(rows) * (right - left + 1) + len(columns) * max(bottom - top + 1, 0) > len(used):
+                break
+            cells = [(i, side) for side in rows for i in range(left, right + 1)]
+            cells += [(side, i) for side in columns for i in range(top, bottom + 1)]
+            yield ring, cells
+        else:
+            return
+
+        # every ring from here on is bigger than the number of cells in use
+        by_ring = {}
+        for cell in used:
+            cell_ring = max(abs(cell[0] - cx), abs(cell[1] - cy))
+            if cell_ring >= ring:
+                by_ring.setdefault(cell_ring, []).append(cell)
+        for cell_ring in sorted(by_ring):
+            yield cell_ring, by_ring[cell_ring]
+
+    def node_at(self, x: float, y: float) -> PathNode:
+        for node in self.nodes.get(self.cell_of(x, y), ()):
+            if node.x == x and node.y == y:
+                return node
+
+    def nearest(self, point, k: int = 1) -> [PathNode]:
+        """
+        Find the k path nodes closest to a point.
+
+        :param point: the point to search from
+        :param k: the number of nodes to find
+        :return: up to k nodes, nearest first, or none if k is less than 1
+        """
+        if k < 1:
+            return []
+        x, y = get_xy(point)
+        found = []  # a heap of the k best as (-distance, order, node)
+        order = 0
+        for ring, cells in self.rings(x, y, self.nodes):
+            for cell in cells:
+                for node in self.nodes.get(cell, ()):
+                    distance = math.hypot(node.x - x, node.y - y)
+                    if len(found) < k:
+                        heapq.heappush(found, (-distance, order, node))
+                    elif distance < -found[0][0]:
+                        heapq.heapreplace(found, (-distance, order, node))
+                    order += 1
+            # every cell outside this ring is at least ring cells away
+            if len(found) == k and -found[0][0] <= ring * self.cell_size:
+                break
+        return [node for _, _, node in sorted(found, key=lambda item: (-item[0], item[1]))]
+
+    def within(self, point, radius: float) -> [PathNode]:
+        """
+        Find every path node within a distance of a point.
+
+        :param point: the point to search from
+        :param radius: the largest distance to include
+        :return: the nodes in no particular order
+        """
+        x, y = get_xy(point)
+        (low_x, low_y), (high_x, high_y) = self.cell_of(x - radius, y - radius), self.cell_of(x + radius, y + radius)
+        found = []
+        for cx in range(low_x, high_x + 1):
+            for cy in range(low_y, high_y + 1):
+                for node in self.nodes.get((cx, cy), ()):
+                    if math.hypot(node.x - x, node.y - y) <= radius:
+                        found.append(node)
+        return found
+
+    def cells_in(self, x1: float, y1: float, x2: float, y2: float):
+        # the cells in use that overlap the rectangle from (x1, y1) up to (x2, y2)
+        (low_x, low_y), (high_x, high_y) = self.cell_of(x1, y1), self.cell_of(x2, y2)
+        if self.low is not None:
+            low_x, low_y = max(low_x, self.low[0]), max(low_y, self.low[1])
+            high_x, high_y = min(high_x, self.high[0]), min(high_y, self.high[1])
+        for cx in range(low_x, high_x + 1):
+            for cy in range(low_y, high_y + 1):
+                yield cx, cy
+
+    def nodes_in(self, x1: float, y1: float, x2: float, y2: float) -> [PathNode]:
+        """
+        Find every path node inside a rectangle.
+        """
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        return [node for cell in self.cells_in(x1, y1, x2, y2) for node in self.nodes.get(cell, ())
+                if x1 <= node.x <= x2 and y1 <= node.y <= y2]
+
+    def paths_in(self, x1: float, y1: float, x2: float, y2: float) -> [Path]:
+        """
+        Find every path whose bounding box overlaps a rectangle and that passes through one of the cells the
+        rectangle overlaps, which includes every path that crosses the rectangle.
+        """
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        found = {}
+        for cell in self.cells_in(x1, y1, x2, y2):
+            for path in self.paths.get(cell, ()):
+                if path.id not in found and min(path.node1.x, path.node2.x) <= x2 \
+                        and max(path.node1.x, path.node2.x) >= x1 and min(path.node1.y, path.node2.y) <= y2 \
+                        and max(path.node1.y, path.node2.y) >= y1:
+                    found[path.id] = path
+        return list(found.values())
+
+    def nearest_path(self, point) -> (Path, Node, float):
+        """
+        Find the path that passes closest to a point.
+
+        :param point: the point to search from
+        :return: the path, the closest point on it and the distance to that point, or (None, None, inf)
+        """
+        x, y = get_xy(point)
+        best = (None, None, math.inf)
+        for ring, cells in self.rings(x, y, self.paths):
+            for cell in cells:
+                for path in self.paths.get(cell, ()):
+                    closest, distance = project_onto((x, y), path)
+                    if distance < best[2]:
+                        best = (path, closest, distance)
+            if best[2] <= ring * self.cell_size:
+                break
+        return best
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import struct
+
+from my_globals import *
+from graph import CompiledGraph
+from hierarchy import ContractionHierarchy
+
+MAGIC = b'PATHFIND'
+VERSION = 1
+ALIGNMENT = 64  # every array starts on a multiple of this many bytes, so it can be viewed in place once mapped
+
+
+def align(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def save_arrays(file, arrays: {str: np.ndarray}):
+    """
+    Write named arrays to a single binary file that load_arrays can memory map.
+
+    The file starts with MAGIC, the length of a JSON header as a little endian 64 bit number and the header itself,
+    which gives the dtype, shape and position of each array. The raw data of the arrays follows, each aligned to
+    ALIGNMENT bytes.
+
+    :param file: the path of the file to write
+    :param arrays: the arrays to write by name
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = {}
+    offset = 0
+    for name, array in arrays.items():
+        header[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += align(array.nbytes)
+    text = json.dumps({'version': VERSION, 'arrays': header}).encode()
+    start = align(len(MAGIC) + 8 + len(text))
+
+    with open(file, 'wb') as out:
+        out.write(MAGIC)
+        out.write(struct.pack('<Q', len(text)))
+        out.write(text)
+        for name, array in arrays.items():
+            out.seek(start + header[name]['offset'])
+            out.write(array.tobytes())
+        out.truncate(start + offset)
+
+
+def load_arrays(file, mmap: bool = True) -> {str: np.ndarray}:
+    """
+    Read the arrays in a file written by save_arrays.
+
+    :param file: the path of the file to read
+    :param mmap: map the file into memory read only instead of reading it, so loading takes no time and every process
+        that maps the same file shares one copy of it
+    :return: the arrays by name
+    """
+    with open(file, 'rb') as data:
+        if data.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{file} is not a saved graph')
+        size, = struct.unpack('<Q', data.read(8))
+        header = json.loads(data.read(size))
+    if header['version'] != VERSION:
+        raise ValueError(f'{file} was saved in version {header["version"]} of the format, not {VERSION}')
+
+    start = align(len(MAGIC) + 8 + size)
+    raw = np.memmap(file, dtype=np.uint8, mode='r') if mmap else np.fromfile(file, dtype=np.uint8)
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        offset = start + info['offset']
+        nbytes = dtype.itemsize * math.prod(info['shape'])
+        arrays[name] = raw[offset:offset + nbytes].view(dtype).reshape(info['shape'])
+    return arrays
+
+
+def section(arrays: {str: np.ndarray}, name: str) -> {str: np.ndarray}:
+    """
+    Pick out the arrays saved under 'name.' and drop that prefix from their names.
+    """
+    prefix = name + '.'
+    return {key[len(prefix):]: array for key, array in arrays.items() if key.startswith(prefix)}
+
+
+def engine_arrays(graph: CompiledGraph, hierarchy: ContractionHierarchy = None) -> {str: np.ndarray}:
+    """
+    The arrays of a compiled graph and its contraction hierarchy, named the way load_engines expects them.
+    """
+    arrays = {'graph.' + name: array for name, array in graph.arrays().items()}
+    if hierarchy is not None:
+        # the hierarchy has the same ids as the graph, so they are only stored once
+        arrays.update({'hierarchy.' + name: array for name, array in hierarchy.arrays().items() if name != 'ids'})
+    return arrays
+
+
+def load_engines(arrays: {str: np.ndarray}) -> (CompiledGraph, ContractionHierarchy):
+    """
+    Make the compiled graph and contraction hierarchy saved by engine_arrays, without copying the arrays.
+
+    :param arrays: the arrays read by load_arrays
+    :return: the compiled graph, and the hierarchy or None if none was saved
+    """
+    graph = CompiledGraph(**section(arrays, 'graph'))
+    hierarchy_arrays = section(arrays, 'hierarchy')
+    hierarchy = ContractionHierarchy(ids=graph.ids, **hierarchy_arrays) if hierarchy_arrays else None
+    return graph, hierarchy
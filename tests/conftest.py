@@ -0,0 +1,30 @@
+import os
+import random
+import sys
+
+import pytest
+
+# the modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world import World  # noqa: E402
+
+
+def random_world(seed: int, nodes: int = 40, paths: int = 60) -> World:
+    """
+    A small world of randomly placed path nodes joined by random paths, with plenty of dead ends and chains of nodes
+    with two paths.
+    """
+    rand = random.Random(seed)
+    world = World(seed=seed)
+    points = [world.add_path_node(rand.uniform(0, 200), rand.uniform(0, 200)) for _ in range(nodes)]
+    for _ in range(paths):
+        node1, node2 = rand.sample(points, 2)
+        if not any(path.node2 is node2 for path in node1.paths.values()):
+            world.add_path(node1, node2)
+    return world
+
+
+@pytest.fixture
+def world() -> World:
+    return random_world(1)
@@ -0,0 +1,135 @@
+import math
+import random
+
+import pytest
+
+from cache import RouteCache
+from conftest import random_world
+from node import Route
+from world import World
+
+
+def fill(world: World, rand: random.Random, weight: str = 'length', pairs: int = 150):
+    nodes = list(world.path_nodes.values())
+    for _ in range(pairs):
+        world.find_shortest_route(rand.choice(nodes), rand.choice(nodes), method='compiled', weight=weight)
+
+
+def check_cached(world: World):
+    # every route still in the cache is one a fresh search would find
+    for (start, end, weight), route in world.route_cache.routes.items():
+        expected = world.search_route(world.path_nodes[start], world.path_nodes[end], method='compiled', weight=weight)
+        if expected is None:
+            assert route is None
+        else:
+            assert route is not None and route.cost == pytest.approx(expected.cost)
+
+
+def uses(route: Route, path) -> bool:
+    return any({node1, node2} == {path.node1, path.node2} for node1, node2 in zip(route.nodes, route.nodes[1:]))
+
+
+def test_store_and_lookup(world):
+    node1, node2, node3 = list(world.path_nodes.values())[:3]
+    cache = RouteCache(size=2)
+    route = Route.from_nodes([node1, node2], 5.0)
+    assert cache.lookup(node1, node2) == (False, None)
+    cache.store(node1, node2, route)
+    cache.store(node1, node3, None)
+
+    cached, found = cache.lookup(node1, node2)
+    assert cached and found.length == 5.0 and found is not route
+    assert cache.lookup(node1, node3) == (True, None)
+    # the weight is part of the key, and the direction is too
+    assert not cache.lookup(node1, node2, 'time')[0]
+    assert not cache.lookup(node2, node1)[0]
+
+    # node1 -> node2 was used last, so node1 -> node3 goes first
+    cache.lookup(node1, node2)
+    cache.store(node2, node3, route)
+    assert not cache.lookup(node1, node3)[0] and cache.lookup(node1, node2)[0]
+    assert cache.evictions == 1 and len(cache) == 2
+
+    empty = RouteCache(size=0)
+    empty.store(node1, node2, route)
+    assert len(empty) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_add_path(seed):
+    rand = random.Random(seed)
+    world = random_world(seed)
+    nodes = list(world.path_nodes.values())
+    kept = forgotten = 0
+    for _ in range(10):
+        fill(world, rand)
+        before = len(world.route_cache)
+        node1, node2 = rand.sample(nodes, 2)
+        if any(path.node2 is node2 for path in node1.paths.values()):
+            continue
+        world.add_path(node1, node2)
+        assert all(route is not None for route in world.route_cache.routes.values())
+        check_cached(world)
+        kept += len(world.route_cache)
+        forgotten += before - len(world.route_cache)
+    # the straight line bound keeps some routes without keeping all of them
+    assert kept and forgotten
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_remove_path(seed):
+    rand = random.Random(seed)
+    world = random_world(seed)
+    for _ in range(10):
+        fill(world, rand)
+        misses = [key for key, route in world.route_cache.routes.items() if route is None]
+        path = world.paths[rand.choice(list(world.paths))][0]
+        used = [key for key, route in world.route_cache.routes.items() if route is not None and uses(route, path)]
+        kept = [key for key in world.route_cache.routes if key not in used]
+        world.remove_path(path)
+        assert list(world.route_cache.routes) == kept
+        assert all(key in world.route_cache.routes for key in misses)
+        check_cached(world)
+
+
+def test_remove_path_in_batch():
+    rand = random.Random(5)
+    world = random_world(5)
+    fill(world, rand)
+    with world.batch():
+        for _ in range(5):
+            world.remove_path(world.paths[rand.choice(list(world.paths))][0])
+    assert len(world.route_cache) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_update_weights(seed):
+    rand = random.Random(seed)
+    world = random_world(seed)
+    ids = list(world.paths)
+    for _ in range(10):
+        fill(world, rand, 'time')
+        fill(world, rand, 'length', 30)
+        lengths = {key: route for key, route in world.route_cache.routes.items() if key[2] == 'length'}
+        changed = rand.sample(ids, 5)
+        if rand.random() < 0.5:
+            # some paths get faster, some slower and some close
+            world.update_speeds(changed, [rand.choice([0.0, 1.0, 5.0, 30.0]) for _ in changed])
+        else:
+            world.update_weights('time', changed, [rand.choice([math.inf, 1.0, 100.0]) for _ in changed])
+        check_cached(world)
+        # routes by length can't be changed by a new time
+        assert all(world.route_cache.routes.get(key, route) is route for key, route in lengths.items())
+
+
+def test_update_weights_keeps_unaffected_routes():
+    world = World(seed=1)
+    nodes = [world.add_path_node(x, 0) for x in range(0, 50, 10)]
+    paths = [world.add_path(node1, node2)[0] for node1, node2 in zip(nodes, nodes[1:])]
+    world.find_shortest_route(nodes[0], nodes[1], method='compiled', weight='time')
+    world.find_shortest_route(nodes[3], nodes[4], method='compiled', weight='time')
+    # slowing the last path down only touches the route along it
+    world.update_weights('time', [paths[-1].id], [paths[-1].time * 2])
+    assert world.route_cache.lookup(nodes[0], nodes[1], 'time')[0]
+    assert not world.route_cache.lookup(nodes[3], nodes[4], 'time')[0]
+    check_cached(world)
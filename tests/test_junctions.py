@@ -0,0 +1,137 @@
+import random
+
+import pytest
+
+from conftest import random_world
+from junctions import JunctionGraph
+from search import dijkstra
+from world import World
+
+
+def chains_of(junctions: JunctionGraph) -> ({int: {int: (int, float)}}, {int}):
+    # the routes leaving each junction as {junction id: {path id: (end id, length)}} and the ids of the other nodes
+    routes = {node.id: {id: (route.end.id, round(route.length, 9)) for id, (route, _) in leaving.items()}
+              for node, leaving in junctions.routes.items() if leaving}
+    return routes, {node.id for node in junctions.positions}
+
+
+def check(world: World, rand: random.Random, pairs: int = 30):
+    # the repaired junction graph matches one built from scratch, and finds the same routes as a plain search
+    fresh = JunctionGraph()
+    fresh.rebuild(world.path_nodes.values())
+    assert chains_of(world.junctions) == chains_of(fresh)
+
+    nodes = list(world.path_nodes.values())
+    for _ in range(pairs):
+        start, end = rand.choice(nodes), rand.choice(nodes)
+        route = world.search_route(start, end, method='junctions')
+        expected = dijkstra(start, end)
+        if expected is None:
+            assert route is None
+            continue
+        assert route.start is start and route.end is end
+        assert route.length == pytest.approx(expected.length)
+        for node1, node2 in zip(route.nodes, route.nodes[1:]):
+            assert any(path.node2 is node2 for path in node1.paths.values())
+
+
+def line(world: World, points) -> list:
+    nodes = [world.add_path_node(x, y) for x, y in points]
+    paths = [world.add_path(node1, node2)[0] for node1, node2 in zip(nodes, nodes[1:])]
+    return nodes, paths
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_edits(seed):
+    rand = random.Random(seed)
+    world = random_world(seed, nodes=30, paths=35)
+    check(world, rand)
+    for _ in range(60):
+        nodes = list(world.path_nodes.values())
+        action = rand.random()
+        if action < 0.4 and world.paths:
+            world.remove_path(world.paths[rand.choice(list(world.paths))][0])
+        elif action < 0.5:
+            node = world.add_path_node(rand.uniform(0, 200), rand.uniform(0, 200))
+            world.add_path(node, rand.choice(nodes))
+        else:
+            node1, node2 = rand.sample(nodes, 2)
+            if not any(path.node2 is node2 for path in node1.paths.values()):
+                world.add_path(node1, node2)
+        check(world, rand, 10)
+
+
+def test_split_and_join_chain():
+    world = World(seed=1)
+    nodes, _ = line(world, [(0, 0), (10, 0), (20, 0), (30, 0), (40, 0)])
+    rand = random.Random(1)
+    check(world, rand)
+    assert set(n.id for n in world.junctions.positions) == {node.id for node in nodes[1:-1]}
+
+    # a branch off the middle of the chain splits it in two
+    branch = world.add_path_node(20, 10)
+    path, _ = world.add_path(nodes[2], branch)
+    check(world, rand)
+    assert nodes[2] in world.junctions.routes and nodes[2] not in world.junctions.positions
+
+    # and taking it away joins the two halves again
+    world.remove_path(path)
+    check(world, rand)
+    assert nodes[2] in world.junctions.positions and branch not in world.junctions.routes.get(nodes[2], {})
+    assert world.search_route(nodes[0], nodes[-1], method='junctions').length == pytest.approx(40 * 10)
+
+
+def test_dead_end_becomes_chain():
+    world = World(seed=2)
+    nodes, paths = line(world, [(0, 0), (10, 0), (20, 0)])
+    rand = random.Random(2)
+    # the end of the line goes from a dead end to a node with two paths and back
+    extra = world.add_path_node(30, 0)
+    path, _ = world.add_path(nodes[-1], extra)
+    check(world, rand)
+    assert nodes[-1] in world.junctions.positions
+    world.remove_path(path)
+    check(world, rand)
+    assert nodes[-1] in world.junctions.routes
+
+    # a node left with no paths at all is a junction with nowhere to go
+    world.remove_path(paths[0])
+    check(world, rand)
+    assert world.search_route(nodes[0], nodes[-1], method='junctions') is None
+
+
+def test_loop_without_junctions():
+    world = World(seed=3)
+    nodes, _ = line(world, [(0, 0), (10, 0), (10, 10), (0, 10)])
+    world.add_path(nodes[-1], nodes[0])
+    rand = random.Random(3)
+    # every node of a loop has two paths, so there is no junction to search from
+    check(world, rand)
+    assert world.search_route(nodes[0], nodes[2], method='junctions').length == pytest.approx(2 * 10 * 10)
+
+    # a spur gives the loop a junction, and taking the spur away again leaves a loop with none
+    spur = world.add_path_node(-10, 0)
+    path, _ = world.add_path(nodes[0], spur)
+    check(world, rand)
+    assert world.search_route(spur, nodes[2], method='junctions').length == pytest.approx(3 * 10 * 10)
+    world.remove_path(path)
+    check(world, rand)
+    assert world.search_route(nodes[1], nodes[3], method='junctions').length == pytest.approx(2 * 10 * 10)
+
+    # cutting the loop open turns it back into a chain between two dead ends
+    world.remove_path(world.paths[next(iter(nodes[0].paths))][0])
+    check(world, rand)
+
+
+def test_batch_edits():
+    rand = random.Random(4)
+    world = random_world(4, nodes=30, paths=35)
+    with world.batch():
+        for _ in range(20):
+            if rand.random() < 0.5 and world.paths:
+                world.remove_path(world.paths[rand.choice(list(world.paths))][0])
+            else:
+                node1, node2 = rand.sample(list(world.path_nodes.values()), 2)
+                if not any(path.node2 is node2 for path in node1.paths.values()):
+                    world.add_path(node1, node2)
+    check(world, rand)
@@ -0,0 +1,171 @@
+import heapq
+import math
+import random
+
+import numpy as np
+import pytest
+
+from conftest import random_world
+from search import dijkstra
+from world import World
+
+
+def reference_cost(world: World, start, end, weight: str) -> float:
+    # a plain Dijkstra search over the path nodes themselves, so it can't share a mistake with the compiled graphs
+    distances = {start: 0.0}
+    heap = [(0.0, start.id, start)]
+    while heap:
+        distance, _, node = heapq.heappop(heap)
+        if node is end:
+            return distance
+        if distance > distances[node]:
+            continue
+        for path in node.paths.values():
+            new = distance + getattr(path, weight)
+            if new < distances.get(path.node2, math.inf):
+                distances[path.node2] = new
+                heapq.heappush(heap, (new, path.node2.id, path.node2))
+    return math.inf
+
+
+def cost_along(route, weight: str) -> float:
+    return math.fsum([min(getattr(path, weight) for path in node1.paths.values() if path.node2 is node2)
+                      for node1, node2 in zip(route.nodes, route.nodes[1:])])
+
+
+def check_routes(world: World, rand: random.Random, method: str, astar: bool, pairs: int = 40):
+    nodes = list(world.path_nodes.values())
+    for _ in range(pairs):
+        start, end = rand.sample(nodes, 2)
+        route = world.find_shortest_route(start, end, astar, method=method, weight='time')
+        expected = reference_cost(world, start, end, 'time')
+        if expected == math.inf:
+            assert route is None
+        else:
+            assert route.cost == pytest.approx(expected)
+            assert cost_along(route, 'time') == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('method', ['compiled', 'bidirectional'])
+@pytest.mark.parametrize('astar', [False, True])
+def test_routes_follow_new_speeds(method, astar):
+    rand = random.Random(7)
+    world = random_world(7)
+    ids = list(world.paths)
+    check_routes(world, rand, method, astar)
+    for _ in range(5):
+        changed = rand.sample(ids, 15)
+        world.update_speeds(changed, [rand.choice([0.0, 2.0, 10.0, 40.0]) for _ in changed])
+        check_routes(world, rand, method, astar)
+        changed = rand.sample(ids, 5)
+        world.update_weights('time', changed, [rand.choice([math.inf, 0.5, 50.0]) for _ in changed])
+        check_routes(world, rand, method, astar)
+
+
+@pytest.mark.parametrize('method', ['compiled', 'bidirectional'])
+def test_closed_path_reroutes(method):
+    world = World(seed=1)
+    start, middle, end = world.add_path_node(0, 0), world.add_path_node(50, 40), world.add_path_node(100, 0)
+    direct, _ = world.add_path(start, end)
+    world.add_path(start, middle)
+    world.add_path(middle, end)
+    assert world.find_shortest_route(start, end, method=method, weight='time').nodes == [start, end]
+
+    world.update_speeds([direct.id], [0])
+    assert direct.time == math.inf
+    assert world.find_shortest_route(start, end, method=method, weight='time').nodes == [start, middle, end]
+
+    # a much faster direct path is taken again, and the route by length never changed
+    world.update_speeds([direct.id], [100])
+    assert world.find_shortest_route(start, end, method=method, weight='time').nodes == [start, end]
+    assert world.find_shortest_route(start, end, method=method).nodes == [start, end]
+
+
+@pytest.mark.parametrize('method', ['junctions', 'hierarchy'])
+def test_length_only_methods_reject_other_weights(world, method):
+    start, end = list(world.path_nodes.values())[:2]
+    with pytest.raises(ValueError):
+        world.find_shortest_route(start, end, method=method, weight='time')
+
+
+def test_hierarchy_rebuilt_after_edits():
+    rand = random.Random(8)
+    world = random_world(8)
+    nodes = list(world.path_nodes.values())
+    world.build_hierarchy()
+    for step in range(10):
+        if step % 2 and world.paths:
+            world.remove_path(world.paths[rand.choice(list(world.paths))][0])
+        else:
+            node1, node2 = rand.sample(nodes, 2)
+            if any(path.node2 is node2 for path in node1.paths.values()):
+                continue
+            world.add_path(node1, node2)
+        # the hierarchy of the old paths is dropped rather than searched
+        assert world.hierarchy is None
+        for _ in range(20):
+            start, end = rand.sample(nodes, 2)
+            route = world.search_route(start, end, method='hierarchy')
+            expected = dijkstra(start, end)
+            assert (route is None) == (expected is None)
+            if expected is not None:
+                assert route.length == pytest.approx(expected.length)
+        assert world.hierarchy is not None
+
+
+def test_hierarchy_kept_by_new_speeds():
+    rand = random.Random(9)
+    world = random_world(9)
+    hierarchy = world.build_hierarchy()
+    ids = list(world.paths)
+    world.update_speeds(ids, [rand.uniform(1, 30) for _ in ids])
+    # the hierarchy only knows lengths, so new times leave it as it was
+    assert world.hierarchy is hierarchy
+    nodes = list(world.path_nodes.values())
+    for _ in range(20):
+        start, end = rand.sample(nodes, 2)
+        route = world.search_route(start, end, method='hierarchy')
+        if route is not None:
+            assert route.length == pytest.approx(dijkstra(start, end).length)
+
+
+def test_stale_hierarchy_file_rejected(tmp_path):
+    world = random_world(10)
+    file = tmp_path / 'hierarchy.npz'
+    world.build_hierarchy().save(file)
+    assert world.load_hierarchy(file) is not None
+
+    # the same nodes with one more path: the saved hierarchy would miss the new path
+    node1, node2 = [node for node in world.path_nodes.values() if len(node.paths) == 1][:2]
+    world.add_path(node1, node2)
+    with pytest.raises(ValueError):
+        world.load_hierarchy(file)
+    assert world.hierarchy is None
+
+
+def test_bad_update_changes_nothing():
+    rand = random.Random(11)
+    world = random_world(11)
+    ids = list(world.paths)
+    nodes = list(world.path_nodes.values())
+    for _ in range(30):
+        world.find_shortest_route(rand.choice(nodes), rand.choice(nodes), method='compiled', weight='time')
+    times = {id: world.paths[id][0].time for id in ids}
+    weights = world.compile('time').weights.copy()
+    cached = dict(world.route_cache.routes)
+
+    bad_updates = [
+        (KeyError, [ids[0], max(ids) + 1], [1.0, 1.0]),
+        (ValueError, ids[:2], [1.0, math.nan]),
+        (ValueError, ids[:2], [1.0, -1.0]),
+        (ValueError, ids[:2], [1.0]),
+    ]
+    for error, path_ids, values in bad_updates:
+        with pytest.raises(error):
+            world.update_weights('time', path_ids, values)
+    with pytest.raises(ValueError):
+        world.update_weights('length', ids[:1], [1.0])
+
+    assert {id: world.paths[id][0].time for id in ids} == times
+    assert np.array_equal(world.compile('time').weights, weights)
+    assert dict(world.route_cache.routes) == cached
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import time
+
+from my_globals import *
+
+EPSILON = 1e-9  # the least a move has to save to be made, so rounding errors can not make it loop forever
+
+
+def nearest_neighbour_tour(matrix: [[float]], start: int = 0) -> [int]:
+    """
+    Build a tour by always going on to the nearest stop that has not been visited yet.
+
+    :param matrix: the cost of going from each stop to each other stop
+    :param start: the stop to start from
+    :return: the order to visit every stop in, starting with the start
+    """
+    tour = [start]
+    left = set(range(len(matrix))) - {start}
+    while left:
+        costs = matrix[tour[-1]]
+        stop = min(left, key=lambda other: (costs[other], other))
+        if costs[stop] == math.inf:
+            raise ValueError(f'stop {stop} can not be reached from stop {tour[-1]}')
+        tour.append(stop)
+        left.remove(stop)
+    return tour
+
+
+def tour_cost(matrix: [[float]], path: [int]) -> float:
+    return math.fsum(matrix[stop][next_stop] for stop, next_stop in zip(path, path[1:]))
+
+
+def two_opt(matrix: [[float]], path: [int], deadline: float) -> bool:
+    """
+    Reverse parts of a path wherever that makes it cheaper, keeping its first and last stop where they are.
+
+    The cost of a part of the path is taken to be the same in both directions, as it is for routes on a world where
+    every path can be taken both ways at the same cost.
+
+    :param matrix: the cost of going from each stop to each other stop
+    :param path: the stops in order, changed in place
+    :param deadline: the time.perf_counter() to stop at
+    :return: whether the path was improved
+    """
+    improved = False
+    for i in range(1, len(path) - 2):
+        if time.perf_counter() > deadline:
+            break
+        for j in range(i + 1, len(path) - 1):
+            a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+            if matrix[a][c] + matrix[b][d] - matrix[a][b] - matrix[c][d] < -EPSILON:
+                path[i:j + 1] = path[j:i - 1:-1]
+                improved = True
+    return improved
+
+
+def or_opt(matrix: [[float]], path: [int], deadline: float, longest: int = 3) -> bool:
+    """
+    Move runs of up to three stops to wherever in the path they cost least, either way round, keeping the first and
+    last stop of the path where they are.
+
+    :param matrix: the cost of going from each stop to each other stop
+    :param path: the stops in order, changed in place
+    :param deadline: the time.perf_counter() to stop at
+    :param longest: the most stops to move at once
+    :return: whether the path was improved
+    """
+    improved = False
+    for length in range(1, longest + 1):
+        i = 1
+        while i + length < len(path):
+            if time.perf_counter() > deadline:
+                return improved
+            before, first, last, after = path[i - 1], path[i], path[i + length - 1], path[i + length]
+            saved = matrix[before][first] + matrix[last][after] - matrix[before][after]
+            best, best_j, flip = -EPSILON, -1, False
+            for j in range(len(path) - 1):
+                if i - 1 <= j < i + length:
+                    continue
+                a, b = path[j], path[j + 1]
+                added = matrix[a][first] + matrix[last][b] - matrix[a][b]
+                if added - saved < best:
+                    best, best_j, flip = added - saved, j, False
+                added = matrix[a][last] + matrix[first][b] - matrix[a][b]
+                if added - saved < best:
+                    best, best_j, flip = added - saved, j, True
+            if best_j < 0:
+                i += 1
+                continue
+            run = path[i:i + length]
+            if flip:
+                run.reverse()
+            del path[i:i + length]
+            at = best_j + 1 if best_j < i else best_j + 1 - length
+            path[at:at] = run
+            improved = True
+    return improved
+
+
+def solve_tour(matrix, start: int = 0, closed: bool = True, time_budget: float = 1.0) -> [int]:
+    """
+    Find a cheap order to visit every stop in: a nearest neighbour tour, improved with 2-opt and Or-opt moves until
+    neither finds anything better or the time runs out.
+
+    An open tour is solved as a closed one through an extra stop that costs nothing to reach or leave, which is then
+    left out, so both kinds keep the two ends of the path fixed.
+
+    :param matrix: the cost of going from each stop to each other stop, the same both ways
+    :param start: the stop to start from
+    :param closed: come back to the start at the end
+    :param time_budget: the most seconds to spend improving the tour
+    :return: the order to visit every stop in, starting with the start (and not repeating it at the end)
+    """
+    deadline = time.perf_counter() + time_budget
+    matrix = np.asarray(matrix, dtype=np.float64)
+    count = len(matrix)
+    if count == 0:
+        return []
+    tour = nearest_neighbour_tour(matrix.tolist(), start)
+    if not closed:
+        matrix = np.pad(matrix, ((0, 1), (0, 1)))
+    costs = matrix.tolist()
+    path = tour + [start if closed else count]
+
+    while time.perf_counter() < deadline:
+        improved = two_opt(costs, path, deadline)
+        improved = or_opt(costs, path, deadline) or improved
+        if not improved:
+            break
+    return path[:count]
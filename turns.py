@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import heapq
+from itertools import count
+
+from my_globals import *
+from search import SearchStats
+from node import get_angles
+from graph import CompiledGraph
+
+# the kinds of turn, by the index stored for each turn in a TurnTable. Angles are measured the way get_angle does,
+# which with y growing down the screen makes a positive change of heading a turn to the left
+TURN_KINDS = ('straight', 'slight right', 'slight left', 'right', 'left', 'sharp right', 'sharp left', 'u-turn')
+STRAIGHT, SLIGHT_RIGHT, SLIGHT_LEFT, RIGHT, LEFT, SHARP_RIGHT, SHARP_LEFT, U_TURN = range(len(TURN_KINDS))
+FORBIDDEN = 255  # the code of a turn that can not be made
+
+# the largest change of heading in degrees of a straight on, slight, normal and sharp turn; anything more is a u-turn
+TURN_ANGLES = (20, 60, 120, 170)
+
+# the seconds each kind of turn adds to a route, for driving on the right: turning left crosses the oncoming traffic
+TURN_PENALTIES = {'straight': 0, 'slight right': 1, 'slight left': 2, 'right': 4, 'left': 8, 'sharp right': 7,
+                  'sharp left': 12, 'u-turn': 20}
+
+
+def turn_penalties(penalties: {str: float}, scale: float = 1, left_hand: bool = False) -> [float]:
+    """
+    Make the table of penalties that TurnTable.shortest_path looks up by turn code.
+
+    :param penalties: the penalty of each kind of turn by name, missing kinds cost nothing
+    :param scale: what to multiply each penalty by to put it in the units of the weights being searched
+    :param left_hand: the traffic drives on the left, so the penalties of left and right turns are swapped
+    :return: a list with the penalty of every possible code, where the codes that are not turns can not be taken
+    """
+    table = [math.inf] * 256
+    for code, kind in enumerate(TURN_KINDS):
+        if left_hand and kind != 'straight' and kind != 'u-turn':
+            kind = kind.replace('right', 'left') if 'right' in kind else kind.replace('left', 'right')
+        table[code] = penalties.get(kind, 0) * scale
+    return table
+
+
+class TurnTable:
+    """
+    The kind of every turn in a compiled graph, worked out once from the headings of its edges and kept as one byte
+    per turn, so routes can be found over edges with turn costs without building a line graph.
+
+    The turns at a node with d edges form a d x d block of codes, one row for each edge the node can be arrived at
+    by and one column for each edge leaving it, both in the order the node's edges are stored in the graph. Arriving
+    over edge e is the row of reverse[e], the edge going back the other way along the same path. The blocks of all
+    the nodes follow each other in codes, with node i's block starting at starts[i]. The table needs a byte per turn,
+    an integer per node and an integer per edge; a line graph would need a node per edge and an edge with its own
+    weight per turn, in python objects or in arrays of eight byte numbers.
+
+    Nodes with two paths are bends in a road rather than junctions, so going on through them is always straight
+    on. U-turns can only be made at dead ends unless u_turns is set when building the table. Turns can be forbidden
+    one at a time with restrict.
+    """
+
+    def __init__(self, codes: np.ndarray, starts: np.ndarray, reverse: np.ndarray, u_turns: bool = False):
+        self.codes = codes
+        self.starts = starts
+        self.reverse = reverse
+        self.u_turns = u_turns  # whether the table was built with u-turns allowed everywhere
+
+        self._codes = codes.data
+        self._starts = starts.data
+        self._reverse = reverse.data
+
+    @classmethod
+    def build(cls, graph: CompiledGraph, restrictions: [(int, int, int)] = (), u_turns: bool = False) -> TurnTable:
+        """
+        Work out the kind of every turn in a graph.
+
+        :param graph: the compiled graph
+        :param restrictions: the turns to forbid, as (id of the path arriving, index of the node, id of the path
+            leaving)
+        :param u_turns: allow u-turns at every node, not only at dead ends
+        :return: the turn table
+        """
+        offsets = graph.offsets
+        degrees = np.diff(offsets)
+        sizes = degrees * degrees
+        starts = np.zeros(len(graph) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=starts[1:])
+
+        # each edge and the one going back along the same path are next to each other when sorted by path id
+        order = np.argsort(graph.path_ids, kind='stable')
+        reverse = np.empty(graph.edge_count, dtype=np.int64)
+        reverse[order[0::2]] = order[1::2]
+        reverse[order[1::2]] = order[0::2]
+
+        tails = np.repeat(np.arange(len(graph)), degrees)
+        headings = get_angles(graph.xs[tails], graph.ys[tails], graph.xs[graph.targets], graph.ys[graph.targets])
+
+        # the node, row and column of every turn, in the order they are stored
+        nodes = np.repeat(np.arange(len(graph)), sizes)
+        local = np.arange(starts[-1]) - starts[nodes]
+        rows = local // degrees[nodes]
+        columns = local % degrees[nodes]
+
+        # the heading arriving over a row is the opposite of the heading leaving along it
+        change = (headings[offsets[nodes] + columns] - headings[offsets[nodes] + rows] + 360) % 360 - 180
+        size = np.abs(change)
+        left = change > 0
+        codes = np.full(len(nodes), U_TURN, dtype=np.uint8)
+        codes[size < TURN_ANGLES[3]] = np.where(left, SHARP_LEFT, SHARP_RIGHT)[size < TURN_ANGLES[3]]
+        codes[size < TURN_ANGLES[2]] = np.where(left, LEFT, RIGHT)[size < TURN_ANGLES[2]]
+        codes[size < TURN_ANGLES[1]] = np.where(left, SLIGHT_LEFT, SLIGHT_RIGHT)[size < TURN_ANGLES[1]]
+        codes[size <= TURN_ANGLES[0]] = STRAIGHT
+
+        bends = degrees[nodes] == 2
+        codes[bends & (rows != columns)] = STRAIGHT
+        back = rows == columns
+        codes[back] = U_TURN
+        if not u_turns:
+            codes[back & (degrees[nodes] > 1)] = FORBIDDEN
+
+        table = cls(codes, starts, reverse, u_turns)
+        for path1, node, path2 in restrictions:
+            table.restrict(graph, path1, node, path2)
+        return table
+
+    def arrays(self) -> {str: np.ndarray}:
+        return {'codes': self.codes, 'starts': self.starts, 'reverse': self.reverse}
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.starts.nbytes + self.reverse.nbytes
+
+    def position(self, graph: CompiledGraph, arriving: int, leaving: int) -> int:
+        """
+        Find where the turn from one edge onto another is stored in codes.
+
+        :param graph: the compiled graph the table was built from
+        :param arriving: the edge the turn is made from
+        :param leaving: the edge the turn is made onto, which must leave the node the first one arrives at
+        :return: the position of the turn
+        """
+        node = graph.targets[arriving]
+        first, last = graph.offsets[node], graph.offsets[node + 1]
+        if not first <= leaving < last:
+            raise ValueError(f'edge {leaving} does not leave the node edge {arriving} arrives at')
+        return int(self.starts[node] + (self.reverse[arriving] - first) * (last - first) + leaving - first)
+
+    def turn(self, graph: CompiledGraph, arriving: int, leaving: int) -> str:
+        """
+        The kind of the turn from one edge onto another, or 'forbidden'.
+        """
+        code = self.codes[self.position(graph, arriving, leaving)]
+        return 'forbidden' if code == FORBIDDEN else TURN_KINDS[code]
+
+    def restrict(self, graph: CompiledGraph, path1: int, node: int, path2: int):
+        """
+        Forbid turning from one path onto another at a node.
+
+        :param graph: the compiled graph the table was built from
+        :param path1: the id of the path arriving at the node
+        :param node: the index of the node
+        :param path2: the id of the path leaving the node
+        """
+        first, last = int(graph.offsets[node]), int(graph.offsets[node + 1])
+        path_ids = graph.path_ids[first:last]
+        if path1 not in path_ids or path2 not in path_ids:
+            raise ValueError(f'paths {path1} and {path2} do not both meet at node {node}')
+        for leaving in np.flatnonzero(path_ids == path2) + first:
+            for arriving in self.reverse[np.flatnonzero(path_ids == path1) + first]:
+                self.codes[self.position(graph, arriving, leaving)] = FORBIDDEN
+
+    def shortest_path(self, graph: CompiledGraph, source: int, target: int, penalties: [float], heuristic=None,
+                      stats: SearchStats = None) -> ([int], float):
+        """
+        Find the shortest path between two node indexes where every turn adds its penalty, using Dijkstra over the
+        edges of the graph, or A* when a heuristic is given.
+
+        Each edge is settled once, as being on it can be reached at a different cost depending on the edge it was
+        turned onto from. The route can leave the source along any edge and is found once an edge into the target
+        is settled.
+
+        :param graph: the compiled graph the table was built from, weighted by what should be searched
+        :param source: the index of the node to start from
+        :param target: the index of the node to find a path to
+        :param penalties: the penalty of each turn code, from turn_penalties
+        :param heuristic: a function of (index, target index) giving a lower bound on the distance between them
+        :param stats: optional counters to add the work done to
+        :return: the list of node indexes along the path and its cost, or (None, inf) if there is no path
+        """
+        if source == target:
+            return [source], 0.0
+        offsets = graph._offsets
+        targets = graph._targets
+        weights = graph._weights
+        codes = self._codes
+        starts = self._starts
+        reverse = self._reverse
+
+        distances = {}
+        previous = {}
+        settled = set()
+        order = count()
+        heap = []
+        for edge in range(offsets[source], offsets[source + 1]):
+            distance = weights[edge]
+            if distance < distances.get(edge, math.inf):
+                distances[edge] = distance
+                estimate = distance + heuristic(targets[edge], target) if heuristic else distance
+                heap.append((estimate, next(order), distance, edge))
+        heapq.heapify(heap)
+        pushed = len(heap)
+        expanded = relaxed = popped = 0
+        found = -1
+
+        while heap:
+            _, _, distance, edge = heapq.heappop(heap)
+            popped += 1
+            if edge in settled:
+                continue
+            expanded += 1
+            node = targets[edge]
+            if node == target:
+                found = edge
+                break
+            settled.add(edge)
+
+            first, last = offsets[node], offsets[node + 1]
+            # the row of this edge's turns, moved back so that it can be indexed by the edge leaving
+            row = starts[node] + (reverse[edge] - first) * (last - first) - first
+            for leaving in range(first, last):
+                if leaving in settled:
+                    continue
+                new_dist = distance + weights[leaving] + penalties[codes[row + leaving]]
+                if new_dist < distances.get(leaving, math.inf):
+                    relaxed += 1
+                    distances[leaving] = new_dist
+                    previous[leaving] = edge
+                    estimate = new_dist + heuristic(targets[leaving], target) if heuristic else new_dist
+                    heapq.heappush(heap, (estimate, next(order), new_dist, leaving))
+
+        if stats is not None:
+            stats.queries += 1
+            stats.expanded += expanded
+            stats.relaxed += relaxed
+            stats.pushed += relaxed + pushed
+            stats.popped += popped
+
+        if found < 0:
+            return None, math.inf
+        path = []
+        edge = found
+        while edge in previous:
+            path.append(targets[edge])
+            edge = previous[edge]
+        path.append(targets[edge])
+        path.append(source)
+        path.reverse()
+        return path, distances[found]
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+from tkinter import Tk, Canvas, Event
+
+from my_globals import *
+from node import *
+from junctions import is_junction
+
+LANE_WIDTH = METER * 2
+PATH_COLOR = '#656565'
+ACTIVE_COLOR = '#858585'
+ROUTE_COLOR = '#BADA55'
+DETAIL_SCALE = 0.5  # below this zoom, lane markings are left out and chains of paths are drawn as one line
+ZOOM_STEP = 1.25
+
+
+class WorldView:
+    """
+    Draws a world on a Tk canvas and lets the user add paths to it with the mouse, pan it by dragging with the right
+    mouse button and zoom it with the mouse wheel.
+
+    Only the nodes and paths inside the viewport are drawn, found through the world's spatial index. When zoomed out
+    past DETAIL_SCALE, lane markings are skipped, only junctions get a node, and each chain of paths between two
+    junctions is drawn as a single polyline.
+
+    The canvas is only drawn from scratch when the world's size or the viewport changes. After that the view keeps the
+    canvas items of every node and path it has drawn, and the world tells it about new nodes and paths, so each draw
+    only creates the items that are new and redraws the lane markings of the paths that meet at the nodes that changed.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+        self.root = Tk()
+        self.root.title(world.title)
+        self.canvas: Canvas = Canvas(self.root)
+        self.canvas.pack()
+
+        self.creating_new_path = False
+        self.anchor = None
+        self.circle = None
+        self.line = None
+        self.last_node = None
+
+        self.route_start = None
+        self.route_end = None
+
+        self.offset_x = 0  # the world point at the top left of the canvas
+        self.offset_y = 0
+        self.scale = 1
+        self.pan_start = None
+
+        self.node_items: {PathNode: int} = {}
+        self.path_items: {int: int} = {}
+        self.line_items: {int: [int]} = {}
+        self.route_items: [int] = []
+        self.new_nodes: [PathNode] = []
+        self.new_paths: [Path] = []
+
+    def node_added(self, node: PathNode):
+        self.new_nodes.append(node)
+
+    def path_added(self, path: Path):
+        self.new_paths.append(path)
+
+    @property
+    def detailed(self) -> bool:
+        return self.scale >= DETAIL_SCALE
+
+    def screen(self, point) -> Node:
+        x, y = get_xy(point)
+        return Node((x - self.offset_x) * self.scale, (y - self.offset_y) * self.scale)
+
+    def to_world(self, x: float, y: float) -> Node:
+        return Node(x / self.scale + self.offset_x, y / self.scale + self.offset_y)
+
+    def visible_area(self) -> (float, float, float, float):
+        margin = LANE_WIDTH * 2
+        return (self.offset_x - margin, self.offset_y - margin,
+                self.offset_x + self.world.width / self.scale + margin,
+                self.offset_y + self.world.height / self.scale + margin)
+
+    def is_visible(self, path: Path) -> bool:
+        x1, y1, x2, y2 = self.visible_area()
+        return min(path.node1.x, path.node2.x) <= x2 and max(path.node1.x, path.node2.x) >= x1 \
+            and min(path.node1.y, path.node2.y) <= y2 and max(path.node1.y, path.node2.y) >= y1
+
+    def set_viewport(self, x: float = None, y: float = None, scale: float = None):
+        """
+        Move or zoom the view and draw it again.
+
+        :param x: the world x coordinate to show at the left edge of the canvas
+        :param y: the world y coordinate to show at the top edge of the canvas
+        :param scale: the number of canvas pixels per world pixel
+        """
+        if x is not None:
+            self.offset_x = x
+        if y is not None:
+            self.offset_y = y
+        if scale is not None:
+            self.scale = scale
+        self.world.built = False
+        self.draw()
+
+    def build(self):
+        # edits are drawn in place when zoomed in; when zoomed out they can merge chains, so everything is redrawn
+        if not self.world.built or (not self.detailed and (self.new_nodes or self.new_paths)):
+            self.canvas.destroy()
+            self.canvas = Canvas(self.root, width=self.world.width, height=self.world.height, background="#DDDDDD")
+            self.canvas.pack()
+            self.node_items.clear()
+            self.path_items.clear()
+            self.line_items.clear()
+            self.route_items.clear()
+            self.new_nodes.clear()
+            self.new_paths.clear()
+
+            self.canvas.tag_bind('path_node', '<Enter>', self.on_hover)
+            self.canvas.tag_bind('path_node', '<Leave>', self.on_leave)
+            self.canvas.tag_bind('path_node', '<Button-1>', self.start_new)
+            self.canvas.tag_bind('new_node', '<Button-1>', self.place_new)
+            self.canvas.bind('<Motion>', self.drag)
+            self.canvas.bind('<ButtonPress-3>', self.start_pan)
+            self.canvas.bind('<B3-Motion>', self.pan)
+            self.canvas.bind('<ButtonRelease-3>', self.end_pan)
+            self.canvas.bind('<MouseWheel>', self.zoom)
+            self.canvas.bind('<Button-4>', self.zoom)
+            self.canvas.bind('<Button-5>', self.zoom)
+
+            area = self.visible_area()
+            paths = self.world.index.paths_in(*area)
+            nodes = self.world.index.nodes_in(*area)
+            if self.detailed:
+                for path in paths:
+                    self.make_path(path)
+                for node in nodes:
+                    self.make_node(node)
+                for path, geometry in zip(paths, self.lane_geometry(paths)):
+                    self.make_lines(path, geometry)
+            else:
+                for nodes_along in self.chains(paths):
+                    self.make_chain(nodes_along)
+                for node in nodes:
+                    if is_junction(node):
+                        self.make_node(node)
+            self.world.built = True
+        else:
+            self.update()
+        self.draw_route()
+
+    def update(self):
+        """
+        Draw the nodes and paths added since the last draw, keeping everything else on the canvas.
+        """
+        x1, y1, x2, y2 = self.visible_area()
+        changed = set()
+        for path in self.new_paths:
+            changed.update((path.node1, path.node2))
+            if self.is_visible(path):
+                self.make_path(path)
+                self.canvas.tag_lower(self.path_items[path.id])
+        new_nodes = [node for node in self.new_nodes if x1 <= node.x <= x2 and y1 <= node.y <= y2]
+        for node in new_nodes:
+            self.make_node(node)
+        if new_nodes:
+            self.canvas.tag_raise('lane')
+
+        # the lane markings of a path depend on how many paths meet at each end
+        redraw = [self.world.paths[id][0] for id in {path.id for node in changed for path in node.paths.values()}
+                  if id in self.path_items]
+        for path, geometry in zip(redraw, self.lane_geometry(redraw)):
+            self.canvas.delete(*self.line_items.pop(path.id, ()))
+            self.make_lines(path, geometry)
+
+        self.new_nodes.clear()
+        self.new_paths.clear()
+
+    def chains(self, paths: [Path]) -> [[PathNode]]:
+        """
+        Find the chains of paths between junctions that the given paths are part of.
+
+        :param paths: the paths to find the chains of
+        :return: the nodes along each chain, with each chain listed once
+        """
+        junctions = self.world.junctions
+        found = {}
+        for path in paths:
+            if path.node1 in junctions.routes and path.id in junctions.routes[path.node1]:
+                chain = junctions.routes[path.node1][path.id][1]
+            elif path.node1 in junctions.positions:
+                chain = junctions.positions[path.node1][0]
+            else:
+                found[path.id] = [path.node1, path.node2]  # a loop without any junctions
+                continue
+            found[id(chain)] = chain.nodes
+        return list(found.values())
+
+    def make_chain(self, nodes: [PathNode]):
+        coords = [value for node in nodes for value in self.screen(node).get_xy()]
+        self.canvas.create_line(*coords, width=max(LANE_WIDTH * 2 * self.scale, 1), fill=PATH_COLOR, tag='road')
+
+    def make_path(self, path: Path):
+        x1, y1 = self.screen(path.node1).get_xy()
+        x2, y2 = self.screen(path.node2).get_xy()
+        self.path_items[path.id] = self.canvas.create_line(x1, y1, x2, y2, width=LANE_WIDTH * 2 * self.scale,
+                                                           fill=PATH_COLOR, tag='road')
+
+    def make_node(self, node: PathNode):
+        x, y = self.screen(node).get_xy()
+        radius = LANE_WIDTH * self.scale
+        self.node_items[node] = self.canvas.create_oval(x - radius, y - radius, x + radius, y + radius,
+                                                        fill=PATH_COLOR, width=0, activefill=ACTIVE_COLOR,
+                                                        tag="path_node")
+
+    def lane_geometry(self, paths: [Path]) -> [((float,) * 4, (float,) * 4, (float,) * 4)]:
+        """
+        Work out the canvas coordinates of the lane markings of many paths at once.
+
+        :param paths: the paths to find the markings of
+        :return: for each path, the stop lines at its first and second node (None where there is no junction) and
+            its center line, each as (x1, y1, x2, y2)
+        """
+        x1 = np.fromiter((path.node1.x for path in paths), dtype=np.float64, count=len(paths))
+        y1 = np.fromiter((path.node1.y for path in paths), dtype=np.float64, count=len(paths))
+        x2 = np.fromiter((path.node2.x for path in paths), dtype=np.float64, count=len(paths))
+        y2 = np.fromiter((path.node2.y for path in paths), dtype=np.float64, count=len(paths))
+        junction1 = np.fromiter((len(path.node1.paths) > 2 for path in paths), dtype=bool, count=len(paths))
+        junction2 = np.fromiter((len(path.node2.paths) > 2 for path in paths), dtype=bool, count=len(paths))
+
+        # the center line stops short of any junction to leave room for a stop line across the road
+        a1 = get_angles(x1, y1, x2, y2)
+        a2 = get_angles(x2, y2, x1, y1)
+        o1 = get_points(x1, y1, a1, np.where(junction1, LANE_WIDTH * 1.75, 0))
+        o2 = get_points(x2, y2, a2, np.where(junction2, LANE_WIDTH * 1.75, 0))
+        stops1 = get_points(*o1, a1 - 90, LANE_WIDTH) + get_points(*o1, a1 + 90, LANE_WIDTH)
+        stops2 = get_points(*o2, a2 - 90, LANE_WIDTH) + get_points(*o2, a2 + 90, LANE_WIDTH)
+
+        def to_screen(xs1, ys1, xs2, ys2) -> [(float,) * 4]:
+            coords = np.stack((xs1 - self.offset_x, ys1 - self.offset_y, xs2 - self.offset_x, ys2 - self.offset_y),
+                              axis=1) * self.scale
+            return [tuple(line) for line in coords.tolist()]
+
+        return [(stop1 if is_junction1 else None, stop2 if is_junction2 else None, center)
+                for stop1, stop2, center, is_junction1, is_junction2
+                in zip(to_screen(*stops1), to_screen(*stops2), to_screen(*o1, *o2), junction1.tolist(),
+                       junction2.tolist())]
+
+    def make_lines(self, path: Path, geometry: ((float,) * 4, (float,) * 4, (float,) * 4)):
+        stop1, stop2, center = geometry
+        items = []
+        for stop in (stop1, stop2):
+            if stop is not None:
+                items.append(self.canvas.create_line(*stop, width=METER * 0.2 * self.scale, fill='white',
+                                                     dash=(1, 1), tag='lane'))
+        items.append(self.canvas.create_line(*center, width=METER * 0.1 * self.scale, fill='white', dash=(10, 5),
+                                             tag='lane'))
+        self.line_items[path.id] = items
+
+    def start_new(self, event):
+        mouse = Node(event.x, event.y)
+        self.last_node = self.world.get_nearest_path_node(self.to_world(event.x, event.y))
+        self.creating_new_path = True
+        radius = LANE_WIDTH * self.scale
+        last = self.screen(self.last_node)
+        self.anchor = self.canvas.create_oval(*(last - radius), *(last + radius), fill=ACTIVE_COLOR, width=0)
+        self.line = self.canvas.create_line(*last, *mouse, width=radius * 2, fill=ACTIVE_COLOR)
+        self.circle = self.canvas.create_oval(*(mouse - radius), *(mouse + radius), fill=ACTIVE_COLOR, width=0,
+                                              tag='new_node')
+
+    def drag(self, event):
+        if self.creating_new_path:
+            mouse = Node(event.x, event.y)
+            radius = LANE_WIDTH * self.scale
+            self.canvas.coords(self.line, *self.screen(self.last_node), *mouse)
+            self.canvas.coords(self.circle, *(mouse - radius), *(mouse + radius))
+
+    def place_new(self, event):
+        self.creating_new_path = False
+        self.canvas.delete(self.anchor, self.line, self.circle)
+        mouse = self.to_world(event.x, event.y)
+        nearest = self.world.get_nearest_path_node(mouse)
+        if mouse.get_distance_from(nearest) > LANE_WIDTH:
+            new_node = self.world.add_path_node(mouse.x / METER, mouse.y / METER)
+            self.world.add_path(self.last_node, new_node)
+        else:
+            self.world.add_path(self.last_node, nearest)
+        self.draw()
+
+    def start_pan(self, event):
+        self.pan_start = (event.x, event.y, self.offset_x, self.offset_y)
+
+    def pan(self, event):
+        # slide what is already drawn while dragging, and draw what came into view once the button is let go
+        if self.pan_start is not None:
+            x, y, offset_x, offset_y = self.pan_start
+            moved_x = (offset_x - self.offset_x) * self.scale + event.x - x
+            moved_y = (offset_y - self.offset_y) * self.scale + event.y - y
+            self.canvas.move('all', moved_x, moved_y)
+            self.offset_x -= moved_x / self.scale
+            self.offset_y -= moved_y / self.scale
+
+    def end_pan(self, event):
+        if self.pan_start is not None:
+            self.pan_start = None
+            self.set_viewport()
+
+    def zoom(self, event):
+        # keep the world point under the mouse in place
+        factor = ZOOM_STEP if event.num == 4 or getattr(event, 'delta', 0) > 0 else 1 / ZOOM_STEP
+        point = self.to_world(event.x, event.y)
+        scale = self.scale * factor
+        self.set_viewport(point.x - event.x / scale, point.y - event.y / scale, scale)
+
+    def on_hover(self, event: Event):
+        mouse = Node(event.x, event.y)
+        # nearest = self.world.get_nearest_path_node(mouse)
+
+    def on_leave(self, event):
+        mouse = Node(event.x, event.y)
+        # nearest = self.world.get_nearest_path_node(mouse)
+
+    def draw(self):
+        self.build()
+
+    def draw_route(self, start: PathNode = None, end: PathNode = None):
+        if start is not None:
+            self.route_start = start
+        if end is not None:
+            self.route_end = end
+
+        # the old route is replaced rather than drawn over
+        self.canvas.delete(*self.route_items)
+        self.route_items.clear()
+
+        if self.route_start is not None and self.route_end is not None:
+            route: Route = self.world.find_shortest_route(self.route_start, self.route_end)
+            if route is None:
+                return
+            path_width = LANE_WIDTH / 3 * self.scale
+            radius = path_width / 2
+            items = self.route_items
+
+            cnt = len(route.nodes)
+            n1 = a1 = o1 = 0
+            for n in range(cnt):
+                if n == 0:
+                    n1 = route.nodes[n]
+                    n2 = route.nodes[n + 1]
+                    a1 = get_angle(n1, n2)
+                    o1 = self.screen(get_point(get_point(n1, a1, METER), a1 - 90, LANE_WIDTH / 2))
+                    items.append(self.canvas.create_oval(*o1-radius, *o1+radius, fill=ROUTE_COLOR, width=0))
+                elif n < cnt - 1:
+                    n1 = route.nodes[n]
+                    n2 = route.nodes[n + 1]
+                    a0 = a1
+                    a2 = get_angle(n1, n2)
+                    a1 = (a0 + a2) / 2
+                    o0 = o1
+                    o1 = self.screen(get_point(n1, a1 - 90, LANE_WIDTH / 2))
+                    items.append(self.canvas.create_oval(*o1-radius, *o1+radius, fill=ROUTE_COLOR, width=0))
+                    items.append(self.canvas.create_line(*o0, *o1, fill=ROUTE_COLOR, width=path_width))
+                else:
+                    n1 = route.nodes[n]
+                    a0 = a1
+                    o0 = o1
+                    o1 = self.screen(get_point(n1, a0 - 90, LANE_WIDTH / 2))
+                    items.append(self.canvas.create_oval(*o1-radius, *o1+radius, fill=ROUTE_COLOR, width=0))
+                    items.append(self.canvas.create_line(*o0, *o1, fill=ROUTE_COLOR, width=path_width))
@@ -1,23 +1,29 @@
 from __future__ import annotations
 
-from tkinter import Tk, Canvas, Event
+import time
+from contextlib import contextmanager
+
 from numpy import random as np_rand
 
 from my_globals import *
 from node import *
-
-METER = 10
-LANE_WIDTH = METER * 2
-PATH_COLOR = '#656565'
-ACTIVE_COLOR = '#858585'
+from graph import *
+from junctions import *
+from hierarchy import *
+from spatial import *
+from cache import *
+from store import *
+from profiler import *
+from turns import *
+from alternatives import *
+from tours import *
 
 
 class World:
-    def __init__(self, title: str = 'Path Finder', width: int = 1000, height: int = 800, seed: int = -1):
-        self.root = Tk()
-        self.root.title(title)
-        self.canvas: Canvas = Canvas(self.root)
-        self.canvas.pack()
+    def __init__(self, title: str = 'Path Finder', width: int = 1000, height: int = 800, seed: int = -1,
+                 cell_size: float = METER * 10):
+        self.title = title
+        self.view = None
 
         self.rand: np_rand = np_rand
 
@@ -31,14 +37,21 @@ class World:
 
         self.path_nodes: {int: Node} = {}
         self.paths: {int: Path} = {}
-
-        self.creating_new_path = False
-        self.circle = None
-        self.line = None
-        self.last_node = None
-
-        self.route_start = None
-        self.route_end = None
+        self.graph: CompiledGraph = None
+        self.weighted: {str: CompiledGraph} = {}  # copies of the graph weighted by time or cost, made when needed
+        self.bounds: {str: float} = {}  # a lower bound on the weight per unit of length of every path, for A*
+        self.junctions = JunctionGraph()
+        self.hierarchy: ContractionHierarchy = None
+        self.turns: TurnTable = None
+        self.turn_restrictions: {(int, int, int)} = set()  # the forbidden turns as (path id, node id, path id)
+        self.turn_penalties: {str: float} = dict(TURN_PENALTIES)  # the seconds added by each kind of turn
+        self.u_turns = False  # allow u-turns at every node rather than only at dead ends
+        self.left_hand = False  # the traffic drives on the left
+        self.index = SpatialGrid(cell_size)  # cell_size is the side of the cells of the grid, in world units
+        self.route_cache = RouteCache()
+        self.file = None  # the file the graph and hierarchy are mapped from, until the world is edited
+        self.pending = None  # the nodes whose paths have changed inside a batch
+        self.profiler: QueryProfiler = None  # records every find_shortest_route while profiling
 
         self.built = False
 
@@ -50,6 +63,8 @@ class World:
             self.active_seed = np_rand.randint(0, MAX32)
         else:
             self.active_seed = clamp(self.seed)
+        # ids are drawn from a generator of the world's own, so the same seed always gives the same ids
+        self.rand = np_rand.RandomState(self.active_seed % 2 ** 32)
         self.built = False
 
     def set_size(self, width: int = None, height: int = None):
@@ -59,183 +74,577 @@ class World:
             self.height = clamp(height, 100)
         self.built = False
 
-    def add_path_node(self, u, v) -> PathNode:
-        while True:
-            id = self.rand.randint(0, MAX32)
-            if id not in self.path_nodes:
-                node = PathNode(id, u, v)
-                self.path_nodes[id] = node
-                self.built = False
-                return node
-
-    def add_path(self, node1: PathNode, node2: PathNode) -> (Path, Path):
+    def add_path_node(self, u, v, id: int = None) -> PathNode:
+        if id is None:
+            id = self.new_id(self.path_nodes)
+        elif id in self.path_nodes:
+            raise ValueError(f'there is already a path node with id {id}')
+        node = PathNode(id, u, v)
+        self.path_nodes[id] = node
+        # a node without paths can not change any route, so the route cache is left alone
+        self.index.add_node(node)
+        if self.pending is None:
+            self.junctions.update([node])
+        else:
+            self.pending.add(node)
+        self.graph = None
+        self.weighted.clear()
+        self.hierarchy = None
+        self.turns = None
+        self.file = None
+        if self.view is not None:
+            self.view.node_added(node)
+        return node
+
+    def add_path(self, node1: PathNode, node2: PathNode, id: int = None) -> (Path, Path):
+        if id is None:
+            id = self.new_id(self.paths)
+        elif id in self.paths:
+            raise ValueError(f'there is already a path with id {id}')
+        path1 = Path(id, node1, node2)
+        node1.paths[id] = path1
+
+        path2 = Path(id, node2, node1)
+        node2.paths[id] = path2
+
+        self.paths[id] = (path1, path2)
+        self.index.add_path(path1)
+        if self.pending is None:
+            self.route_cache.invalidate_path(path1)
+            self.junctions.update([node1, node2])
+        else:
+            self.pending.update((node1, node2))
+        self.graph = None
+        self.weighted.clear()
+        self.hierarchy = None
+        self.turns = None
+        self.file = None
+        if self.view is not None:
+            self.view.path_added(path1)
+        return path1, path2
+
+    def remove_path(self, path: Path):
+        """
+        Take a path (given in either direction) out of the world, along with the turn restrictions that use it.
+        """
+        path1, path2 = self.paths.pop(path.id)
+        node1, node2 = path1.node1, path1.node2
+        del node1.paths[path.id]
+        del node2.paths[path.id]
+        self.index.remove_path(path1)
+        if self.pending is None:
+            self.route_cache.invalidate_removed_path(path1)
+            self.junctions.update([node1, node2])
+        else:
+            self.pending.update((node1, node2))
+        self.turn_restrictions = {turn for turn in self.turn_restrictions if path.id not in (turn[0], turn[2])}
+        self.graph = None
+        self.weighted.clear()
+        self.hierarchy = None
+        self.turns = None
+        self.file = None
+        self.built = False  # the view draws edits in place, but a path taken away needs everything drawn again
+
+    def new_id(self, taken: dict) -> int:
         while True:
             id = self.rand.randint(0, MAX32)
+            if id not in taken:
+                return id
+
+    @contextmanager
+    def batch(self):
+        """
+        Add many path nodes and paths at once. Inside the block the junction graph and the route cache are left
+        alone, and they are brought up to date once when the block ends instead of after every change.
+            with world.batch():
+                for u, v in points:
+                    world.add_path_node(u, v)
+        """
+        if self.pending is not None:
+            yield self
+            return
+        self.pending = set()
+        try:
+            yield self
+        finally:
+            pending, self.pending = self.pending, None
+            self.junctions.update(list(pending))
+            self.route_cache.clear()
+
+    def compile(self, weight: str = 'length') -> CompiledGraph:
+        """
+        Make the compiled graph of the world, weighted by one of WEIGHTS.
+
+        The graph is kept until the world is edited. Graphs weighted by time or cost share everything but their
+        weights with the one weighted by length, and update_weights changes their weights in place.
+        """
+        if weight not in WEIGHTS:
+            raise ValueError(f'unknown weight: {weight}')
+        if self.graph is None:
+            nodes = self.path_nodes.values()
+            paths = [path for path, _ in self.paths.values()]
+            self.graph = CompiledGraph.from_edges([node.id for node in nodes],
+                                                  [node.x for node in nodes],
+                                                  [node.y for node in nodes],
+                                                  [path.node1.id for path in paths],
+                                                  [path.node2.id for path in paths],
+                                                  [path.id for path in paths])
+        if weight == 'length':
+            return self.graph
+        if weight not in self.weighted:
+            paths = self.paths
+            values = np.array([getattr(paths[id][0], weight) for id in self.graph.path_ids.tolist()], dtype=np.float64)
+            self.weighted[weight] = self.graph.with_weights(values)
+            lengths = self.graph.weights
+            bound = float(np.min(values[lengths > 0] / lengths[lengths > 0], initial=math.inf))
+            self.bounds[weight] = bound if bound < math.inf else 0.0
+        return self.weighted[weight]
+
+    def update_weights(self, weight: str, path_ids, values):
+        """
+        Change the time or cost of many paths at once, such as from a live traffic feed.
+
+        The paths, the compiled graph weighted by the same weight (if there is one) and the cached routes are all
+        repaired in place; nothing that depends only on length is touched.
+
+        :param weight: 'time' or 'cost'
+        :param path_ids: the ids of the paths to change
+        :param values: the new weight of each path, or math.inf to close it
+        """
+        if weight not in WEIGHTS or weight == 'length':
+            raise ValueError(f'the {weight} of a path can not be changed')
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        path_ids = np.asarray(path_ids, dtype=np.int64).reshape(-1)
+        if len(values) != len(path_ids):
+            raise ValueError(f'{len(path_ids)} path ids were given with {len(values)} values')
+        # check everything before changing anything, so a bad update leaves the world as it was
+        for id in path_ids.tolist():
             if id not in self.paths:
-                path1 = Path(id, node1, node2)
-                node1.paths[id] = path1
-
-                path2 = Path(id, node2, node1)
-                node2.paths[id] = path2
+                raise KeyError(id)
+        if np.isnan(values).any() or (values < 0).any():
+            raise ValueError(f'the {weight} of a path must be a number of at least 0')
+
+        changes = []
+        for id, value in zip(path_ids.tolist(), values.tolist()):
+            path1, path2 = self.paths[id]
+            changes.append((path1, getattr(path1, weight), value))
+            setattr(path1, weight, value)
+            setattr(path2, weight, value)
+
+        graph = self.weighted.get(weight)
+        if graph is not None:
+            graph.set_weights(path_ids, values)
+            # a lower weight may lower the bound; a higher one leaves it a looser but still valid bound
+            self.bounds[weight] = min([self.bounds[weight]] + [new / path.length for path, old, new in changes
+                                                               if new < old and path.length > 0])
+        self.route_cache.invalidate_weights(weight, changes)
+
+    def update_speeds(self, path_ids, speeds):
+        """
+        Set the travel time of many paths from their speeds in meters per second, where a speed of 0 closes the path.
+        """
+        lengths = np.array([self.paths[id][0].length for id in np.asarray(path_ids).reshape(-1).tolist()])
+        speeds = np.asarray(speeds, dtype=np.float64).reshape(-1)
+        # a closed path takes forever even when it has no length, rather than 0 / 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.update_weights('time', path_ids, np.where(speeds == 0, math.inf, lengths / (METER * speeds)))
+
+    def build_hierarchy(self) -> ContractionHierarchy:
+        self.hierarchy = ContractionHierarchy.build(self.compile())
+        return self.hierarchy
+
+    def turn_table(self) -> TurnTable:
+        """
+        The kind of every turn in the compiled graph, worked out once and kept until the world is edited or u_turns
+        is changed.
+        """
+        if self.turns is None or self.turns.u_turns != self.u_turns:
+            graph = self.compile()
+            self.turns = TurnTable.build(graph, [(path1, graph.index_of(node), path2)
+                                                 for path1, node, path2 in self.turn_restrictions], self.u_turns)
+        return self.turns
+
+    def restrict_turn(self, path1: Path, node: PathNode, path2: Path):
+        """
+        Forbid turning from one path onto another where they meet at a node, for the turns routing method.
+        """
+        if path1.id not in node.paths or path2.id not in node.paths:
+            raise ValueError(f'paths {path1.id} and {path2.id} do not both meet at {node}')
+        self.turn_restrictions.add((path1.id, node.id, path2.id))
+        if self.turns is not None:
+            self.turns.restrict(self.compile(), path1.id, self.graph.index_of(node.id), path2.id)
+
+    def penalties(self, weight: str = 'length') -> [float]:
+        """
+        The penalty of each turn code in units of the given weight. The penalties are kept in seconds, and turned into
+        the distance covered in that time at DEFAULT_SPEED for the length and the cost.
+        """
+        return turn_penalties(self.turn_penalties, 1 if weight == 'time' else METER * DEFAULT_SPEED, self.left_hand)
+
+    def load_hierarchy(self, file) -> ContractionHierarchy:
+        hierarchy = ContractionHierarchy.load(file)
+        if not hierarchy.matches(self.compile()):
+            raise ValueError('the saved hierarchy was built for different path nodes or paths')
+        self.hierarchy = hierarchy
+        return hierarchy
+
+    def save(self, file, hierarchy: bool = True):
+        """
+        Write the path nodes and paths to a binary file, along with the compiled graph and (if one has been built or
+        loaded) the contraction hierarchy, so they do not have to be made again when the file is loaded.
+
+        :param file: the path of the file to write
+        :param hierarchy: include the contraction hierarchy if there is one
+        """
+        graph = self.compile()
+        arrays = engine_arrays(graph, self.hierarchy if hierarchy else None)
+        nodes = [self.path_nodes[id] for id in graph.ids.tolist()]
+        arrays['world.us'] = np.array([node.u for node in nodes], dtype=np.float64)
+        arrays['world.vs'] = np.array([node.v for node in nodes], dtype=np.float64)
+        paths = [path for path, _ in self.paths.values()]
+        arrays['world.paths'] = np.array([(path.id, path.node1.id, path.node2.id) for path in paths],
+                                         dtype=np.int64).reshape(-1, 3)
+        arrays['world.times'] = np.array([path.time for path in paths], dtype=np.float64)
+        arrays['world.costs'] = np.array([path.cost for path in paths], dtype=np.float64)
+        save_arrays(file, arrays)
+
+    def load(self, file, mmap: bool = True):
+        """
+        Replace the path nodes and paths of the world with those in a file written by save.
+
+        The compiled graph and hierarchy are used straight from the file, so routing with the compiled and hierarchy
+        methods does not have to wait for them, and route pools started on the world map the same file rather than
+        copying the arrays.
+
+        :param file: the path of the file to read
+        :param mmap: map the file into memory rather than reading it
+        """
+        arrays = load_arrays(file, mmap)
+        graph, hierarchy = load_engines(arrays)
+        world = section(arrays, 'world')
+
+        self.path_nodes = {id: PathNode(id, u, v)
+                           for id, u, v in zip(graph.ids.tolist(), world['us'].tolist(), world['vs'].tolist())}
+        self.paths = {}
+        for (id, id1, id2), time, cost in zip(world['paths'].tolist(), world['times'].tolist(),
+                                              world['costs'].tolist()):
+            node1, node2 = self.path_nodes[id1], self.path_nodes[id2]
+            path1 = Path(id, node1, node2)
+            path2 = Path(id, node2, node1)
+            path1.time = path2.time = time
+            path1.cost = path2.cost = cost
+            node1.paths[id] = path1
+            node2.paths[id] = path2
+            self.paths[id] = (path1, path2)
+
+        self.index.rebuild(self.path_nodes.values(), [path for path, _ in self.paths.values()])
+        self.junctions.rebuild(self.path_nodes.values())
+        self.route_cache.clear()
+        self.graph = graph
+        self.weighted.clear()
+        self.hierarchy = hierarchy
+        self.turns = None
+        self.turn_restrictions.clear()
+        self.file = file if mmap else None
+        self.built = False
 
-                self.paths[id] = (path1, path2)
-                return path1, path2
+    def route_from_indexes(self, indexes: [int], cost: float, weight: str = 'length', turns: bool = False) -> Route:
+        # with turns the cost includes the turn penalties, so the length has to be worked out from the nodes
+        if indexes is None:
+            return None
+        graph = self.compile()
+        nodes = [self.path_nodes[int(graph.ids[index])] for index in indexes]
+        if weight == 'length' and not turns:
+            return Route.from_nodes(nodes, cost)
+        return Route.from_nodes(nodes, get_route_length(nodes), cost)
+
+    def scale(self, weight: str = 'length') -> float:
+        """
+        The lowest weight per unit of length of any path, which scales straight line distances into lower bounds.
+        """
+        self.compile(weight)
+        return 1.0 if weight == 'length' else self.bounds[weight]
+
+    def heuristic(self, weight: str = 'length'):
+        """
+        The A* heuristic for the compiled graph weighted by the given weight: the straight line distance scaled down
+        to the lowest weight per unit of length of any path, so it never overestimates.
+        """
+        graph = self.compile(weight)
+        if weight == 'length':
+            return graph.euclidean
+        bound = self.bounds[weight]
+        return lambda index, target: bound * graph.euclidean(index, target)
+
+    def find_shortest_route(self, start: PathNode, end: PathNode, astar: bool = False, stats: SearchStats = None,
+                            method: str = 'junctions', weight: str = 'length') -> Route:
+        if self.profiler is not None:
+            return self.profile_route(start, end, astar, stats, method, weight)
+        if method == 'turns':
+            # the cache does not tell routes with turn penalties from routes without, so they are not cached
+            return self.search_route(start, end, astar, stats, method, weight)
+        cached, route = self.route_cache.lookup(start, end, weight)
+        if not cached:
+            route = self.search_route(start, end, astar, stats, method, weight)
+            self.route_cache.store(start, end, route, weight)
+        return route
+
+    def start_profiling(self, profiler: QueryProfiler = None) -> QueryProfiler:
+        """
+        Record the counters and phase timings of every find_shortest_route from now on. Profiling is off by default,
+        and costs a single check per query while it is off.
+
+        :param profiler: the profiler to add to, or None for a new one
+        :return: the profiler in use
+        """
+        self.profiler = profiler or QueryProfiler()
+        return self.profiler
+
+    def stop_profiling(self) -> QueryProfiler:
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    def profile_route(self, start: PathNode, end: PathNode, astar: bool = False, stats: SearchStats = None,
+                      method: str = 'junctions', weight: str = 'length') -> Route:
+        """
+        find_shortest_route, timing each phase and passing its own stats to the search so the profiler gets the
+        counters of this query alone. They are added to the given stats as well.
+        """
+        kind = method + ('-astar' if astar else '') + ('' if weight == 'length' else '/' + weight)
+        start_time = time.perf_counter()
+        cached, route = (False, None) if method == 'turns' else self.route_cache.lookup(start, end, weight)
+        lookup_time = time.perf_counter()
+        if cached:
+            self.profiler.record_hit(kind, {'lookup': lookup_time - start_time, 'total': lookup_time - start_time})
+            return route
+
+        query = SearchStats()
+        route = self.search_route(start, end, astar, query, method, weight)
+        search_time = time.perf_counter()
+        if method != 'turns':
+            self.route_cache.store(start, end, route, weight)
+        store_time = time.perf_counter()
+
+        trace_time = query.times.get('trace', 0.0)
+        self.profiler.record(kind, query, {'lookup': lookup_time - start_time,
+                                           'search': search_time - lookup_time - trace_time,
+                                           'trace': trace_time,
+                                           'store': store_time - search_time,
+                                           'total': store_time - start_time})
+        if stats is not None:
+            stats.merge(query)
+        return route
+
+    def search_route(self, start: PathNode, end: PathNode, astar: bool = False, stats: SearchStats = None,
+                     method: str = 'junctions', weight: str = 'length') -> Route:
+        if method not in ('junctions', 'compiled', 'bidirectional', 'hierarchy', 'turns'):
+            raise ValueError(f'unknown routing method: {method}')
+        if weight not in WEIGHTS:
+            raise ValueError(f'unknown weight: {weight}')
+        if weight != 'length' and method in ('junctions', 'hierarchy'):
+            raise ValueError(f'the {method} method only finds routes by length, use the compiled method')
+        if method == 'junctions':
+            return self.junctions.find_shortest_route(start, end, euclidean if astar else None, stats)
+
+        if start is end:
+            return None
+        graph = self.compile(weight)
+        source, target = graph.index_of(start.id), graph.index_of(end.id)
+        if method == 'hierarchy':
+            if self.hierarchy is None:
+                self.build_hierarchy()
+            found = self.hierarchy.shortest_path(source, target, stats)
+        elif method == 'bidirectional':
+            found = graph.bidirectional_path(source, target, self.heuristic(weight) if astar else None, stats)
+        elif method == 'turns':
+            found = self.turn_table().shortest_path(graph, source, target, self.penalties(weight),
+                                                    self.heuristic(weight) if astar else None, stats)
+        else:
+            found = graph.shortest_path(source, target, self.heuristic(weight) if astar else None, stats)
+
+        if stats is None:
+            return self.route_from_indexes(*found, weight, method == 'turns')
+        start_time = time.perf_counter()
+        route = self.route_from_indexes(*found, weight, method == 'turns')
+        stats.add_time('trace', time.perf_counter() - start_time)
+        return route
+
+    def k_shortest_routes(self, start: PathNode, end: PathNode, k: int, stats: SearchStats = None,
+                          weight: str = 'length') -> [Route]:
+        """
+        Find the k shortest routes between two path nodes that do not pass through any node twice, with Yen's
+        algorithm on the compiled graph (see k_shortest_paths).
+
+        :return: up to k routes, shortest first, or an empty list if the start is the end or there is no route
+        """
+        if start is end:
+            return []
+        graph = self.compile(weight)
+        paths = k_shortest_paths(graph, graph.index_of(start.id), graph.index_of(end.id), k, self.scale(weight),
+                                 stats)
+        return [self.route_from_indexes(nodes, cost, weight) for nodes, cost in paths]
+
+    def alternative_routes(self, start: PathNode, end: PathNode, k: int = 3, max_overlap: float = 0.6,
+                           max_stretch: float = 0.4, stats: SearchStats = None, weight: str = 'length') -> [Route]:
+        """
+        Find the shortest route between two path nodes and up to k - 1 plausible alternatives to it that do not
+        share too much of their way with each other, for offering a choice when the best road is busy. This is much
+        faster than k_shortest_routes, whose routes often differ by a single street (see alternative_paths).
+
+        :param start: the path node to start from
+        :param end: the path node to find routes to
+        :param k: the most routes to return, including the shortest
+        :param max_overlap: the largest share of an alternative that may be along paths a better route already uses
+        :param max_stretch: how much longer than the shortest route an alternative may be, as a share of it
+        :param stats: optional counters to add the work done to
+        :param weight: the weight to find the routes by
+        :return: up to k routes, shortest first, or an empty list if the start is the end or there is no route
+        """
+        if start is end:
+            return []
+        graph = self.compile(weight)
+        paths = alternative_paths(graph, graph.index_of(start.id), graph.index_of(end.id), k, max_overlap,
+                                  max_stretch, scale=self.scale(weight), stats=stats)
+        return [self.route_from_indexes(nodes, cost, weight) for nodes, cost in paths]
+
+    def shortest_path_tree(self, source: PathNode, limit: float = math.inf, weight: str = 'length') -> PathTree:
+        graph = self.compile(weight)
+        distances, previous = graph.search_from(graph.index_of(source.id), limit=limit)
+        nodes = {index: self.path_nodes[id] for index, id in zip(distances, graph.ids[list(distances)].tolist())}
+        return PathTree(source,
+                        {nodes[index]: distance for index, distance in distances.items()},
+                        {nodes[index]: nodes[before] for index, before in previous.items()},
+                        weight)
+
+    def isochrone(self, source: PathNode, distance: float, weight: str = 'length') -> {PathNode: float}:
+        return self.shortest_path_tree(source, distance, weight).distances
+
+    def distance_matrix(self, sources: [PathNode], targets: [PathNode], predecessors: bool = False,
+                        method: str = 'compiled', weight: str = 'length') -> np.ndarray:
+        graph = self.compile(weight)
+        source_indexes = [graph.index_of(node.id) for node in sources]
+        target_indexes = [graph.index_of(node.id) for node in targets]
+
+        if method == 'hierarchy':
+            if predecessors:
+                raise ValueError('predecessors are not available from the hierarchy, use the compiled method')
+            if weight != 'length':
+                raise ValueError('the hierarchy only finds distances by length, use the compiled method')
+            if self.hierarchy is None:
+                self.build_hierarchy()
+            return self.hierarchy.distance_table(source_indexes, target_indexes)
+        if method != 'compiled':
+            raise ValueError(f'unknown distance matrix method: {method}')
+
+        matrix = np.full((len(sources), len(targets)), math.inf)
+        previous = np.full((len(sources), len(graph)), -1, dtype=np.int64) if predecessors else None
+        for row, source in enumerate(source_indexes):
+            distances, tree = graph.search_from(source, target_indexes)
+            matrix[row] = [distances.get(target, math.inf) for target in target_indexes]
+            if predecessors and tree:
+                previous[row, list(tree.keys())] = list(tree.values())
+        return (matrix, previous) if predecessors else matrix
+
+    def plan_tour(self, stops: [PathNode], closed: bool = True, time_budget: float = 1.0, method: str = 'compiled',
+                  weight: str = 'length') -> (Route, [PathNode]):
+        """
+        Find a cheap order to visit a set of stops in and the route that visits them in that order.
+
+        The cost between every pair of stops comes from distance_matrix, and the order from solve_tour: a nearest
+        neighbour tour improved by 2-opt and Or-opt moves for up to time_budget seconds. The route is made by joining
+        the shortest routes between the stops one after another, as join_routes does. With the compiled method those
+        routes are read from the predecessors the matrix was found with rather than searched for again.
+        Every stop has to be reachable from the others; if one is not, a ValueError names two stops with no route.
+            route, order = world.plan_tour([depot] + deliveries)
+
+        :param stops: the path nodes to visit, starting with the one to set off from
+        :param closed: come back to the first stop at the end
+        :param time_budget: the most seconds to spend improving the order
+        :param method: the distance_matrix method, 'compiled' or 'hierarchy' (which is faster once it is built)
+        :param weight: the weight to find the routes by
+        :return: the route, or None if there are fewer than two different stops, and the stops in the order visited
+        """
+        stops = list(dict.fromkeys(stops))  # a stop listed twice only needs visiting once
+        if not stops:
+            return None, []
+        if method == 'compiled':
+            matrix, previous = self.distance_matrix(stops, stops, True, weight=weight)
+        else:
+            matrix, previous = self.distance_matrix(stops, stops, method=method, weight=weight), None
+        unreachable = np.argwhere(np.isinf(matrix))
+        if len(unreachable):
+            row, column = unreachable[0]
+            raise ValueError(f'there is no route between the stops with ids {stops[row].id} and {stops[column].id}')
+        tour = solve_tour(matrix, 0, closed, time_budget)
+        return self.tour_route(stops, tour, closed, matrix, previous, method, weight), [stops[index] for index in tour]
+
+    def tour_route(self, stops: [PathNode], tour: [int], closed: bool, matrix: np.ndarray, previous: np.ndarray = None,
+                   method: str = 'compiled', weight: str = 'length') -> Route:
+        """
+        Join the shortest routes between the stops of a tour into one route.
+
+        :param stops: the path nodes the matrix was worked out for
+        :param tour: the indexes of the stops in the order to visit them
+        :param closed: come back to the first stop at the end
+        :param matrix: the cost of going from each stop to each other stop, from distance_matrix
+        :param previous: the predecessors distance_matrix found the matrix with, or None to search for each route
+        :param method: the routing method to search with when there are no predecessors
+        :param weight: the weight the matrix was worked out by
+        :return: the route, or None if the tour has fewer than two stops
+        """
+        if len(tour) < 2:
+            return None
+        graph = self.compile(weight)
+        route = None
+        for row, column in zip(tour, tour[1:] + tour[:1] if closed else tour[1:]):
+            if previous is None:
+                leg = self.find_shortest_route(stops[row], stops[column], method=method, weight=weight)
+            else:
+                # walk the tree of the search from the stop at row back from the stop at column
+                source = graph.index_of(stops[row].id)
+                indexes = [graph.index_of(stops[column].id)]
+                while indexes[-1] != source:
+                    indexes.append(int(previous[row, indexes[-1]]))
+                indexes.reverse()
+                leg = self.route_from_indexes(indexes, float(matrix[row, column]), weight)
+            route = join_routes(route, leg)
+        return route
 
     def get_node_at(self, x, y) -> Node:
-        for node in self.path_nodes.values():
-            if node.x == x and node.y == y:
-                return node
+        return self.index.node_at(x, y)
 
-    def get_nodes_near(self, x, y, distance):
-        for node in self.path_nodes.values():
-            if node.get_distance((x, y)) <= distance:
-                yield node
+    def get_nodes_near(self, x, y, distance) -> [PathNode]:
+        return self.index.within((x, y), distance)
 
     def get_nearest_path_node(self, point) -> Node:
-        nearest: PathNode = None
-        max_distance = MAX32
-        point = get_xy(point)
-        for node in self.path_nodes.values():
-            distance = node.get_distance_from(point)
-            if distance < max_distance:
-                max_distance = distance
-                nearest = node
-        return nearest
+        nearest = self.index.nearest(point)
+        return nearest[0] if nearest else None
+
+    def get_nearest_path_nodes(self, point, k: int) -> [PathNode]:
+        return self.index.nearest(point, k)
+
+    def get_nearest_path(self, point) -> (Path, Node, float):
+        return self.index.nearest_path(point)
+
+    def get_view(self):
+        # the view is made on first use, so a world can be built and routed on without tkinter or a display
+        if self.view is None:
+            from view import WorldView
+            self.view = WorldView(self)
+        return self.view
+
+    @property
+    def root(self):
+        return self.get_view().root
 
     def build(self):
-        if not self.built:
-            self.canvas.destroy()
-            self.canvas = Canvas(self.root, width=self.width, height=self.height, background="#DDDDDD")
-            self.canvas.pack()
-
-            def make_paths():
-                # draw paths
-                for path in self.paths.values():
-                    x1, y1 = path[0].node1
-                    x2, y2 = path[1].node1
-                    self.canvas.create_line(x1, y1, x2, y2, width=LANE_WIDTH * 2, fill=PATH_COLOR)
-
-            def make_lines():
-                # draw lines
-                for path in self.paths.values():
-                    n1: PathNode = path[0].node1
-                    n2: PathNode = path[1].node1
-
-                    a1 = n1.get_angle_from(n2)
-                    a2 = n2.get_angle_from(n1)
-                    o1 = n1.get_point(a1, LANE_WIDTH * (1.75 if len(n1.paths) > 2 else 0))
-                    o2 = n2.get_point(a2, LANE_WIDTH * (1.75 if len(n2.paths) > 2 else 0))
-                    if len(n1.paths) > 2:
-                        o1_1 = o1.get_point(a1 - 90, LANE_WIDTH)
-                        o1_2 = o1.get_point(a1 + 90, LANE_WIDTH)
-                        self.canvas.create_line(*o1_1, *o1_2, width=METER * 0.2, fill='white', dash=(1, 1))
-                    if len(n2.paths) > 2:
-                        o2_1 = o2.get_point(a2 - 90, LANE_WIDTH)
-                        o2_2 = o2.get_point(a2 + 90, LANE_WIDTH)
-                        self.canvas.create_line(*o2_1, *o2_2, width=METER * 0.2, fill='white', dash=(1, 1))
-
-                    self.canvas.create_line(*o1, *o2, width=METER * 0.1, fill='white', dash=(10, 5))
-
-            def make_nodes():
-                # draw nodes
-                for node in self.path_nodes.values():
-                    x1 = node.x - LANE_WIDTH
-                    y1 = node.y - LANE_WIDTH
-                    x2 = node.x + LANE_WIDTH
-                    y2 = node.y + LANE_WIDTH
-                    self.canvas.create_oval(x1, y1, x2, y2, fill=PATH_COLOR, width=0, activefill=ACTIVE_COLOR,
-                                            tag="path_node")
-
-                def start_new(event):
-                    mouse = Node(event.x, event.y)
-                    self.last_node = self.get_nearest_path_node(mouse)
-                    self.creating_new_path = True
-                    coords = *(self.last_node - LANE_WIDTH), *(self.last_node + LANE_WIDTH)
-                    self.canvas.create_oval(*coords, fill=ACTIVE_COLOR, width=0)
-                    self.line = self.canvas.create_line(*self.last_node, *mouse, width=LANE_WIDTH * 2,
-                                                        fill=ACTIVE_COLOR)
-                    coords = *(mouse - LANE_WIDTH), *(mouse + LANE_WIDTH)
-                    self.circle = self.canvas.create_oval(*coords, fill=ACTIVE_COLOR, width=0, tag='new_node')
-
-                def drag(event):
-                    if self.creating_new_path:
-                        mouse = Node(event.x, event.y)
-                        self.canvas.coords(self.line, *self.last_node, *mouse)
-                        self.canvas.coords(self.circle, *(mouse - LANE_WIDTH), *(mouse + LANE_WIDTH))
-
-                def place_new(event):
-                    self.creating_new_path = False
-                    mouse = Node(event.x, event.y)
-                    nearest = self.get_nearest_path_node(mouse)
-                    if mouse.get_distance_from(nearest) > LANE_WIDTH:
-                        new_node = self.add_path_node(event.x / METER, event.y / METER)
-                        self.add_path(self.last_node, new_node)
-                    else:
-                        self.add_path(self.last_node, nearest)
-
-                    self.built = False
-                    self.draw()
-
-                def on_hover(event: Event):
-                    mouse = Node(event.x, event.y)
-                    # nearest = self.get_nearest_path_node(mouse)
-
-                def on_leave(event):
-                    mouse = Node(event.x, event.y)
-                    # nearest = self.get_nearest_path_node(mouse)
-
-                self.canvas.tag_bind('path_node', '<Enter>', on_hover)
-                self.canvas.tag_bind('path_node', '<Leave>', on_leave)
-                self.canvas.tag_bind('path_node', '<Button-1>', start_new)
-                self.canvas.tag_bind('new_node', '<Button-1>', place_new)
-                self.canvas.bind('<Motion>', drag)
-
-            make_paths()
-            make_nodes()
-            make_lines()
-            self.draw_route()
+        self.get_view().build()
 
     def draw(self):
-        self.build()
+        self.get_view().draw()
 
     def draw_route(self, start: PathNode = None, end: PathNode = None):
-        if start is not None:
-            self.route_start = start
-        if end is not None:
-            self.route_end = end
-
-        if self.route_start is not None and self.route_end is not None:
-            route: Route = self.route_start.find_shortest_route(self.route_end)
-            path_width = LANE_WIDTH / 3
-            radius = path_width / 2
-            path_color = '#BADA55'
-
-            cnt = len(route.nodes)
-            n1 = a1 = o1 = 0
-            for n in range(cnt):
-                if n == 0:
-                    n1 = route.nodes[n]
-                    n2 = route.nodes[n + 1]
-                    a1 = get_angle(n1, n2)
-                    o1 = get_point(get_point(n1, a1, METER), a1 - 90, LANE_WIDTH / 2)
-                    self.canvas.create_oval(*o1-radius, *o1+radius, fill=path_color, width=0)
-                elif n < cnt - 1:
-                    n1 = route.nodes[n]
-                    n2 = route.nodes[n + 1]
-                    a0 = a1
-                    a2 = get_angle(n1, n2)
-                    a1 = (a0 + a2) / 2
-                    o0 = o1
-                    o1 = get_point(n1, a1 - 90, LANE_WIDTH / 2)
-                    self.canvas.create_oval(*o1-radius, *o1+radius, fill=path_color, width=0)
-                    self.canvas.create_line(*o0, *o1, fill=path_color, width=path_width)
-                else:
-                    n1 = route.nodes[n]
-                    a0 = a1
-                    o0 = o1
-                    o1 = get_point(n1, a0 - 90, LANE_WIDTH / 2)
-                    self.canvas.create_oval(*o1-radius, *o1+radius, fill=path_color, width=0)
-                    self.canvas.create_line(*o0, *o1, fill=path_color, width=path_width)
+        self.get_view().draw_route(start, end)
 
 
 if __name__ == '__main__':